@@ -30,43 +30,74 @@ public class Krita : SimpleTCPPack<SimpleTCPServerConnector>
 
 
 
+	// Generated from the @effect decorators in the plugin's effects/ folder, run tools/gen_effect_list.py
+	//		after adding or changing an effect
     public override EffectList Effects => new Effect[]
     {
-		// Spin the canvas
-        new("Spin Canvas", "spin_canvas") {	Price = 100,
-											Duration = 10,
-											Description = "Give the canvas a speeen",
-											Category = "Canvas" },
-
-		// Spin it slowly and chaotically
-        new("Spin Slow Chaotic", "spin_slow_chaotic") {	Price = 100,
-														Duration = 10,
-														Description = "Give the canvas a slow chaotic speeen",
-														Category = "Canvas" },
-
-		// Nudge clockwise
-		new("Nudge Clockwise", "nudge_canvas_cw") {	Price = 100,
-													Description = "Nudge Clockwise",
-													Category = "Canvas" },
-
-		// Nudge counter clockwise
-		new("Nudge Counter Clockwise", "nudge_canvas_ccw") {	Price = 100,
-																Description = "Nudge Counter Clockwise",
-																Category = "Canvas" },
-
-		// Vertical flip
-		new("Vertical Flip", "vertical_flip") {	Price = 100,
-												Description = "Vertical Flip",
-												Category = "Canvas" },
-
-		// Horizontal flip
-		new("Horizontal Flip", "horizontal_flip") {	Price = 100,
-													Description = "Horizontal Flip",
-													Category = "Canvas" },
-
-		// Rainbow paint
-        new("Rainbow Paint", "rainbow_paint") {	Price = 100,
-												Description = "Rainbow paint!",
-												Category = "Brush" }
+		// Spin Canvas
+		new("Spin Canvas", "spin_canvas") { Price = 100, Duration = 10, Description = "Give the canvas a speeen", Category = "Canvas" },
+
+		// Spin Slow Chaotic
+		new("Spin Slow Chaotic", "spin_slow_chaotic") { Price = 100, Duration = 10, Description = "Give the canvas a slow chaotic speeen", Category = "Canvas" },
+
+		// Nudge Clockwise
+		new("Nudge Clockwise", "nudge_canvas_cw") { Price = 100, Description = "Nudge Clockwise", Category = "Canvas" },
+
+		// Nudge Counter Clockwise
+		new("Nudge Counter Clockwise", "nudge_canvas_ccw") { Price = 100, Description = "Nudge Counter Clockwise", Category = "Canvas" },
+
+		// Vertical Flip
+		new("Vertical Flip", "vertical_flip") { Price = 100, Description = "Vertical Flip", Category = "Canvas" },
+
+		// Horizontal Flip
+		new("Horizontal Flip", "horizontal_flip") { Price = 100, Description = "Horizontal Flip", Category = "Canvas" },
+
+		// Rainbow Paint
+		new("Rainbow Paint", "rainbow_paint") { Price = 100, Description = "Rainbow paint!", Category = "Brush" },
+
+		// Pencil
+		new("Pencil", "brush_pencil") { Price = 100, Description = "Switch to a pencil", Category = "Brush" },
+
+		// Ink Pen
+		new("Ink Pen", "brush_ink") { Price = 100, Description = "Switch to an ink pen", Category = "Brush" },
+
+		// Airbrush
+		new("Airbrush", "brush_airbrush") { Price = 100, Description = "Switch to a soft airbrush", Category = "Brush" },
+
+		// Bristles
+		new("Bristles", "brush_bristles") { Price = 100, Description = "Switch to a rough bristle brush", Category = "Brush" },
+
+		// Pixel Brush
+		new("Pixel Brush", "brush_pixel") { Price = 100, Description = "Switch to a pixel art brush", Category = "Brush" },
+
+		// Red Paint
+		new("Red Paint", "color_red") { Price = 100, Description = "Set the paint color to red", Category = "Color" },
+
+		// Green Paint
+		new("Green Paint", "color_green") { Price = 100, Description = "Set the paint color to green", Category = "Color" },
+
+		// Blue Paint
+		new("Blue Paint", "color_blue") { Price = 100, Description = "Set the paint color to blue", Category = "Color" },
+
+		// Black Paint
+		new("Black Paint", "color_black") { Price = 100, Description = "Set the paint color to black", Category = "Color" },
+
+		// White Paint
+		new("White Paint", "color_white") { Price = 100, Description = "Set the paint color to white", Category = "Color" },
+
+		// Random Paint
+		new("Random Paint", "color_random") { Price = 100, Description = "Set the paint color to random", Category = "Color" },
+
+		// Invert Layer
+		new("Invert Layer", "layer_invert") { Price = 100, Description = "Invert the colors of the current layer", Category = "Layer" },
+
+		// Hue Shift Layer
+		new("Hue Shift Layer", "layer_hue_shift") { Price = 100, Description = "Shift the colors of the current layer around the color wheel", Category = "Layer" },
+
+		// Blur Layer
+		new("Blur Layer", "layer_blur") { Price = 100, Description = "Blur the current layer", Category = "Layer" },
+
+		// Pixelate Layer
+		new("Pixelate Layer", "layer_pixelate") { Price = 100, Description = "Pixelate the current layer", Category = "Layer" }
     };
 }
\ No newline at end of file
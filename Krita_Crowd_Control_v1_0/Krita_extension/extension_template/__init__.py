@@ -5,12 +5,30 @@
     ## Import the ExtensionTemplate class, which is the base for the plugin
     ## Make an instance of it, and register it with the Krita instance
     ##
-    ## Also import the TestEffects class 
-    ## We will make an instance of it in the ExtensionTemplate class later
+    ## This runs while Krita starts, so only what's needed to show the menu and dockers is imported here.
+    ##      The TestEffects class, the network code and the effects are imported on the first connect,
+    ##      see ExtensionTemplate.StartTest. benchmarks/bench_startup.py keeps an eye on it
+    ##
+    ## The status and settings dockers are registered here too, Krita makes them when the user opens them
+    ##
+    ## Only this file, extension_template.py, effect_functions.py, krita_host.py and the two dockers may import
+    ##      krita or PyQt5. Everything else, effects/ included, goes through the Host (host.py), so
+    ##      tools/plugin_loader.py can load it for the benchmarks outside of Krita
 ###################################################################################################################
+from krita import DockWidgetFactory, DockWidgetFactoryBase
+
 from .extension_template import ExtensionTemplate
-from .effect_functions import TestEffects
+from .settings import settings
+from .krita_host import KritaSettingsStore
+from . import status_docker
+from . import settings_docker
+
+settings.bind(KritaSettingsStore())                         ## Read kritarc once, the dockers and bridge share it
 
 Krita.instance().addExtension(ExtensionTemplate(Krita.instance()))
+Krita.instance().addDockWidgetFactory(DockWidgetFactory(status_docker.DOCKER_ID, DockWidgetFactoryBase.DockRight,
+                                                        status_docker.StatusDocker))
+Krita.instance().addDockWidgetFactory(DockWidgetFactory(settings_docker.DOCKER_ID, DockWidgetFactoryBase.DockRight,
+                                                        settings_docker.SettingsDocker))
 
 
@@ -0,0 +1,522 @@
+###################################################################################################################
+    ## bridge.py ##
+
+
+    ## Crowd Control <-> Krita, everything between the socket and the canvas
+    ##
+    ##  The Bridge owns the connection, the dispatcher, the effect engine and the frame scheduler, and is the
+    ##      context every effect handler gets. It reaches Krita and the GUI thread only through its Host
+    ##      (host.py), so the whole path from socket to canvas runs the same in Krita and on the headless
+    ##      stand-in in tools/fake_krita.py.
+    ##
+    ##  Threads:
+    ##      network thread - reads, frames and decodes messages, answers polls (dispatch.py)
+    ##      GUI thread     - everything else. The network thread gets here with host.post()
+    ##
+    ##  Options come from a Settings (settings.py) and are applied again whenever they change
+    ##
+    ##  With the captureFile option set, everything sent and received is recorded (capture.py). A capture
+    ##      can be played back through a Bridge made with engineType=ReplayEngine, see benchmarks/bench_replay.py
+###################################################################################################################
+from .connection import ConnectionManager   ## for connecting to Crowd Control with TCP, and staying connected
+from .protocol import (                     ## the ConnectorLib.JSON enums
+    RequestTypes,
+    EffectStatus
+)
+from .messages import EffectResponse        ## typed replies, encoded straight to bytes
+from .registry import registry, request     ## effect and request type lookup tables
+from .scheduler import AnimationScheduler   ## frame clock for timed effects
+from .lifecycle import EffectEngine         ## queues, runs, pauses and stops effects by request id
+from .dispatch import Dispatcher            ## network thread -> GUI thread, by priority, with a time budget
+from .presets import PresetIndex            ## brush presets by name, without walking them all every time
+from .pixels import LayerPipeline           ## layer effects, processed off the GUI thread
+from . import effects                       ## the effect modules, they register themselves
+from .host import NotReady, TARGETS         ## no window or document to show effects on, which views to target
+from .settings import Settings              ## connection, effect, log and metrics options
+from .capture import CaptureWriter          ## recording the traffic
+from .log import log, DEBUG                 ## leveled, lazy, rate-limited logging
+from .metrics import metrics                ## counters and timings, for the status docker and exports
+
+
+
+effects.load_all()
+
+REQUEST_NAMES = dict((t.value, t.name) for t in RequestTypes)  ## For logging, so we don't build them per message
+UNAVAILABLE = EffectStatus.Unavailable.value                    ## Enum .value lookups done once, not per message
+RETRY = EffectStatus.Retry.value
+STATUS_NAMES = dict((s.value, s.name) for s in EffectStatus)
+
+LOG_LIMITS = dict((name, 1.0) for name in REQUEST_NAMES.values())  ## Per request type, at most 1 line a second
+
+
+
+###################################################################################################################
+    ## Logging setup ##
+
+
+    ## Levels come from the settings (in Krita, kritarc, [CrowdControl]):
+    ##      logLevel        - debug, info, warning (default), error or off
+    ##      logRing         - how many records to keep for dumping when something fails, 0 (default) for none
+    ##      logRingLevel    - lowest level the ring keeps, default debug
+###################################################################################################################
+def configure_log(host, settings):
+    log.sink = host.log_sink()
+    log.configure({
+        "level": settings.logLevel,
+        "ring": settings.logRing,
+        "ringLevel": settings.logRingLevel,
+        "limits": LOG_LIMITS
+    })
+
+
+
+###################################################################################################################
+    ## The bridge ##
+###################################################################################################################
+    ## address overrides the host and port settings, for the benchmarks. settings defaults to the host's own
+    ## engineType replaces the connection's NetworkEngine, to replay a capture
+class Bridge:
+    def __init__(self, host, address=None, settings=None, engineType=None):
+        self.host = host
+        self.engineType = engineType
+        self.settings = settings if settings is not None else Settings(host)
+        self.fixedAddress = address
+        self.address = address or (self.settings.host, self.settings.port)
+        configure_log(host, self.settings)
+
+        self.frameTimer = host.make_timer(self._tick)       ## Ticks on the GUI thread while effects animate
+        self.scheduler = AnimationScheduler(                ## Moves every timed effect once per frame
+            self.frameTimer,
+            self.apply_frame,
+            onIdle=self.animations_idle
+        )
+        self.engine = EffectEngine(                         ## Every effect from request to finish
+            self,
+            self.scheduler,
+            self.send_effect_response
+        )
+
+        self.presets = PresetIndex(                         ## Brush presets, loaded on the first brush effect
+            lambda: host.resources("preset"),
+            aliases={"rainbow": self.settings.rainbowPreset}
+        )
+
+        self.layers = LayerPipeline(host)                   ## Layer effects, its worker thread starts with the first one
+
+        self.dispatcher = Dispatcher(                       ## Parses on the network thread, answers polls
+            self.send_from_network,                         ##      there, queues the rest for drain_requests()
+            self._wake,
+            claim=self.claim_effect,                        ## Drops repeated EffectStarts before they queue
+            release=self.release_effect
+        )
+
+        self.connection = None                              ## Made by start()
+        self.targetMode = self.settings.targetMode          ## Which views effects change, see host.py
+
+        self.responsesOut = metrics.counter("messages_out_total", type="EffectRequest")
+        self.statusCounters = dict(                         ## EffectStatus value -> counter
+            (value, metrics.counter("effect_responses_total", "Effect responses by status", status=name))
+            for value, name in STATUS_NAMES.items())
+        self._register_gauges()
+
+        self.exportTimer = host.make_timer(self.export_metrics)     ## Writes the metrics files, if configured
+        self.settings.listen(self.settings_changed)
+
+
+
+
+    def _tick(self):
+        self.scheduler.tick()
+
+
+    def _wake(self):                                        ## Network thread, the dispatcher has messages
+        self.host.post(self.drain_requests)
+
+
+
+###################################################################################################################
+    ## Hot reload ##
+
+
+    ## Called by the settings with the names of the options that changed. Everything the effects read
+    ##      (nudgeAngle, spinTurns, ...) is read when they run, so only these need doing
+###################################################################################################################
+    def settings_changed(self, names):
+        settings = self.settings
+        if "host" in names or "port" in names:
+            if self.fixedAddress is None:
+                self.address = (settings.host, settings.port)
+                if self.connection is not None and self.connection.running:
+                    log.warning("Reconnecting to %s:%d", self.address[0], self.address[1])
+                    previous = self.connection              ## Running effects keep going, their answers
+                    previous.stop()                         ##      go out on the new connection, and the ids
+                    self.connection = self._make_connection(previous)   ##  seen so far stay seen
+                    self.start()
+        if "targetMode" in names:
+            self.set_target_mode(settings.targetMode)
+        if "rainbowPreset" in names:
+            self.presets.add_alias("rainbow", settings.rainbowPreset)
+        if names & set(("logLevel", "logRing", "logRingLevel")):
+            configure_log(self.host, settings)
+        if names & set(("metricsPrometheusFile", "metricsJsonlFile", "metricsInterval")):
+            self.exportTimer.stop()
+            if self.connection is not None and self.connection.running:
+                self._start_export()
+        if "captureFile" in names and self.connection is not None and self.connection.running:
+            self._start_capture()
+
+
+
+###################################################################################################################
+    ## Metrics ##
+
+
+    ## Gauges read values the connection and engine keep anyway, so publishing them costs nothing until read.
+    ## Export files come from the settings (kritarc, [CrowdControl], see settings.py):
+    ##      metricsPrometheusFile   - Prometheus text, rewritten every metricsInterval seconds
+    ##      metricsJsonlFile        - one JSON line appended every metricsInterval seconds
+    ##      metricsInterval         - seconds, default 10
+###################################################################################################################
+    def _register_gauges(self):
+        metrics.gauge("connected", self.is_connected, "1 while connected to Crowd Control")
+        metrics.gauge("reconnects_total", lambda: self.connection.reconnects, "Times the link came back")
+        metrics.gauge("bytes_in_total", lambda: self.connection.engine.bytesIn, "Bytes from Crowd Control")
+        metrics.gauge("bytes_out_total", lambda: self.connection.engine.writer.bytesOut,
+                      "Bytes to Crowd Control")
+        metrics.gauge("send_calls_total", lambda: self.connection.engine.writer.sendCalls, "send() syscalls")
+        metrics.gauge("effects_running", lambda: len(self.engine.active), "Timed effects running or paused")
+        metrics.gauge("effects_queued", self.engine.queued, "Timed effects waiting for their slot")
+
+
+
+    def _start_export(self):
+        if self.settings.metricsPrometheusFile or self.settings.metricsJsonlFile:
+            self.exportTimer.start(int(self.settings.metricsInterval * 1000))
+
+
+
+    def export_metrics(self):
+        try:
+            if self.settings.metricsPrometheusFile:
+                metrics.write_prometheus(self.settings.metricsPrometheusFile)
+            if self.settings.metricsJsonlFile:
+                metrics.append_jsonl(self.settings.metricsJsonlFile)
+        except OSError as error:                                    ## Bad path, full disk. Say so once
+            log.error("Can't write metrics, exporting stopped: %s", error)
+            self.exportTimer.stop()
+
+
+
+###################################################################################################################
+    ## Timed canvas effects ##
+
+
+    ## curve(progress) is the rotation offset in degrees, for progress going from 0.0 to 1.0 over duration seconds
+    ## The scheduler places it by real elapsed time, so it always ends on curve(1.0) exactly at the duration
+###################################################################################################################
+    def start_spin(self, curve, duration):                          ## Give the canvas a spin
+        self.canvases()                                             ## Raises NotReady now, not on the first frame
+        log.info("Starting rotation")
+        return self.scheduler.add(curve, duration)
+
+
+
+    def apply_frame(self, batch):                                   ## Everything that moved this frame, at once,
+        try:                                                        ##      on every targeted view
+            canvases = self.canvases()                              ## Cached, see host.py
+        except NotReady:                                            ## The document was closed mid spin
+            return
+        rotation = batch.rotation                                   ## One property per canvas, so Qt already
+        for canvas in canvases:                                     ##      paints each once. Holding repaints
+            canvas.setRotation(canvas.rotation() + rotation)        ##      would repaint whole windows instead
+
+
+
+    def animations_idle(self, stats):                               ## The last animation finished
+        log.info("Rotation done: %s", stats.summary())
+
+
+
+###################################################################################################################
+    ## Start the network thread and connect ##
+
+
+    ## The connect is non-blocking, and ConnectionManager keeps reconnecting with backoff until stop is called.
+    ##      connection_state tells us how it's going
+    ## Calling this again while connected does nothing
+###################################################################################################################
+    def start(self):
+        if self.connection is None:
+            self.connection = self._make_connection()
+        if self.connection.running:                                         ## Already started. A new capture
+            return                                                          ##      would cut the one recording
+        self._start_capture()
+        self.connection.start()                                             ## Connect to the Crowd Control server
+        self._start_export()
+
+
+
+    ## previous is the stopped connection this one replaces, its response cache and held responses carry over
+    def _make_connection(self, previous=None):
+        options = {} if self.engineType is None else {"engineType": self.engineType}
+        return ConnectionManager(                                           ## The network thread. It only wakes
+            self.address[0], self.address[1],                               ##      up for socket activity, and
+            onFrames=self.dispatcher.on_frames,                             ##      hands every message from one
+            onStateChanged=self._state_changed,                             ##      read to the Dispatcher at once
+            previous=previous,
+            **options
+        )
+
+
+
+    ## Record to the captureFile setting, or stop recording when it's empty. The network thread switches
+    ##      files between reads, so no chunk is split across two captures
+    def _start_capture(self):
+        path = self.settings.captureFile
+        writer = None
+        if path:
+            try:
+                writer = CaptureWriter(path)
+            except OSError as error:
+                log.error("Can't write the capture, recording stopped: %s", error)
+        self.connection.engine.capture_to(writer)
+
+
+
+    ## End every timed effect (running ones answered Finished, queued ones Failure), then stop the network
+    ##      thread and close the socket. Nothing is left holding a slot, so start() begins from a clean state
+    def stop(self):
+        self.engine.stop_all()
+        self.scheduler.clear()
+        if self.connection is not None:
+            self.connection.stop()
+        self.frameTimer.stop()
+        self.exportTimer.stop()
+        self.layers.close()
+
+
+
+    def is_connected(self):
+        return self.connection is not None and self.connection.is_connected()
+
+
+
+    def _state_changed(self, state, reason):                                ## Network thread
+        self.host.post(lambda: self.connection_state(state, reason))
+
+
+
+    def connection_state(self, state, reason):
+        log.warning("Crowd Control connection %s: %s", state, reason)
+
+
+
+###################################################################################################################
+    ## Send a message to Crowd Control ##
+
+
+    ##  (Crowd Control) Messages are encoded as null terminated UTF-8 strings
+    ##      https://developer.crowdcontrol.live/sdk/simpletcp/index.html#connection-methods
+    ##  output is already encoded that way, see messages.py
+    ##
+    ##  Pass effectId for effect responses. Those are held over a reconnect, everything else is dropped
+    ##      while we're disconnected
+###################################################################################################################
+    def socket_send(self, output, effectId=None, final=True):
+        log.debug("Sending message to Crowd Control: %s", output)
+        if effectId is None:
+            self.connection.send(output)                            ## Queue it, the network thread sends it
+        else:
+            self.connection.respond(effectId, output, final)        ## Same, but survives a reconnect
+
+
+
+    ## Replies the Dispatcher makes on the network thread (GameUpdate, KeepAlive, Retry when overloaded)
+    def send_from_network(self, data, key=None):
+        self.connection.send(data, key)
+
+
+
+    ## Network thread. EffectStart ids go through the connection's response cache before they're queued,
+    ##      so a re-sent request is never run twice, see connection.py
+    def claim_effect(self, effectId):
+        return self.connection.begin(effectId)
+
+
+
+    def release_effect(self, effectId):
+        self.connection.forget(effectId)
+
+
+
+    ## Effect responses from the EffectEngine. final is False for Queue, Success of a timed effect, Paused
+    ##      and Resumed, more responses for that id will follow
+    def send_effect_response(self, response, final):
+        self.socket_send(response.encode(), response.id, final)
+        self.responsesOut.inc()
+        self.statusCounters[response.status].inc()
+        if response.status == RETRY:                                ## Crowd Control will ask again with
+            self.connection.forget(response.id)                     ##      this id, so it has to be new to us
+
+
+
+###################################################################################################################
+    ## If the Crowd Control message is an effect request, it is send to this function ##
+###################################################################################################################
+    def handle_effect(self, effectRequest):
+        ## Look the effect up. The handlers live in effects/, see registry.py
+        info = registry.get(effectRequest.code)
+        if info is None:                                        ## The game pack has an effect we don't
+            log.warning("Unknown effect: %s", effectRequest.code)
+            self.send_effect_response(                          ## Hide it for the rest of the session
+                EffectResponse(effectRequest.id, UNAVAILABLE),
+                True
+            )
+            return
+
+        ## The engine runs it now, queues it, or answers Retry, and sends the responses. See lifecycle.py
+        self.engine.start(info, effectRequest)
+
+
+
+###################################################################################################################
+    ## Pausing timed effects ##
+
+
+    ## Timed effects hold still and Crowd Control is told they're paused, so viewers don't lose time
+###################################################################################################################
+    def pause_effects(self):
+        self.engine.pause_all()
+
+
+
+    def resume_effects(self):
+        self.engine.resume_all()
+
+
+
+    ## Put back the layer from before the last layer effect. Krita's own undo doesn't see them, see pixels.py
+    def undo_layer_effect(self):
+        return self.layers.undo_last()
+
+
+
+###################################################################################################################
+    ## Krita access for the effect handlers ##
+
+
+    ## Through the host, see host.py. These raise NotReady when no document is open
+    ## canvas() is the active view's. canvases() and each_canvas() follow the target mode:
+    ##      active, every view of the active document, or every view in every window
+###################################################################################################################
+    def set_target_mode(self, mode):
+        if mode not in TARGETS:
+            log.warning("Unknown target mode %s, using %s", mode, self.targetMode)
+            return
+        self.targetMode = mode
+
+
+
+    def canvases(self):
+        return self.host.target_canvases(self.targetMode)
+
+
+
+    ## change(canvas) on every targeted canvas, in one pass. held=True holds repaints until the end, for a
+    ##      change that sets several properties on each canvas. Not for one property: Qt merges a canvas'
+    ##      updates anyway, and releasing the hold repaints the whole window, dockers and toolbars too
+    def each_canvas(self, change, held=False):
+        canvases = self.canvases()                                  ## NotReady before anything changed
+        if not held:
+            for canvas in canvases:
+                change(canvas)
+            return
+        with self.host.updates_suppressed(self.targetMode):
+            for canvas in canvases:
+                change(canvas)
+
+
+
+    def active_view(self):
+        return self.host.active_view()
+
+
+
+    def canvas(self):
+        return self.host.canvas()
+
+
+
+    def set_foreground_color(self, red, green, blue):               ## 0-255 each
+        self.host.set_foreground_color(red, green, blue)
+
+
+
+    def layer_editable(self):                                       ## An 8-bit RGBA paint layer is active
+        return self.host.layer_editable()
+
+
+
+###################################################################################################################
+    ## Run queued messages on the GUI thread ##
+
+
+    ## The Dispatcher (dispatch.py) parses messages on the network thread, answers GameUpdate and KeepAlive
+    ##      there, and queues the rest by priority. It posts drain_requests when the queue has something in it.
+    ## We only run messages for a few milliseconds per event loop turn, then come back on the next turn,
+    ##      so a burst of redeems can't freeze painting
+###################################################################################################################
+    def drain_requests(self):
+        if self.dispatcher.drain(self.handle_request):              ## More left, let Krita paint first
+            self.host.post(self.drain_requests)
+
+
+
+###################################################################################################################
+    ## This function is sent one message at a time by drain_requests ##
+
+
+    ##  The random last entry that appears sometimes is future proofing from the Crowd Control team
+    ##      see screen shot
+
+
+    ##  (Crowd Control) Messages are encoded as null terminated UTF-8 strings
+    ##      https://developer.crowdcontrol.live/sdk/simpletcp/index.html#connection-methods
+    ##  NetworkEngine runs the stream through a FrameDecoder (framer.py), and the Dispatcher decodes and checks
+    ##      the JSON (messages.py), so request is one message as a Request or EffectRequest object
+    ##
+    ##  Refer to ConnectorLib.JSON for handling messages
+    ##      https://github.com/WarpWorld/ConnectorLib.JSON
+###################################################################################################################
+    def handle_request(self, request):
+        requestType = request.type
+        if log.enabled(DEBUG):                                      ## Show us what we got. Nothing is built
+            typeName = REQUEST_NAMES.get(requestType, "Unknown")    ##      unless debug logging is on, and each
+            log.debug("Received %s (%s) id %s: %s", typeName,       ##      type is rate limited on its own
+                      requestType, request.id, request, key=typeName)
+
+        handler = registry.request_handler(requestType)           ## One lookup, however many types we handle
+        if handler is not None:
+            handler(self, request)
+
+
+
+###################################################################################################################
+    ## Request type handlers ##
+
+
+    ## Registered by request type with registry.request, handle_request() looks them up.
+    ## GameUpdate and KeepAlive never get here, the Dispatcher answers them on the network thread.
+    ## Types without a handler (GenericEvent, DataRequest, RpcResponse, PlayerInfo, Login, EffectTest)
+    ##      are only logged
+###################################################################################################################
+    @request(RequestTypes.EffectStart)                              ## Crowd Control is requesting an effect start
+    def on_effect_start(self, request):
+        self.handle_effect(request)                                 ## Repeats were dropped by the Dispatcher
+
+
+
+    @request(RequestTypes.EffectStop)                               ## Stop a running or queued effect early
+    def on_effect_stop(self, request):
+        if not self.engine.stop(request):
+            log.info("EffectStop for an effect that isn't running: %s", request.code)
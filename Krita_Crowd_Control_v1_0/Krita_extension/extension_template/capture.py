@@ -0,0 +1,268 @@
+###################################################################################################################
+    ## capture.py ##
+
+
+    ## Recorded sessions: every byte to and from Crowd Control in a file, and a way to play it back
+    ##
+    ##  Capture. NetworkEngine (network.py) hands a CaptureWriter each chunk recv() gave it and each chunk send()
+    ##      took, on the network thread, before the framer sees it. So a capture holds the stream exactly as
+    ##      TCP cut it up, which is what the framer has to cope with.
+    ##  The file is append-only: a header the first time, then records of
+    ##      seconds since the capture started (double), kind (1 byte), length (uint32), then that many bytes
+    ##      13 bytes of overhead on a chunk, written through one buffered file, so a poll costs two write() calls
+    ##      into a buffer. Kinds are SESSION (a writer opened, the data is the wall clock time as text),
+    ##      CONNECTED, DISCONNECTED (the data is the reason), INBOUND and OUTBOUND.
+    ##  CaptureReader maps the file (mmap) and hands out memoryviews of it, so reading a big capture copies
+    ##      nothing. A record cut short by a crash ends the capture there.
+    ##
+    ##  Replay. ReplayEngine is a NetworkEngine without a socket: connect() succeeds straight away and the
+    ##      captured inbound chunks are fed to the same FrameDecoder and onFrames as a recv() would be, on the
+    ##      same event loop, either at the pace they were recorded (speed 1.0, 2.0, ...) or one chunk per loop
+    ##      turn (speed None, as fast as it goes). What the plugin sends is kept in output instead of sent.
+    ##      Everything above the socket, ConnectionManager, the dispatcher, the engine and the effects, runs
+    ##      as it did live, so a capture is a regression test and a benchmark with real traffic in it.
+###################################################################################################################
+import mmap                                 ## reading captures without copying them
+import os                                   ## file size
+import struct                               ## the record header
+import threading                            ## the writer's lock
+import time                                 ## monotonic(), time() for the session record
+
+from .network import (                      ## the engine replays go through, and the record kinds it writes
+    NetworkEngine,
+    CONNECTED,
+    DISCONNECTED,
+    CAPTURE_CONNECTED as CONNECTED_RECORD,
+    CAPTURE_DISCONNECTED as DISCONNECTED_RECORD,
+    CAPTURE_INBOUND as INBOUND,
+    CAPTURE_OUTBOUND as OUTBOUND
+)
+
+MAGIC = b"CCCAPT1\n"                        ## Start of every capture file
+RECORD = struct.Struct("<dBI")              ## seconds, kind, length
+FLUSH_EVERY = 1.0                           ## Seconds between flushes to disk while recording
+READY_POLL = 0.0002                         ## Seconds between ready() checks in a fast replay
+
+SESSION = 0                                 ## Record kind the writer adds, network.py has the others
+KIND_NAMES = {SESSION: "session", CONNECTED_RECORD: "connected", DISCONNECTED_RECORD: "disconnected",
+              INBOUND: "in", OUTBOUND: "out"}
+
+
+
+class CaptureError(Exception):              ## Not a capture file
+    pass
+
+
+
+###################################################################################################################
+    ## Writing ##
+
+
+    ## record() is called on the network thread. The lock is for close() from another thread
+###################################################################################################################
+class CaptureWriter:
+    def __init__(self, path, clock=time.monotonic):
+        self.path = path
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.started = clock()
+        self.flushedAt = self.started
+        self.records = 0
+        self.bytes = 0                              ## Payload bytes, without the headers
+        self.record(SESSION, ("%.6f" % time.time()).encode())
+
+
+    def record(self, kind, data=b""):               ## data is bytes-like
+        with self.lock:
+            if self.file is None:
+                return
+            now = self.clock()
+            self.file.write(RECORD.pack(now - self.started, kind, len(data)))
+            self.file.write(data)
+            self.records += 1
+            self.bytes += len(data)
+            if now - self.flushedAt >= FLUSH_EVERY:         ## So a crash loses a second at most
+                self.flushedAt = now
+                self.file.flush()
+
+
+    def close(self):                                ## Safe to call more than once
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+
+###################################################################################################################
+    ## Reading ##
+
+
+    ## records() yields (seconds, kind, data), data is a memoryview into the mapped file. Drop them before
+    ##      close(), a mapping can't be closed while something still looks into it
+###################################################################################################################
+class CaptureReader:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = None
+        self.truncated = False                      ## The last record was cut short
+        size = os.fstat(self.file.fileno()).st_size
+        if size < len(MAGIC):
+            self.file.close()
+            raise CaptureError("%s is too short to be a capture" % path)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise CaptureError("%s isn't a capture" % path)
+
+
+    def records(self):
+        view = memoryview(self.map)
+        try:
+            position = len(MAGIC)
+            end = len(view)
+            while position < end:
+                if position + RECORD.size > end:
+                    self.truncated = True
+                    return
+                seconds, kind, length = RECORD.unpack_from(view, position)
+                position += RECORD.size
+                if position + length > end:
+                    self.truncated = True
+                    return
+                yield seconds, kind, view[position:position + length]
+                position += length
+        finally:
+            view.release()
+
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+
+## The records of path as a list of (seconds, kind, bytes), for captures small enough to hold
+def load(path):
+    with CaptureReader(path) as reader:
+        records = [(seconds, kind, bytes(data)) for seconds, kind, data in reader.records()]
+    return records
+
+
+
+###################################################################################################################
+    ## Replaying ##
+
+
+    ## records - (seconds, kind, data) from a capture. Only INBOUND is fed, SESSION and CONNECTED start a new
+    ##              stream (the framer forgets any partial frame), seconds between them start from 0 again
+    ## speed   - 1.0 plays at the recorded pace, 2.0 twice as fast, None as fast as possible
+    ## ready() - with speed None, the next chunk waits until this is true. Without it a fast replay only
+    ##              measures how the dispatcher sheds load, with it how fast the plugin keeps up
+    ## The other arguments are NetworkEngine's, so it can be handed to ConnectionManager as its engine:
+    ##      ConnectionManager(..., engineType=functools.partial(ReplayEngine, records, 1.0))
+###################################################################################################################
+class ReplayEngine(NetworkEngine):
+    def __init__(self, records, speed=None, ready=None, **callbacks):
+        NetworkEngine.__init__(self, **callbacks)
+        self.records = records
+        self.speed = speed
+        self.ready = ready
+        self.position = 0                           ## Next record to play
+        self.output = []                            ## Every chunk the plugin sent, as bytes
+        self.playTimer = None
+        self.startedAt = None                       ## monotonic() of the first chunk fed
+        self.base = 0.0                             ## Capture seconds that line up with startedAt
+        self.finishedAt = None                      ## and after the last one
+        self.fed = 0                                ## Inbound chunks played
+
+
+    def finished(self):
+        return self.finishedAt is not None
+
+
+    ## No socket. The connection is up at once, and playing carries on where it left off after a reconnect
+    def _start_connect(self, host, port):
+        if self.state != DISCONNECTED:
+            return
+        self.decoder.reset()
+        self.state = CONNECTED
+        if self.onConnected:
+            self.onConnected()
+        self._play()
+
+
+    def _drop_connection(self, reason, notify=True):
+        if self.state == DISCONNECTED:
+            return
+        self.state = DISCONNECTED
+        self.decoder.reset()
+        if self.playTimer is not None:
+            self.cancel_timer(self.playTimer)
+            self.playTimer = None
+        with self.lock:
+            unsent = self.writer.clear()
+        if notify and unsent and self.onUnsent:
+            self.onUnsent(unsent)
+        if notify and self.onDisconnected:
+            self.onDisconnected(reason)
+
+
+    def _flush(self):                               ## Everything queued this turn, as one "send"
+        with self.lock:
+            view = self.writer.pack()
+            if view:
+                self.output.append(bytes(view))
+                self.writer.sent(len(view))
+
+
+    ## Feed the chunks that are due, then come back when the next one is
+    def _play(self):
+        self.playTimer = None
+        if self.state != CONNECTED:
+            return
+        if self.startedAt is None:
+            self.startedAt = time.monotonic()
+        records = self.records
+        while self.position < len(records):
+            seconds, kind, data = records[self.position]
+            if kind in (SESSION, CONNECTED_RECORD):
+                self.decoder.reset()
+                if kind == SESSION:                 ## Its seconds start over
+                    self.base = seconds - (time.monotonic() - self.startedAt) * (self.speed or 1.0)
+                self.position += 1
+                continue
+            if kind != INBOUND:
+                self.position += 1
+                continue
+            if self.speed is not None:
+                wait = (seconds - self.base) / self.speed - (time.monotonic() - self.startedAt)
+                if wait > 0:
+                    self.playTimer = self.call_later(wait, self._play)
+                    return
+            elif self.ready is not None and not self.ready():
+                self.playTimer = self.call_later(READY_POLL, self._play)
+                return
+            self.position += 1
+            self.fed += 1
+            self.bytesIn += len(data)
+            frames = self.decoder.feed(data)
+            if frames and self.onFrames:
+                self.onFrames(frames)
+            if self.speed is None:                  ## Let the loop flush replies before the next chunk
+                self.call_soon(self._play)
+                return
+        self.finishedAt = time.monotonic()
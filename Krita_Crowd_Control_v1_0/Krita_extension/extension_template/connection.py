@@ -0,0 +1,283 @@
+###################################################################################################################
+    ## connection.py ##
+
+
+    ## Keeps the connection to Crowd Control alive
+    ##
+    ##  The Crowd Control connector can restart at any time (new game pack version, the streamer restarts it, ...)
+    ##  ConnectionManager wraps a NetworkEngine and:
+    ##      - reconnects with jittered exponential backoff whenever the connection fails or drops
+    ##      - gives up on a connect that takes longer than connectTimeout
+    ##      - drops a connection that has been silent for longer than livenessTimeout. Crowd Control polls with
+    ##          GameUpdate and sends KeepAlive, so silence means the link is dead even if TCP hasn't noticed
+    ##      - remembers which effect ids are in flight, so a response survives a reconnect and a re-sent request
+    ##          doesn't run the effect a second time (response_cache.py)
+###################################################################################################################
+import collections                          ## OrderedDict for the held responses
+import random                               ## jitter
+import threading                            ## lock for the in flight effects
+import time                                 ## monotonic()
+
+from .network import NetworkEngine, CONNECTED, CONNECTING, DISCONNECTED
+from .response_cache import ResponseCache   ## effect ids we've seen and what we answered
+
+
+
+###################################################################################################################
+    ## Exponential backoff with full jitter ##
+
+
+    ## Each failed attempt doubles the ceiling, and the delay is picked at random below it, so many clients
+    ##      (or one client and a restarting connector) don't keep retrying in lock step
+    ## See https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
+###################################################################################################################
+class Backoff:
+    def __init__(self, base=0.5, maximum=30.0, factor=2.0, rng=None):
+        self.base = base                            ## First ceiling, in seconds
+        self.maximum = maximum                      ## The ceiling never goes above this
+        self.factor = factor                        ## How much the ceiling grows per attempt
+        self.rng = rng or random.Random()
+        self.attempts = 0
+
+    def next(self):                                 ## Delay before the next attempt
+        ceiling = min(self.maximum, self.base * (self.factor ** self.attempts))
+        self.attempts += 1
+        return self.rng.uniform(self.base / 2, max(ceiling, self.base / 2))
+
+    def reset(self):                                ## The link works again, start over
+        self.attempts = 0
+
+
+
+###################################################################################################################
+    ## The connection manager ##
+
+
+    ## Callbacks, all called on the network thread:
+    ##      onFrames(frames)            - same as NetworkEngine
+    ##      onStateChanged(state, why)  - DISCONNECTED, CONNECTING or CONNECTED, and a reason for humans
+    ## engineType makes the engine from its callbacks. A ReplayEngine plays a capture instead (capture.py)
+    ## previous is a stopped ConnectionManager this one replaces (a new host or port). Its response cache,
+    ##      held responses and connection count carry over, so a request re-sent to the new one isn't run again
+    ##
+    ## start(), stop(), begin(), respond() and send() can be called from any thread
+###################################################################################################################
+class ConnectionManager:
+    def __init__(self, host, port, onFrames=None, onStateChanged=None,
+                 connectTimeout=5.0, livenessTimeout=30.0, backoff=None,
+                 keepAnswered=256, keepAnsweredFor=600.0, engineType=NetworkEngine, previous=None):
+        self.host = host
+        self.port = port
+        self.onFrames = onFrames
+        self.onStateChanged = onStateChanged
+        self.connectTimeout = connectTimeout
+        self.livenessTimeout = livenessTimeout
+        self.backoff = backoff or Backoff()
+
+        self.engine = engineType(
+            onFrames=self._on_frames,
+            onConnected=self._on_connected,
+            onDisconnected=self._on_disconnected,
+            onUnsent=self._on_unsent
+        )
+        self.running = False
+        self.lastSeen = 0.0                         ## monotonic() of the last message from Crowd Control
+        self.connectTimer = None
+        self.livenessTimer = None
+        self.reconnects = 0                         ## How many times we got the link back
+
+        self.lock = threading.Lock()                ## Guards responses, held and generation
+        if previous is None:
+            self.responses = ResponseCache(keepAnswered, keepAnsweredFor)   ## How many answered ids, for how long
+            self.held = collections.OrderedDict()   ## response -> effect id, waiting for a connection, in order
+            self.generation = 0                     ## Counts connections, so we know which one a response used
+        else:
+            with previous.lock:
+                self.responses = previous.responses
+                self.held = previous.held
+                self.generation = previous.generation
+
+
+
+###################################################################################################################
+    ## Starting and stopping ##
+###################################################################################################################
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.engine.start()
+        self.engine.call_soon(self._connect)
+
+
+    ## Closes the socket and joins the network thread. start() again makes a new one
+    def stop(self):
+        self.running = False
+        self.engine.stop()
+        self._cancel_timers()
+
+
+    def is_connected(self):
+        return self.engine.is_connected()
+
+
+
+###################################################################################################################
+    ## Effect bookkeeping ##
+
+
+    ## begin(id) is called when an effect request arrives, on the network thread (see dispatch.py). It returns
+    ##      False if the request is a repeat of one we already have. Answered on an earlier connection means the
+    ##      connector didn't get the answer, so the cached one is sent again right away. That goes for a running
+    ##      effect's answer that isn't final too (a timed effect's Success). Answered on this connection means
+    ##      the answer and the repeat crossed, TCP will deliver it. Still running and not answered yet means the
+    ##      response is on its way. The effect never runs twice, as long as the id is still remembered.
+    ## respond(id, data) sends the effect's response. If we're disconnected it is held and sent after the
+    ##      reconnect. final=False is for responses that aren't the last one for this id (timed effects), the
+    ##      latest of those is remembered until the final one, so it survives a reconnect too.
+###################################################################################################################
+    def begin(self, effectId):
+        with self.lock:
+            entry = self.responses.claim(effectId)
+            if entry is None:
+                return True
+            response, generation = entry[0], entry[1]
+            resend = response is not None and generation != self.generation and response not in self.held
+        if resend:
+            self._send_effect_response(effectId, response)
+        return False
+
+
+    def respond(self, effectId, data, final=True):
+        with self.lock:
+            if final:
+                self.responses.store(effectId, data)
+            else:
+                self.responses.progress(effectId, data)
+        self._send_effect_response(effectId, data)
+
+
+    ## Forget an id, so a new request with it runs again. For responses like Retry that ask for a new request
+    def forget(self, effectId):
+        with self.lock:
+            self.responses.discard(effectId)
+
+
+    ## Effects that are still running
+    def running_effects(self):
+        with self.lock:
+            return self.responses.running_ids()
+
+
+    ## Anything that isn't an effect response, e.g. GameUpdate replies. Dropped while disconnected,
+    ##      because it would be stale by the time we're back. key merges waiting duplicates, see outbound.py
+    def send(self, data, key=None):
+        if self.engine.is_connected():
+            self.engine.send(data, key)
+
+
+    def _send_effect_response(self, effectId, data):
+        with self.lock:
+            if self.engine.state != CONNECTED or self.held:     ## Keep the order if older ones are waiting
+                self.held[data] = effectId                      ## The same bytes twice are only sent once
+                return
+            self._mark_sent(effectId, data)
+        self.engine.send(data)
+
+
+    def _mark_sent(self, effectId, data):                       ## Call with the lock held
+        entry = self.responses.get(effectId)
+        if entry is not None and entry[0] == data:
+            entry[1] = self.generation
+
+
+
+###################################################################################################################
+    ## Connecting, on the network thread ##
+###################################################################################################################
+    def _set_state(self, state, reason):
+        if self.onStateChanged:
+            self.onStateChanged(state, reason)
+
+
+    def _connect(self):
+        if not self.running or self.engine.state != DISCONNECTED:
+            return
+        self._set_state(CONNECTING, "%s:%d" % (self.host, self.port))
+        self.engine._start_connect(self.host, self.port)
+        if self.engine.state == CONNECTING:
+            self.connectTimer = self.engine.call_later(self.connectTimeout, self._on_connect_timeout)
+
+
+    def _on_connect_timeout(self):
+        self.connectTimer = None
+        if self.engine.state == CONNECTING:
+            self.engine._drop_connection("connect timed out")
+
+
+    def _on_connected(self):
+        self._cancel_timers()
+        self.lastSeen = time.monotonic()
+        self.livenessTimer = self.engine.call_later(self.livenessTimeout, self._check_liveness)
+        self._set_state(CONNECTED, "%s:%d" % (self.host, self.port))
+
+        with self.lock:                                     ## Send what waited for us, in order
+            self.generation += 1
+            held = list(self.held.items())
+            self.held.clear()
+            for data, effectId in held:
+                self._mark_sent(effectId, data)
+        for data, effectId in held:
+            self.engine.send(data)
+
+
+    def _on_disconnected(self, reason):
+        self._cancel_timers()
+        self._set_state(DISCONNECTED, reason)
+        if self.running:
+            self.engine.call_later(self.backoff.next(), self._reconnect)
+
+
+    def _reconnect(self):
+        self.reconnects += 1
+        self._connect()
+
+
+    ## Effect responses that didn't make it out go to the front of the held queue, final or not
+    def _on_unsent(self, datas):
+        with self.lock:
+            effectResponses = dict((entry[0], (effectId, entry))
+                                   for items in (self.responses.running_items(), self.responses.answered_items())
+                                   for effectId, entry in items if entry[0] is not None)
+            held = collections.OrderedDict()
+            for data in datas:
+                if data in effectResponses:
+                    effectId, entry = effectResponses[data]
+                    entry[1] = None
+                    held[data] = effectId
+            held.update(self.held)
+            self.held = held
+
+
+    def _on_frames(self, frames):
+        self.lastSeen = time.monotonic()
+        self.backoff.reset()                                ## Only a link that carries messages counts as working
+        if self.onFrames:
+            self.onFrames(frames)
+
+
+    def _check_liveness(self):
+        silent = time.monotonic() - self.lastSeen
+        if silent >= self.livenessTimeout:
+            self.livenessTimer = None
+            self.engine._drop_connection("no message for %.1f s" % silent)
+            return
+        self.livenessTimer = self.engine.call_later(self.livenessTimeout - silent, self._check_liveness)
+
+
+    def _cancel_timers(self):
+        for timer in (self.connectTimer, self.livenessTimer):
+            if timer is not None:
+                self.engine.cancel_timer(timer)
+        self.connectTimer = None
+        self.livenessTimer = None
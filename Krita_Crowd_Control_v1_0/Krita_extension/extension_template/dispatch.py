@@ -0,0 +1,258 @@
+###################################################################################################################
+    ## dispatch.py ##
+
+
+    ## Hands messages from the network thread to the GUI thread without letting them swamp it
+    ##
+    ##  On the network thread, Dispatcher.on_frames():
+    ##      - decodes and checks every message (messages.py). Malformed ones are counted and dropped there
+    ##      - answers GameUpdate polls and KeepAlives right there. They never wait behind effects or painting,
+    ##          and never touch Qt
+    ##      - drops EffectStarts that repeat an id we already have (claim(), see connection.py begin()), so a
+    ##          connector retry never queues, and its cached answer goes back without waiting on the GUI thread
+    ##      - puts everything else in a bounded priority queue (EffectStop first, then EffectStart, then the rest).
+    ##          A Stop whose Start is still waiting goes after it instead, or it would find nothing to stop
+    ##      - a full queue answers EffectStart with Retry straight away, so the backlog can't grow without limit
+    ##      - wakes the GUI thread only when the queue goes from empty to not empty
+    ##
+    ##  On the GUI thread, Dispatcher.drain() runs queued messages until the time budget for this event loop
+    ##      turn is used up, and says whether there is more, so the caller can come back on the next turn.
+    ##      Effects that waited longer than maxAge are answered Retry instead of running late.
+    ##      A handler that raises is logged and its EffectStart answered Failure, the rest of the queue still runs.
+###################################################################################################################
+import heapq                                ## the priority queue
+import itertools                            ## FIFO tie breaker
+import threading                            ## lock between the network and GUI threads
+import time                                 ## perf_counter()
+import traceback                            ## for the log when a handler fails
+
+from .protocol import RequestTypes, EffectStatus
+from .log import log
+from .metrics import metrics                ## counters and timings for the status docker
+from .messages import (                     ## typed messages and pre-serialized replies
+    MessageError,
+    EffectResponse,
+    decode_request,
+    game_update_reply,
+    keep_alive_reply
+)
+
+EFFECT_START = RequestTypes.EffectStart.value       ## Enum .value lookups done once
+EFFECT_STOP = RequestTypes.EffectStop.value
+GAME_UPDATE = RequestTypes.GameUpdate.value
+KEEP_ALIVE = RequestTypes.KeepAlive.value
+RETRY = EffectStatus.Retry.value
+FAILURE = EffectStatus.Failure.value
+
+PRIORITIES = {                              ## Lower runs first. Anything else gets DEFAULT_PRIORITY
+    EFFECT_STOP: 0,                         ## Stopping is cheap and frees a slot for what's queued
+    EFFECT_START: 1,
+}
+DEFAULT_PRIORITY = 2
+
+
+
+###################################################################################################################
+    ## Replies built on the network thread ##
+
+
+    ## GameUpdate and KeepAlive replies are templates in messages.py
+###################################################################################################################
+def retry_reply(request):                   ## When we're too busy
+    return EffectResponse(request.id, RETRY).encode()
+
+
+
+###################################################################################################################
+    ## Bounded priority queue ##
+
+
+    ## put() and pop() can be called from any thread. Same priority keeps arrival order.
+###################################################################################################################
+class DispatchQueue:
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.heap = []                              ## (priority, sequence, enqueuedAt, item, key)
+        self.sequence = itertools.count()
+        self.waiting = {}                           ## key -> priority, for the keyed items in the heap
+        self.lock = threading.Lock()
+
+    ## Returns None when full, otherwise whether the queue was empty before
+    ##      always is taken even when full (EffectStop, it only ever makes the backlog smaller)
+    ##      key names the item while it waits. after is another item's key: while that one waits, this one
+    ##      gets its priority if lower, so arrival order puts it behind it
+    def put(self, priority, item, enqueuedAt, key=None, after=None, always=False):
+        with self.lock:
+            if len(self.heap) >= self.capacity and not always:
+                return None
+            if after is not None:
+                priority = max(priority, self.waiting.get(after, priority))
+            wasEmpty = not self.heap
+            heapq.heappush(self.heap, (priority, next(self.sequence), enqueuedAt, item, key))
+            if key is not None:
+                self.waiting[key] = priority
+            return wasEmpty
+
+    def pop(self):                                  ## (enqueuedAt, item), or None when empty
+        with self.lock:
+            if not self.heap:
+                return None
+            priority, sequence, enqueuedAt, item, key = heapq.heappop(self.heap)
+            if key is not None:
+                self.waiting.pop(key, None)
+            return enqueuedAt, item
+
+    def __len__(self):
+        return len(self.heap)
+
+
+
+###################################################################################################################
+    ## The dispatcher ##
+
+
+    ## send(data, key) - sends encoded bytes to Crowd Control, callable from any thread. key merges replies
+    ##                      still waiting to go out, see outbound.py. None for replies that must all be sent
+    ## wake()          - called on the network thread when work is waiting. Should make the GUI thread call
+    ##                      drain() soon (in Krita, a queued signal)
+    ## budget          - seconds drain() may run per call
+    ## maxAge          - seconds an EffectStart may wait before it's answered Retry instead
+    ## claim(id)       - network thread, for every EffectStart. False for a repeat, which is dropped
+    ## release(id)     - an id claimed but answered Retry or Failure here, so a request with it runs again
+###################################################################################################################
+class Dispatcher:
+    def __init__(self, send, wake, capacity=256, budget=0.008, maxAge=5.0, clock=time.perf_counter,
+                 claim=None, release=None):
+        self.send = send
+        self.wake = wake
+        self.claim = claim
+        self.release = release
+        self.queue = DispatchQueue(capacity)
+        self.budget = budget
+        self.maxAge = maxAge
+        self.clock = clock
+
+        ## Answered on the network thread: (reply, coalesce key, counter). Same state every time, so a backlog
+        ##      of them only needs the newest
+        self.fastHandlers = {
+            GAME_UPDATE: (game_update_reply, "game_update",
+                          metrics.counter("messages_out_total", "Messages to Crowd Control", type="GameUpdate")),
+            KEEP_ALIVE: (keep_alive_reply, "keep_alive",
+                         metrics.counter("messages_out_total", type="KeepAlive")),
+        }
+
+        self.received = 0                           ## Counters, for the logs
+        self.answeredFast = 0
+        self.shed = 0                               ## Answered Retry because we were too busy
+        self.repeats = 0                            ## EffectStarts for ids we already have
+        self.failed = 0                             ## Messages whose handler raised
+        self.malformed = 0
+        self.dropped = 0                            ## Non-effect messages that didn't fit in the queue
+
+        self.inCounters = dict(                     ## Request type value -> counter, looked up once per message
+            (requestType.value, metrics.counter("messages_in_total", "Messages from Crowd Control",
+                                                type=requestType.name))
+            for requestType in RequestTypes)
+        self.unknownIn = metrics.counter("messages_in_total", type="Unknown")
+        self.shedOut = metrics.counter("effect_responses_total", "Effect responses by status", status="Retry")
+        self.decodeTime = metrics.histogram("decode_seconds", "Decoding and checking one message")
+        self.waitTime = metrics.histogram("dispatch_wait_seconds", "From the network thread to the GUI thread")
+        self.handleTime = metrics.histogram("dispatch_handle_seconds", "Running one message on the GUI thread")
+        metrics.gauge("dispatch_queue_depth", self.pending, "Messages waiting for the GUI thread")
+        metrics.gauge("messages_malformed_total", lambda: self.malformed, "Messages that failed decoding")
+        metrics.gauge("messages_shed_total", lambda: self.shed, "EffectStarts answered Retry, too busy")
+        metrics.gauge("messages_dropped_total", lambda: self.dropped, "Other messages that didn't fit")
+        metrics.gauge("messages_repeated_total", lambda: self.repeats, "EffectStarts for ids we already have")
+        metrics.gauge("messages_failed_total", lambda: self.failed, "Messages whose handler raised")
+
+
+    ## Network thread. frames is a list of complete messages from one read
+    def on_frames(self, frames):
+        wake = False
+        now = self.clock()
+        clock = self.clock
+        for frame in frames:
+            self.received += 1
+            started = clock()
+            try:
+                request = decode_request(frame)
+            except MessageError:                        ## Not JSON, not an object, no type, or bad fields
+                self.malformed += 1
+                continue
+            self.decodeTime.observe(clock() - started)
+            requestType = request.type
+            self.inCounters.get(requestType, self.unknownIn).inc()
+
+            fast = self.fastHandlers.get(requestType)
+            if fast is not None:
+                self.answeredFast += 1
+                self.send(fast[0](request), fast[1])
+                fast[2].inc()
+                continue
+
+            if requestType == EFFECT_START and self.claim is not None and not self.claim(request.id):
+                self.repeats += 1                       ## Running already, or answered again by claim()
+                continue
+
+            if requestType == EFFECT_START:             ## A Stop for this id has to wait for it
+                wasEmpty = self.queue.put(PRIORITIES[EFFECT_START], request, now, key=request.id)
+            elif requestType == EFFECT_STOP:
+                wasEmpty = self.queue.put(PRIORITIES[EFFECT_STOP], request, now, after=request.id, always=True)
+            else:
+                wasEmpty = self.queue.put(PRIORITIES.get(requestType, DEFAULT_PRIORITY), request, now)
+            if wasEmpty is None:                        ## Full
+                self._shed(request)
+            elif wasEmpty:
+                wake = True
+        if wake:
+            self.wake()
+
+
+    ## GUI thread. Runs handler(request) for queued messages until the budget is spent.
+    ##      Returns True if messages are left, call again on the next event loop turn
+    def drain(self, handler):
+        start = self.clock()
+        deadline = start + self.budget
+        now = start
+        while True:
+            entry = self.queue.pop()
+            if entry is None:
+                return False
+            enqueuedAt, request = entry
+            self.waitTime.observe(now - enqueuedAt)
+            if request.type == EFFECT_START and start - enqueuedAt > self.maxAge:
+                self._shed(request)                     ## Too late to be fun, let Crowd Control retry
+            else:
+                try:
+                    handler(request)
+                except Exception:                       ## Don't let one message stop the ones behind it
+                    self._failed(request)
+            finished = self.clock()
+            self.handleTime.observe(finished - now)
+            now = finished
+            if now >= deadline:
+                return len(self.queue) > 0
+
+
+    def pending(self):
+        return len(self.queue)
+
+
+    def _failed(self, request):
+        self.failed += 1
+        log.error_dump("Handling %r failed:\n%s", request, traceback.format_exc())
+        if request.type == EFFECT_START:                ## Refund the viewer
+            if self.release is not None:
+                self.release(request.id)
+            self.send(EffectResponse(request.id, FAILURE).encode(), None)
+
+
+    def _shed(self, request):
+        if request.type == EFFECT_START:
+            self.shed += 1
+            if self.release is not None:
+                self.release(request.id)
+            self.send(retry_reply(request), None)
+            self.shedOut.inc()
+        else:
+            self.dropped += 1
@@ -0,0 +1,22 @@
+###################################################################################################################
+    ## effects/__init__.py ##
+
+
+    ## Every effect lives in one of these modules, and registers itself with registry.effect
+    ##
+    ##  To add a module, put it in this folder and add its name to MODULES
+###################################################################################################################
+from ..registry import registry             ## The plugin's effect registry
+
+MODULES = (
+    "canvas",                               ## Spins, nudges and flips
+    "brush",                                ## Brush presets
+    "layer",                                ## Pixel effects on the current layer
+)
+
+
+
+## Import every effect module. Safe to call more than once, Python only imports a module once
+def load_all():
+    registry.load(*[__name__ + "." + name for name in MODULES])
+    return registry
@@ -0,0 +1,85 @@
+###################################################################################################################
+    ## effects/brush.py ##
+
+
+    ## Effects that change the brush: presets and colors
+    ##
+    ##  Both families are tables. To add a brush or a color, add a line, then run tools/gen_effect_list.py
+    ##  Presets are found through context.presets (a PresetIndex, see presets.py), so a redeem costs the same
+    ##      however many presets the user has installed. "rainbow" is an alias for the rainbowPreset setting
+###################################################################################################################
+import random                               ## random color
+
+from ..protocol import EffectStatus
+from ..registry import effect               ## Registers the effects below
+
+FAILURE = EffectStatus.Failure.value
+
+
+
+###################################################################################################################
+    ## Brush presets ##
+
+
+    ## (code, menu name, description, preset names to try in order)
+    ## Krita's bundled preset names change a little between versions, so the default ones list a few
+###################################################################################################################
+BRUSHES = (
+    ("rainbow_paint", "Rainbow Paint", "Rainbow paint!", ("rainbow",)),
+    ("brush_pencil", "Pencil", "Switch to a pencil", ("c) Pencil-2", "c) Pencil-1", "c) Pencil-4 Soft")),
+    ("brush_ink", "Ink Pen", "Switch to an ink pen", ("d) Ink-2 Fineliner", "d) Ink-3 Gpen", "d) Ink-1 Precision")),
+    ("brush_airbrush", "Airbrush", "Switch to a soft airbrush", ("j) Airbrush Soft", "j) Airbrush Soft Low Flow")),
+    ("brush_bristles", "Bristles", "Switch to a rough bristle brush", ("f) Bristles-2 Flat Rough",
+                                                                        "f) Bristles-1 Details")),
+    ("brush_pixel", "Pixel Brush", "Switch to a pixel art brush", ("u) Pixel Art", "b) Basic-1")),
+)
+
+
+
+## Register an effect that sets the current brush preset
+def brush_effect(code, name, description, presetNames):
+    @effect(code, name, category="Brush", description=description)
+    def set_brush(context, request, response):
+        preset = context.presets.get(*presetNames)              ## Direct lookup, see presets.py
+        if preset is None:                                      ## Not installed, refund the viewer
+            response.status = FAILURE
+            return
+        context.active_view().setCurrentBrushPreset(preset)
+    return set_brush
+
+
+
+for code, name, description, presetNames in BRUSHES:
+    brush_effect(code, name, description, presetNames)
+
+
+
+###################################################################################################################
+    ## Paint colors ##
+
+
+    ## (code, menu name, (red, green, blue) 0-255, or None for a random color)
+###################################################################################################################
+COLORS = (
+    ("color_red", "Red Paint", (220, 30, 30)),
+    ("color_green", "Green Paint", (30, 180, 60)),
+    ("color_blue", "Blue Paint", (30, 80, 220)),
+    ("color_black", "Black Paint", (0, 0, 0)),
+    ("color_white", "White Paint", (255, 255, 255)),
+    ("color_random", "Random Paint", None),
+)
+
+
+
+## Register an effect that sets the foreground color
+def color_effect(code, name, rgb):
+    @effect(code, name, category="Color", description="Set the paint color to " + name.split()[0].lower())
+    def set_color(context, request, response):
+        red, green, blue = rgb if rgb is not None else [random.randint(0, 255) for _ in range(3)]
+        context.set_foreground_color(red, green, blue)
+    return set_color
+
+
+
+for code, name, rgb in COLORS:
+    color_effect(code, name, rgb)
@@ -0,0 +1,73 @@
+###################################################################################################################
+    ## effects/canvas.py ##
+
+
+    ## Effects that move the canvas: spins, nudges and flips
+###################################################################################################################
+import math                                 ## sin() for the chaotic spin
+
+from ..registry import effect, registry     ## Registers the effects below
+
+
+
+###################################################################################################################
+    ## Spin curves ##
+
+
+    ## Rotation offset in degrees for progress 0.0 to 1.0, see scheduler.py
+    ## Both end on a whole number of half turns, so the canvas is left straight (or upside down for the slow one)
+    ## How many turns comes from the spinTurns and slowSpinTurns settings, which keep them to whole halves
+###################################################################################################################
+def spin_normal_curve(progress, turns=5):                   ## Full turns at a steady speed
+    return turns * 360 * progress
+
+
+
+def spin_slow_chaotic_curve(progress, turns=0.5):           ## Half a turn, wobbling back and forth on the way
+    wobble = math.sin(2 * math.pi * 3 * progress) * math.sin(2 * math.pi * 0.5 * progress + 1.3)
+    return turns * 360 * progress + 40 * wobble * math.sin(math.pi * progress)
+
+
+
+## Spin the canvas ##
+@effect("spin_canvas", "Spin Canvas", duration=10, category="Canvas",
+        description="Give the canvas a speeen")
+def spin_canvas(context, request, response):
+    duration = registry.get("spin_canvas").requested_duration(request)
+    turns = context.settings.spinTurns
+    return context.start_spin(lambda progress: spin_normal_curve(progress, turns), duration)       ## Do the thing
+
+
+## Slow chaotic spin ##
+@effect("spin_slow_chaotic", "Spin Slow Chaotic", duration=10, category="Canvas",
+        description="Give the canvas a slow chaotic speeen")
+def spin_slow_chaotic(context, request, response):
+    duration = registry.get("spin_slow_chaotic").requested_duration(request)
+    turns = context.settings.slowSpinTurns
+    return context.start_spin(lambda progress: spin_slow_chaotic_curve(progress, turns), duration)  ## Do the thing
+
+
+## Nudge the canvas CW ##
+@effect("nudge_canvas_cw", "Nudge Clockwise", category="Canvas")
+def nudge_canvas_cw(context, request, response):
+    angle = context.settings.nudgeAngle
+    context.each_canvas(lambda canvas: canvas.setRotation(canvas.rotation() + angle))  ## Give it a nudge
+
+
+## Nudge the canvas CCW ##
+@effect("nudge_canvas_ccw", "Nudge Counter Clockwise", category="Canvas")
+def nudge_canvas_ccw(context, request, response):
+    angle = context.settings.nudgeAngle
+    context.each_canvas(lambda canvas: canvas.setRotation(canvas.rotation() - angle))  ## Give it a nudge
+
+
+## Vertical flip ##
+@effect("vertical_flip", "Vertical Flip", category="Canvas")
+def vertical_flip(context, request, response):
+    context.each_canvas(lambda canvas: canvas.setRotation(canvas.rotation() + 180))    ## fleep
+
+
+## Horizontal flip ##
+@effect("horizontal_flip", "Horizontal Flip", category="Canvas")
+def horizontal_flip(context, request, response):
+    context.each_canvas(lambda canvas: canvas.setMirror(not canvas.mirror()))          ## fleep
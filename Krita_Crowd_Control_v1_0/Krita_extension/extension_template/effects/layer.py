@@ -0,0 +1,59 @@
+###################################################################################################################
+    ## effects/layer.py ##
+
+
+    ## Effects that change the pixels of the current layer: invert, hue shift, blur and pixelate
+    ##
+    ##  The math runs in context.layers (a LayerPipeline, see pixels.py), off the GUI thread. The handler only
+    ##      hands the operation over, so the redeem is answered right away and the layer changes a moment later.
+    ##      Too many waiting is Retry, a layer we can't edit (not 8-bit RGBA paint) is Failure, so the viewer is
+    ##      refunded. Without NumPy they're Unavailable, and Crowd Control hides them.
+    ##  How strong they are comes from the settings (hueShift, blurRadius, pixelateSize, see settings.py)
+###################################################################################################################
+from .. import pixels                       ## the operations and the pipeline
+from ..protocol import EffectStatus
+from ..registry import effect               ## Registers the effects below
+
+UNAVAILABLE = EffectStatus.Unavailable.value
+RETRY = EffectStatus.Retry.value
+FAILURE = EffectStatus.Failure.value
+
+
+
+###################################################################################################################
+    ## Layer effects ##
+
+
+    ## (code, menu name, description, make(settings) -> operation)
+###################################################################################################################
+LAYERS = (
+    ("layer_invert", "Invert Layer", "Invert the colors of the current layer",
+     lambda settings: pixels.Invert()),
+    ("layer_hue_shift", "Hue Shift Layer", "Shift the colors of the current layer around the color wheel",
+     lambda settings: pixels.HueShift(settings.hueShift)),
+    ("layer_blur", "Blur Layer", "Blur the current layer",
+     lambda settings: pixels.BoxBlur(settings.blurRadius)),
+    ("layer_pixelate", "Pixelate Layer", "Pixelate the current layer",
+     lambda settings: pixels.Pixelate(settings.pixelateSize)),
+)
+
+
+
+## Register an effect that runs an operation over the current layer
+def layer_effect(code, name, description, make):
+    @effect(code, name, category="Layer", description=description)
+    def apply_to_layer(context, request, response):
+        if not pixels.AVAILABLE:                                ## No NumPy in this Krita's Python
+            response.status = UNAVAILABLE
+            return
+        if not context.layer_editable():                        ## Raises NotReady, so Retry, with no document
+            response.status = FAILURE
+            return
+        if not context.layers.submit(make(context.settings), code):
+            response.status = RETRY
+    return apply_to_layer
+
+
+
+for code, name, description, make in LAYERS:
+    layer_effect(code, name, description, make)
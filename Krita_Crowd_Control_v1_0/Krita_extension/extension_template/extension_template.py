@@ -3,18 +3,21 @@
 
 
     ## It is mostly imports and creating the TestEffects class
-    ## It also creates the menu item "Effects test", which starts the client and begins listening
+    ## It also creates the menu item "Effects test", which starts the client and begins listening,
+    ##      and "Stop effects test", which closes the connection. Krita closing does the same
+    ## TestEffects, and everything it needs (sockets, JSON, the effects), is only imported when that is clicked,
+    ##      so the plugin adds as little as possible to Krita's start up
 
 
-    ## TODO: Add a proper docker window with a connect button, and status read outs
+    ## Status read outs are in the Crowd Control Status docker (status_docker.py)
+    ## Options are in the Crowd Control Settings docker (settings_docker.py)
+    ## TODO: Add a connect button to the docker
 ###################################################################################################################
 from krita import *                                         ## Krita
 
 from PyQt5.QtWidgets import QWidget, QAction                ## For the menu element and click action
 from PyQt5.Qt import PYQT_VERSION_STR                       ## So we can print out the PyQT version
 
-from .effect_functions import TestEffects                   ## Our TestEffects class
-
 
 
 ###################################################################################################################
@@ -25,12 +28,15 @@ from .effect_functions import TestEffects                   ## Our TestEffects c
 class ExtensionTemplate(Extension):
     def __init__(self, parent):
         super().__init__(parent)
+        self.effects = None                                         ## Our TestEffects, made on first use
 
 
 
     ## Called once Krita.instance() exists so we can do plugin setup
     def setup(self):
-        pass
+        notifier = Krita.instance().notifier()
+        notifier.setActive(True)
+        notifier.applicationClosing.connect(self.ShutDown)        ## Close the socket before Qt goes away
 
 
 
@@ -40,8 +46,18 @@ class ExtensionTemplate(Extension):
         qWarning("Python version:\t\t" + sys.version)               ## Python version
         qWarning("PyQT version:\t\t" + PYQT_VERSION_STR)            ## PyQT version
 
-        effects = TestEffects()                                     ## Create our test class
-        effects.start_client_socket()                               ## Start the client, connect to Crowd Control
+        if self.effects is None:                                    ## Only ever one, clicking again just makes
+            from .effect_functions import TestEffects               ##      sure it's connecting. Imported now,
+            self.effects = TestEffects()                            ##      not at Krita start up
+        self.effects.start_client_socket()                          ## Start the client, connect to Crowd Control
+
+
+
+    ## Called by the stop menu element and when Krita closes. Stops the network thread, the layer effect
+    ##      workers and the timers, and closes the socket, before returning
+    def ShutDown(self):
+        if self.effects is not None:
+            self.effects.stop_client_socket()
 
 
 
@@ -51,4 +67,32 @@ class ExtensionTemplate(Extension):
         action = window.createAction("", "Effects test")            ## Create the menu element
         action.triggered.connect(self.StartTest)                    ## Connect it to the StartTest() function
 
+        stop = window.createAction("", "Stop effects test")         ## Disconnect from Crowd Control
+        stop.triggered.connect(self.ShutDown)
+
+        pause = window.createAction("", "Pause timed effects")      ## Pause/resume running timed effects
+        pause.setCheckable(True)
+        pause.toggled.connect(self.PauseEffects)
+
+        undo = window.createAction("", "Undo last layer effect")    ## Layer effects aren't on Krita's undo stack
+        undo.triggered.connect(self.UndoLayerEffect)
+
+
+
+    ## Called by the undo menu element
+    def UndoLayerEffect(self):
+        if self.effects is not None:
+            self.effects.undo_layer_effect()
+
+
+
+    ## Called by the pause menu element
+    def PauseEffects(self, paused):
+        if self.effects is None:                                    ## Nothing running yet
+            return
+        if paused:
+            self.effects.pause_effects()
+        else:
+            self.effects.resume_effects()
+
 
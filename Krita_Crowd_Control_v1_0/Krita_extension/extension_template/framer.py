@@ -0,0 +1,79 @@
+###################################################################################################################
+    ## framer.py ##
+
+
+    ## Incremental decoder for the Crowd Control SimpleTCP stream
+    ##
+    ##  (Crowd Control) Messages are encoded as null terminated UTF-8 strings
+    ##      https://developer.crowdcontrol.live/sdk/simpletcp/index.html#connection-methods
+    ##
+    ##  TCP has no message boundaries, so one recv() can hold several messages, or only part of one.
+    ##  FrameDecoder keeps the unfinished tail between reads and hands back every complete frame in order.
+###################################################################################################################
+TERMINATOR = b"\x00"                                ## Every frame ends with a single null byte
+DEFAULT_MAX_FRAME_SIZE = 1024 * 1024                ## 1 MiB. Effect requests are a few hundred bytes at most
+
+
+
+class FrameDecoder:
+    def __init__(self, maxFrameSize=DEFAULT_MAX_FRAME_SIZE):
+        self.buffer = bytearray()                   ## Unfinished bytes from earlier reads. Reused, never replaced
+        self.scanned = 0                            ## How much of buffer is known to have no terminator in it
+        self.maxFrameSize = maxFrameSize            ## Frames bigger than this are dropped
+        self.discarding = False                     ## True while skipping the rest of an oversized frame
+        self.droppedFrames = 0                      ## How many oversized frames we threw away
+        self.droppedBytes = 0                       ## How many bytes those frames had
+
+
+    ## Bytes waiting for their terminator
+    def pending(self):
+        return len(self.buffer)
+
+
+    ## Forget everything buffered, e.g. after a reconnect
+    def reset(self):
+        del self.buffer[:]
+        self.scanned = 0
+        self.discarding = False
+
+
+    ## Add a chunk from recv() and return a list of every frame it completed, without the terminator
+    ##
+    ##  data can be bytes, bytearray or a memoryview (e.g. a slice of a recv_into() buffer)
+    ##  Only the new bytes are searched for the terminator, the old tail was already searched last time
+    def feed(self, data):
+        frames = []
+        buffer = self.buffer
+        buffer += data                              ## Appends in place, the bytearray keeps its allocation
+
+        start = 0                                   ## Start of the frame we're looking at
+        searchFrom = self.scanned                   ## Skip what we already know has no terminator
+        while True:
+            end = buffer.find(TERMINATOR, searchFrom)
+            if end < 0:                             ## No more complete frames
+                break
+
+            if self.discarding:                     ## This terminator ends an oversized frame, drop it
+                self.discarding = False
+                self.droppedBytes += end - start
+            elif end - start > self.maxFrameSize:   ## Complete, but too big
+                self.droppedFrames += 1
+                self.droppedBytes += end - start
+            else:
+                frames.append(bytes(buffer[start:end]))
+
+            start = end + 1                         ## Next frame starts after the terminator
+            searchFrom = start
+
+        if start:                                   ## Drop consumed bytes. Deleting from the front of a
+            del buffer[:start]                      ##      bytearray is cheap, it just moves the start offset
+
+        if len(buffer) > self.maxFrameSize:         ## The unfinished frame is already too big, stop keeping it
+            if not self.discarding:
+                self.discarding = True
+                self.droppedFrames += 1
+            self.droppedBytes += len(buffer)
+            del buffer[:]
+
+        self.scanned = len(buffer)                  ## Everything left has been searched
+        return frames
@@ -0,0 +1,195 @@
+###################################################################################################################
+    ## host.py ##
+
+
+    ## What the bridge needs from the program it runs in
+    ##
+    ##  Everything that touches Krita or Qt goes through a Host, so bridge.py, the effects and everything below
+    ##      them run the same inside Krita (krita_host.py) and outside it, on the headless stand-in the
+    ##      benchmarks use (tools/fake_krita.py).
+    ##
+    ##  Two halves:
+    ##      Krita   - the canvas, the view, resources, settings (the store settings.py reads) and where the
+    ##                  log goes
+    ##      Event loop - timers on the GUI thread, and post() to get from the network thread to the GUI thread
+    ##
+    ##  canvas() and active_view() raise NotReady when there is nothing to show an effect on (no window, no
+    ##      document). The effect engine answers those requests Retry, so Crowd Control tries again later.
+    ##  ViewCache keeps the view and canvas between calls, so a frame doesn't walk
+    ##      Krita.instance().activeWindow().activeView().canvas() every time. The host invalidates it when
+    ##      the active view may have changed.
+    ##
+    ##  Effects can target more than the active view (TARGETS below). Qt merges a canvas' updates into one
+    ##      paint per event loop turn, so changing one property on each of them needs nothing more. A change
+    ##      that sets several properties on each canvas can go in an updates_suppressed() section instead.
+    ##      Only windows with more than one targeted view are held: re-enabling a window repaints all of it,
+    ##      dockers and toolbars too, so this costs more than it saves for anything smaller.
+    ##
+    ##  Layer effects (pixels.py) read and write the active layer's pixels through read_layer() and
+    ##      write_layer(), on the GUI thread.
+###################################################################################################################
+import abc                                  ## the interface's abstract methods
+import contextlib                           ## nullcontext, for hosts that can't hold repaints
+import sys                                  ## stderr, the default log sink
+
+TARGET_ACTIVE = "active"                    ## The active view only
+TARGET_DOCUMENT = "document"                ## Every view of the active document, in any window
+TARGET_ALL = "all"                          ## Every view in every window
+TARGETS = (TARGET_ACTIVE, TARGET_DOCUMENT, TARGET_ALL)
+
+
+
+class NotReady(Exception):                  ## No window or document to run an effect on, yet
+    pass
+
+
+
+###################################################################################################################
+    ## Cached view and canvas ##
+
+
+    ## resolve() returns the active view, or None when there isn't one. It's only called after invalidate(),
+    ##      or while nothing was ready, so a document opened without us hearing about it is still found
+    ## resolveTargets(mode) returns (canvases, surfaces) for a TARGETS mode: the canvases to change, and
+    ##      whatever the host holds repaints on (windows with more than one of them). Cached per mode the same way
+###################################################################################################################
+class ViewCache:
+    def __init__(self, resolve, resolveTargets=None):
+        self.resolve = resolve
+        self.resolveTargets = resolveTargets
+        self.cachedView = None
+        self.cachedCanvas = None
+        self.cachedTargets = {}                     ## mode -> (canvases, surfaces)
+        self.resolves = 0                           ## How many times we walked to the view, for the benchmarks
+
+
+    def invalidate(self, *args):                    ## Takes and ignores signal arguments
+        self.cachedView = None
+        self.cachedCanvas = None
+        self.cachedTargets = {}
+
+
+    def view(self):
+        if self.cachedView is None:
+            self._resolve()
+        return self.cachedView
+
+
+    def canvas(self):
+        if self.cachedCanvas is None:
+            self._resolve()
+        return self.cachedCanvas
+
+
+    def _resolve(self):
+        self.resolves += 1
+        view = self.resolve()
+        if view is None:
+            raise NotReady("no document open")
+        canvas = view.canvas()
+        if canvas is None:
+            raise NotReady("the view has no canvas")
+        self.cachedView = view
+        self.cachedCanvas = canvas
+
+
+    def targets(self, mode):
+        targets = self.cachedTargets.get(mode)
+        if targets is None:
+            if self.resolveTargets is None:
+                targets = ([self.canvas()], [])
+            else:
+                self.resolves += 1
+                targets = self.resolveTargets(mode)
+                if not targets[0]:
+                    raise NotReady("no document open")
+            self.cachedTargets[mode] = targets
+        return targets
+
+
+
+###################################################################################################################
+    ## The interface ##
+
+
+    ## The abstract methods are what every host has to have. A host missing one can't be made at all, rather
+    ##      than failing halfway through an effect. The others have defaults for hosts that can't do them
+###################################################################################################################
+class Host(abc.ABC):
+###################################################################################################################
+    ## Krita ##
+###################################################################################################################
+    @abc.abstractmethod
+    def canvas(self):                               ## The active view's canvas. Raises NotReady
+        raise NotImplementedError
+
+
+    @abc.abstractmethod
+    def active_view(self):                          ## Raises NotReady
+        raise NotImplementedError
+
+
+    def target_canvases(self, mode):                ## Canvases for a TARGETS mode. Raises NotReady
+        return [self.canvas()]
+
+
+    ## Context manager. Changes to the mode's canvases inside it are painted once, when it ends
+    def updates_suppressed(self, mode):
+        return contextlib.nullcontext()
+
+
+    @abc.abstractmethod
+    def resources(self, kind):                      ## {name: resource}, e.g. resources("preset")
+        raise NotImplementedError
+
+
+    ## Whether read_layer() would give pixels, without reading them. Raises NotReady
+    def layer_editable(self):
+        return False
+
+
+    ## (layer, pixels, width, height) for the active layer of the active document. pixels is bytes-like,
+    ##      8-bit BGRA, width * height * 4 long. None if the layer isn't an 8-bit RGBA paint layer.
+    ##      Raises NotReady
+    def read_layer(self):
+        return None
+
+
+    ## Replace all of layer's pixels (bytes-like, as read_layer gives them) and repaint
+    @abc.abstractmethod
+    def write_layer(self, layer, pixels, width, height):
+        raise NotImplementedError
+
+
+    @abc.abstractmethod
+    def set_foreground_color(self, red, green, blue):       ## 0-255 each
+        raise NotImplementedError
+
+
+    def read_setting(self, group, name, default):  ## Strings, like Krita's kritarc
+        return default
+
+
+    def write_setting(self, group, name, value):    ## value is a string
+        pass
+
+
+    def log_sink(self):                             ## Function taking one line of log text
+        return lambda text: sys.stderr.write(text + "\n")
+
+
+
+###################################################################################################################
+    ## Event loop ##
+###################################################################################################################
+    ## A repeating timer on the GUI thread that calls callback(). Has start(milliseconds) and stop(), like QTimer
+    @abc.abstractmethod
+    def make_timer(self, callback):
+        raise NotImplementedError
+
+
+    ## Run function() on the GUI thread on a later event loop turn. Callable from any thread, never runs it
+    ##      right away, even when called from the GUI thread
+    @abc.abstractmethod
+    def post(self, function):
+        raise NotImplementedError
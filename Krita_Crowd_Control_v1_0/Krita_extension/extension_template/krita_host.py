@@ -0,0 +1,224 @@
+###################################################################################################################
+    ## krita_host.py ##
+
+
+    ## The Host (host.py) for running inside Krita
+###################################################################################################################
+from krita import *                         ## Krita
+
+import abc                                  ## ABCMeta, for the metaclass below
+import contextlib                           ## updates_suppressed()
+
+from .host import (                         ## the interface bridge.py uses, and the view cache
+    Host,
+    NotReady,
+    ViewCache,
+    TARGET_ACTIVE,
+    TARGET_DOCUMENT
+)
+
+from PyQt5.QtGui import QColor              ## paint colors
+from PyQt5.QtCore import (
+    Qt,                                     ## timer type, queued connections
+    QObject,                                ## for the signal
+    QByteArray,                             ## layer pixels for Krita
+    QTimer,                                 ## the animation frame clock
+    pyqtSignal                              ## post() from the network thread
+)
+
+
+
+###################################################################################################################
+    ## Krita's settings store ##
+
+
+    ## kritarc, for settings.py. __init__.py binds the extension's settings to it at startup, before there is
+    ##      a KritaHost
+###################################################################################################################
+class KritaSettingsStore:
+    def read_setting(self, group, name, default):
+        return Krita.instance().readSetting(group, name, default)
+
+
+    def write_setting(self, group, name, value):
+        Krita.instance().writeSetting(group, name, value)
+
+
+
+###################################################################################################################
+    ## The host ##
+###################################################################################################################
+def shared_windows(views):                          ## QMainWindows showing more than one of views, in order
+    counts = {}
+    windows = []
+    for view in views:
+        window = view.window().qwindow()
+        key = id(window)
+        counts[key] = counts.get(key, 0) + 1
+        if counts[key] == 2:
+            windows.append(window)
+    return windows
+
+
+
+class _HostMeta(type(QObject), abc.ABCMeta):        ## QObject's metaclass and Host's, so both can be bases
+    pass
+
+
+
+class KritaHost(QObject, Host, metaclass=_HostMeta):
+    posted = pyqtSignal(object)                     ## A function for the GUI thread, emitted from any thread
+
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.posted.connect(self._run_posted, Qt.QueuedConnection)     ## Always through the event loop
+
+        self.views = ViewCache(self._active_view, self._targets)    ## Walked again only when something changed
+        self.watchedWindows = set()                         ## QMainWindows we get activeViewChanged from
+        notifier = Krita.instance().notifier()
+        notifier.setActive(True)
+        notifier.windowCreated.connect(self._watch_windows)
+        notifier.viewCreated.connect(self.views.invalidate)
+        notifier.viewClosed.connect(self.views.invalidate)
+        notifier.imageClosed.connect(self.views.invalidate)
+        self._watch_windows()
+
+
+    def _run_posted(self, function):
+        function()
+
+
+
+###################################################################################################################
+    ## Krita ##
+###################################################################################################################
+    def _active_view(self):                                 ## For the cache. None when nothing is open
+        window = Krita.instance().activeWindow()
+        if window is None:
+            return None
+        return window.activeView()
+
+
+    ## For the cache: (canvases, QMainWindows to hold repaints on). Turning a main window's updates back on
+    ##      repaints all of it, dockers and toolbars too, so that's only worth it for a window with more than
+    ##      one targeted canvas. A lone canvas repaints just itself
+    def _targets(self, mode):
+        active = self._active_view()
+        if active is None:
+            return [], []
+        if mode == TARGET_ACTIVE:
+            views = [active]
+        elif mode == TARGET_DOCUMENT:
+            document = active.document()
+            views = [view for view in Krita.instance().views() if view.document() == document]
+        else:
+            views = Krita.instance().views()
+        return [view.canvas() for view in views], shared_windows(views)
+
+
+    def _watch_windows(self):                               ## Any window switching views invalidates the cache
+        self.views.invalidate()
+        for window in Krita.instance().windows():
+            key = id(window.qwindow())
+            if key not in self.watchedWindows:
+                self.watchedWindows.add(key)
+                window.activeViewChanged.connect(self.views.invalidate)
+                window.windowClosed.connect(self._window_closed)
+
+
+    def _window_closed(self):
+        self.views.invalidate()
+        self.watchedWindows = set(id(window.qwindow()) for window in Krita.instance().windows())
+
+
+    def active_view(self):
+        return self.views.view()
+
+
+    def canvas(self):
+        return self.views.canvas()
+
+
+    def target_canvases(self, mode):
+        return self.views.targets(mode)[0]
+
+
+    ## Hold repaints on the windows with more than one targeted view. Turning updates back on repaints each whole
+    @contextlib.contextmanager
+    def updates_suppressed(self, mode):
+        windows = self.views.targets(mode)[1]
+        for window in windows:
+            window.setUpdatesEnabled(False)
+        try:
+            yield
+        finally:
+            for window in windows:
+                window.setUpdatesEnabled(True)
+
+
+    def resources(self, kind):
+        return Krita.instance().resources(kind)
+
+
+    def _editable_node(self):                               ## (document, node), or None
+        document = Krita.instance().activeDocument()
+        if document is None:
+            raise NotReady("no document open")
+        node = document.activeNode()
+        if (node is None or node.type() != "paintlayer" or
+                node.colorModel() != "RGBA" or node.colorDepth() != "U8"):
+            return None
+        return document, node
+
+
+    def layer_editable(self):
+        return self._editable_node() is not None
+
+
+    def read_layer(self):
+        layer = self._editable_node()
+        if layer is None:
+            return None
+        document, node = layer
+        width, height = document.width(), document.height()
+        pixels = node.pixelData(0, 0, width, height)                        ## A QByteArray, NumPy reads it as is
+        return layer, pixels, width, height
+
+
+    def write_layer(self, layer, pixels, width, height):
+        document, node = layer
+        node.setPixelData(QByteArray(pixels), 0, 0, width, height)          ## One write, however many bands
+        document.refreshProjection()
+
+
+    def set_foreground_color(self, red, green, blue):
+        view = self.active_view()
+        view.setForeGroundColor(ManagedColor.fromQColor(QColor(red, green, blue), view.canvas()))
+
+
+    def read_setting(self, group, name, default):
+        return Krita.instance().readSetting(group, name, default)
+
+
+    def write_setting(self, group, name, value):
+        Krita.instance().writeSetting(group, name, value)
+
+
+    def log_sink(self):
+        return qWarning
+
+
+
+###################################################################################################################
+    ## Event loop ##
+###################################################################################################################
+    def make_timer(self, callback):                 ## Precise, frames should be 16ms apart, not 15 to 31
+        timer = QTimer(self)
+        timer.setTimerType(Qt.PreciseTimer)
+        timer.timeout.connect(callback)
+        return timer
+
+
+    def post(self, function):
+        self.posted.emit(function)
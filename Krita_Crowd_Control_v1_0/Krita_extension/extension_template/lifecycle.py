@@ -0,0 +1,261 @@
+###################################################################################################################
+    ## lifecycle.py ##
+
+
+    ## Tracks every effect from request to finish, by request id
+    ##
+    ##  Instant effects run and answer straight away. Timed effects hold a slot until they finish:
+    ##      - effects with different slots run at the same time (a spin and a slow chaotic spin)
+    ##      - an effect whose slot is taken waits in that slot's queue and is answered Queue. When it gets
+    ##          to run it is answered Success with its time remaining
+    ##      - a full queue is answered Retry, so Crowd Control tries again later instead of waiting on us
+    ##      - pause_all()/resume_all() answer Paused/Resumed with the time remaining, and the effect's
+    ##          animation holds still in between
+    ##      - EffectStop, or the animation ending, answers Finished and lets the next queued effect in
+    ##
+    ##  An effect's slot is its registry group, or its code when it has no group
+###################################################################################################################
+import collections                          ## deque for the slot queues
+import time                                 ## monotonic()
+import traceback                            ## for the log when a handler fails
+
+from .protocol import EffectStatus
+from .messages import EffectResponse
+from .host import NotReady
+from .metrics import metrics
+from .log import log
+
+SUCCESS = EffectStatus.Success.value                ## Enum .value lookups done once
+FAILURE = EffectStatus.Failure.value
+RETRY = EffectStatus.Retry.value
+QUEUE = EffectStatus.Queue.value
+PAUSED = EffectStatus.Paused.value
+RESUMED = EffectStatus.Resumed.value
+FINISHED = EffectStatus.Finished.value
+
+
+
+###################################################################################################################
+    ## Instance states ##
+###################################################################################################################
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED_STATE = "paused"
+DONE = "done"
+
+
+
+###################################################################################################################
+    ## One effect request ##
+###################################################################################################################
+class EffectInstance:
+    __slots__ = ("id", "info", "request", "slot", "state", "handle", "queuedAt")
+
+    def __init__(self, info, request, queuedAt):
+        self.id = request.id
+        self.info = info                            ## EffectInfo from the registry
+        self.request = request
+        self.slot = info.group or info.code
+        self.state = QUEUED
+        self.handle = None                          ## The running Animation, for timed effects
+        self.queuedAt = queuedAt
+
+    def duration(self):                             ## Seconds
+        return self.info.requested_duration(self.request)
+
+    def remaining(self, now):                       ## Seconds left
+        if self.handle is not None:
+            return self.handle.remaining(now)
+        return self.duration() if self.state != DONE else 0.0
+
+
+
+###################################################################################################################
+    ## The engine ##
+
+
+    ## context       - what the handlers get as their first argument (the Bridge)
+    ## scheduler     - the AnimationScheduler the timed effects' animations run on
+    ## send(response, final) - sends an EffectResponse (messages.py). final=False for responses that aren't
+    ##                   the last one for their id. response.status == RETRY must let the id be reused
+    ## maxQueue      - how many effects can wait per slot before we answer Retry
+###################################################################################################################
+class EffectEngine:
+    def __init__(self, context, scheduler, send, maxQueue=8, clock=time.monotonic):
+        self.context = context
+        self.scheduler = scheduler
+        self.send = send
+        self.maxQueue = maxQueue
+        self.clock = clock
+
+        self.instances = {}                         ## request id -> EffectInstance, queued or running
+        self.active = {}                            ## slot -> the running EffectInstance
+        self.queues = {}                            ## slot -> deque of waiting EffectInstances
+        self.paused = False
+        self.runTimes = {}                          ## effect code -> histogram of handler run times
+
+
+
+###################################################################################################################
+    ## Requests ##
+###################################################################################################################
+    def start(self, info, request):
+        if not info.is_timed():                     ## Instant effects don't hold a slot
+            response = self._response(request.id, SUCCESS)
+            self._run_handler(info, request, response)
+            self.send(response, True)
+            return
+
+        instance = EffectInstance(info, request, self.clock())
+        if instance.slot not in self.active and not self.paused:
+            self._run(instance)
+            return
+
+        queue = self.queues.setdefault(instance.slot, collections.deque())
+        if len(queue) >= self.maxQueue:             ## Too much waiting already, Crowd Control can try later
+            self.send(self._response(instance.id, RETRY), True)
+            return
+        queue.append(instance)
+        self.instances[instance.id] = instance
+        self.send(self._response(instance.id, QUEUE), False)
+
+
+    ## EffectStop. Stops the instance with this request id, or else every instance of the request's effect code
+    def stop(self, request):
+        instance = self.instances.get(request.id)
+        if instance is not None:
+            self._stop(instance)
+            return True
+        code = request.code
+        matches = [instance for instance in self.instances.values() if instance.info.code == code]
+        for instance in matches:
+            self._stop(instance)
+        return bool(matches)
+
+
+    ## Queued ones first (refunded with Failure), so finishing a running one doesn't start them
+    def stop_all(self):
+        for instance in [instance for instance in self.instances.values() if instance.state == QUEUED]:
+            self._stop(instance)
+        for instance in list(self.instances.values()):
+            self._stop(instance)
+
+
+    def pause_all(self):
+        if self.paused:
+            return
+        self.paused = True
+        now = self.clock()
+        for instance in self.active.values():
+            instance.state = PAUSED_STATE
+            instance.handle.pause(now)
+            self.send(self._response(instance.id, PAUSED, instance.remaining(now)), False)
+
+
+    def resume_all(self):
+        if not self.paused:
+            return
+        self.paused = False
+        now = self.clock()
+        for instance in list(self.active.values()):
+            instance.state = RUNNING
+            instance.handle.resume(now)
+            self.send(self._response(instance.id, RESUMED, instance.remaining(now)), False)
+        for slot in list(self.queues):              ## Anything that queued up while we were paused
+            self._start_next(slot)
+
+
+    ## Seconds left for a request id, None if we don't have it
+    def remaining(self, effectId):
+        instance = self.instances.get(effectId)
+        if instance is None:
+            return None
+        return instance.remaining(self.clock())
+
+
+    def running(self):                              ## Running or paused instances
+        return list(self.active.values())
+
+
+    def queued(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+
+
+###################################################################################################################
+    ## Running and finishing ##
+###################################################################################################################
+    def _response(self, effectId, status, remaining=None):
+        if remaining is not None:
+            return EffectResponse(effectId, status, int(remaining * 1000))
+        return EffectResponse(effectId, status)
+
+
+    def _run_handler(self, info, request, response):
+        runTime = self.runTimes.get(info.code)
+        if runTime is None:
+            runTime = self.runTimes[info.code] = metrics.histogram(
+                "effect_run_seconds", "Time in an effect's handler", code=info.code)
+        started = time.perf_counter()
+        try:
+            return info.handler(self.context, request, response)
+        except NotReady:                            ## No document open. Crowd Control tries again later
+            response.status = RETRY
+            return None
+        except Exception:                           ## Refund the viewer instead of killing the read loop
+            log.error_dump("Effect %s failed:\n%s", info.code, traceback.format_exc())
+            response.status = FAILURE
+            return None
+        finally:
+            runTime.observe(time.perf_counter() - started)
+
+
+    def _run(self, instance):
+        response = self._response(instance.id, SUCCESS, instance.duration())
+        handle = self._run_handler(instance.info, instance.request, response)
+        if response.status != SUCCESS or handle is None:     ## Didn't start, that's its only answer
+            self.instances.pop(instance.id, None)
+            self.send(response, True)
+            self._start_next(instance.slot)
+            return
+
+        instance.state = RUNNING
+        instance.handle = handle
+        handle.onFinished = lambda animation: self._on_finished(instance)
+        self.instances[instance.id] = instance
+        self.active[instance.slot] = instance
+        self.send(response, False)
+
+
+    def _stop(self, instance):
+        if instance.state == QUEUED:                ## Never ran, so it's refunded
+            self.queues[instance.slot].remove(instance)
+            self.instances.pop(instance.id, None)
+            instance.state = DONE
+            self.send(self._response(instance.id, FAILURE), True)
+            return
+        self.scheduler.remove(instance.handle)      ## Calls _on_finished through onFinished
+
+
+    def _on_finished(self, instance):
+        if instance.state == DONE:
+            return
+        instance.state = DONE
+        self.instances.pop(instance.id, None)
+        if self.active.get(instance.slot) is instance:
+            del self.active[instance.slot]
+        self.send(self._response(instance.id, FINISHED, 0), True)
+        self._start_next(instance.slot)
+
+
+    def _start_next(self, slot):
+        if self.paused or slot in self.active:
+            return
+        queue = self.queues.get(slot)
+        while queue:
+            instance = queue.popleft()
+            self._run(instance)
+            if slot in self.active:                 ## Started. Otherwise it failed, try the next one
+                break
+        if not queue:
+            self.queues.pop(slot, None)
@@ -0,0 +1,183 @@
+###################################################################################################################
+    ## log.py ##
+
+
+    ## Leveled, lazy, rate-limited logging for the plugin
+    ##
+    ##  log.debug("Received %s", data) only formats the message if debug is enabled. With the default level
+    ##      (warning) a GameUpdate poll costs one integer compare, not eight string builds.
+    ##  A key rate-limits a message: log.debug("Poll %s", id, key="GameUpdate") is let through at most `rate`
+    ##      times per second (set with limit()), and the next one that gets through says how many were skipped.
+    ##  The ring buffer, when enabled, keeps the last N records at ringLevel even if they weren't printed,
+    ##      still unformatted. dump() prints them, e.g. when something goes wrong, to see what led up to it.
+    ##
+    ##  The sink is a function taking one string. Krita's is qWarning, set by whoever configures the log.
+###################################################################################################################
+import collections                          ## deque for the ring buffer
+import sys                                  ## stderr, the default sink
+import threading                            ## the network thread logs too
+import time                                 ## monotonic(), for rate limits and ring timestamps
+
+
+
+###################################################################################################################
+    ## Levels ##
+###################################################################################################################
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVEL_NAMES = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR, "off": OFF}
+LEVEL_LABELS = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+
+def level_from_name(name, default=WARNING):        ## "debug" -> DEBUG. Numbers pass through
+    if isinstance(name, int):
+        return name
+    return LEVEL_NAMES.get(str(name).strip().lower(), default)
+
+
+
+def _stderr_sink(text):
+    sys.stderr.write(text + "\n")
+
+
+
+###################################################################################################################
+    ## Rate limit for one key ##
+
+
+    ## Token bucket: `rate` messages per second on average, up to `burst` at once
+###################################################################################################################
+class _Limit:
+    __slots__ = ("rate", "burst", "tokens", "updated", "suppressed")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+        self.suppressed = 0
+
+    def allow(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        self.suppressed += 1
+        return False
+
+
+
+###################################################################################################################
+    ## The logger ##
+###################################################################################################################
+class Logger:
+    def __init__(self, sink=_stderr_sink, level=WARNING, ringSize=0, ringLevel=DEBUG, clock=time.monotonic):
+        self.sink = sink
+        self.level = level
+        self.clock = clock
+        self.limits = {}                            ## key -> _Limit
+        self.lock = threading.Lock()                ## Guards limits
+        self.ring = None
+        self.ringLevel = OFF
+        self.set_ring(ringSize, ringLevel)
+
+
+    ## Keep the last size records at ringLevel or above, for dump(). 0 turns the ring off
+    def set_ring(self, size, ringLevel=DEBUG):
+        self.ring = collections.deque(maxlen=size) if size > 0 else None
+        self.ringLevel = ringLevel if size > 0 else OFF
+
+
+    ## Let messages with this key through at most rate times a second, burst at once
+    def limit(self, key, rate, burst=1):
+        with self.lock:
+            self.limits[key] = _Limit(rate, burst, self.clock())
+
+
+    ## Lowest level anything is recorded at. Check this before building expensive arguments
+    def enabled(self, level):
+        return level >= self.level or level >= self.ringLevel
+
+
+    ## Settings dict, e.g. from Krita's settings:
+    ##      {"level": "info", "ring": 500, "ringLevel": "debug", "limits": {"GameUpdate": 1.0}}
+    def configure(self, config):
+        if "level" in config:
+            self.level = level_from_name(config["level"])
+        if "ring" in config:
+            self.set_ring(int(config["ring"]), level_from_name(config.get("ringLevel", DEBUG)))
+        for key, rate in config.get("limits", {}).items():
+            self.limit(key, float(rate))
+
+
+    def log(self, level, message, *args, **kwargs):
+        if level < self.level and level < self.ringLevel:
+            return                                  ## The common case: nothing to do, nothing formatted
+        show = level >= self.level
+        key = kwargs.get("key")
+        suppressed = 0
+        if show and key is not None:
+            with self.lock:
+                limit = self.limits.get(key)
+                if limit is not None:
+                    if limit.allow(self.clock()):
+                        suppressed, limit.suppressed = limit.suppressed, 0
+                    else:
+                        show = False                ## Over the limit, only the ring gets it
+
+        if self.ring is not None and level >= self.ringLevel:
+            self.ring.append((self.clock(), level, message, args))      ## Still unformatted
+        if show:
+            text = message % args if args else message
+            if suppressed:
+                text += " (%d similar skipped)" % suppressed
+            self.sink(text)
+
+
+    def debug(self, message, *args, **kwargs):
+        self.log(DEBUG, message, *args, **kwargs)
+
+    def info(self, message, *args, **kwargs):
+        self.log(INFO, message, *args, **kwargs)
+
+    def warning(self, message, *args, **kwargs):
+        self.log(WARNING, message, *args, **kwargs)
+
+    def error(self, message, *args, **kwargs):
+        self.log(ERROR, message, *args, **kwargs)
+
+
+    ## Error that also dumps the ring buffer, to show what led up to it
+    def error_dump(self, message, *args, **kwargs):
+        self.log(ERROR, message, *args, **kwargs)
+        self.dump()
+
+
+    ## Print the ring buffer through the sink and empty it
+    def dump(self):
+        if not self.ring:
+            return
+        records = list(self.ring)
+        self.ring.clear()
+        now = self.clock()
+        self.sink("---- last %d log records ----" % len(records))
+        for when, level, message, args in records:
+            try:
+                text = message % args if args else message
+            except (TypeError, ValueError):
+                text = "%s %r" % (message, args)
+            self.sink("%8.3fs ago %-7s %s" % (now - when, LEVEL_LABELS.get(level, level), text))
+        self.sink("---- end of log records ----")
+
+
+
+###################################################################################################################
+    ## The plugin's logger ##
+###################################################################################################################
+log = Logger()
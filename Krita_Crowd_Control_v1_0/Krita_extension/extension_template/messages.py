@@ -0,0 +1,257 @@
+###################################################################################################################
+    ## messages.py ##
+
+
+    ## Typed Crowd Control messages, decoded straight from the bytes the framer hands us
+    ##
+    ##  decode_request(frame) parses one message and checks it against the ConnectorLib.JSON schema:
+    ##      a JSON object, an int 'type', an int 'id' when there is one, and for effect requests a string 'code'
+    ##      and numbers where numbers belong. Anything else raises MessageError (a ValueError) right there, on
+    ##      the network thread, instead of a KeyError deep inside a Qt slot.
+    ##  The result is a __slots__ object (Request, or EffectRequest for EffectTest/Start/Stop), so reading
+    ##      request.id is an attribute load, not a dict lookup with a string key.
+    ##
+    ##  Replies are encoded straight to null terminated bytes:
+    ##      - fixed replies (GameUpdate "state: 1", KeepAlive) are pre-serialized templates, only the id is filled in
+    ##      - EffectResponse without a message uses a template as well, with a message it goes through the backend
+    ##
+    ##  The JSON backend is orjson when it is installed, the standard library json module when it isn't.
+    ##      Both read bytes, so nothing is decoded to str first. set_backend() switches, for the benchmarks
+###################################################################################################################
+import json                                 ## the fallback backend
+import math                                 ## isfinite(), json reads NaN and Infinity
+
+from .protocol import RequestTypes, ResponseTypes, EffectStatus
+
+try:                                        ## Optional, much faster on both ends. Not shipped with Krita
+    import orjson
+except ImportError:
+    orjson = None
+
+EFFECT_TEST = RequestTypes.EffectTest.value         ## Enum .value lookups done once
+EFFECT_START = RequestTypes.EffectStart.value
+EFFECT_STOP = RequestTypes.EffectStop.value
+EFFECT_REQUEST = ResponseTypes.EffectRequest.value
+GAME_UPDATE_RESPONSE = ResponseTypes.GameUpdate.value
+KEEP_ALIVE_RESPONSE = ResponseTypes.KeepAlive.value
+
+STATUSES = frozenset(status.value for status in EffectStatus)
+
+
+
+###################################################################################################################
+    ## JSON backend ##
+###################################################################################################################
+_stdlibEncoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+
+
+def _stdlib_dumps(value):                   ## -> UTF-8 bytes, same compact output as orjson
+    return _stdlibEncoder.encode(value).encode("utf-8")
+
+
+BACKENDS = {"json": (json.loads, _stdlib_dumps)}
+if orjson is not None:
+    BACKENDS["orjson"] = (orjson.loads, orjson.dumps)
+
+BACKEND = None                              ## Name of the backend in use
+_loads = _dumps = None
+
+
+
+def set_backend(name):
+    global BACKEND, _loads, _dumps
+    _loads, _dumps = BACKENDS[name]
+    BACKEND = name
+
+
+set_backend("orjson" if orjson is not None else "json")
+
+
+
+def loads(data):                            ## bytes -> value
+    return _loads(data)
+
+
+
+def dumps(value):                           ## value -> UTF-8 bytes, not null terminated
+    return _dumps(value)
+
+
+
+class MessageError(ValueError):             ## The message isn't one we can read
+    pass
+
+
+
+###################################################################################################################
+    ## Field checks ##
+###################################################################################################################
+def _int(fields, name, required=False):
+    value = fields.get(name)
+    if value is None:
+        if required:
+            raise MessageError("missing '%s'" % name)
+        return None
+    if type(value) is not int:              ## Not bool either, that's an int subclass
+        raise MessageError("'%s' must be an integer, got %r" % (name, value))
+    return value
+
+
+
+def _number(fields, name):
+    value = fields.get(name)
+    if value is None:
+        return None
+    if type(value) not in (int, float) or not math.isfinite(value) or value < 0:
+        raise MessageError("'%s' must be a finite number >= 0, got %r" % (name, value))
+    return value
+
+
+
+def _string(fields, name, required=False):
+    value = fields.get(name)
+    if value is None:
+        if required:
+            raise MessageError("missing '%s'" % name)
+        return None
+    if not isinstance(value, str):
+        raise MessageError("'%s' must be a string, got %r" % (name, value))
+    return value
+
+
+
+###################################################################################################################
+    ## Requests ##
+
+
+    ## Every request type has an id and a type. Types we don't know a schema for stay a plain Request,
+    ##      the random last entry Crowd Control sometimes sends is future proofing, it isn't an error
+###################################################################################################################
+class Request:
+    __slots__ = ("id", "type")
+
+    def __init__(self, id, type):
+        self.id = id                                ## None if Crowd Control didn't send one
+        self.type = type                            ## RequestTypes value
+
+    @classmethod
+    def from_fields(cls, requestType, fields):
+        return cls(_int(fields, "id"), requestType)
+
+    def __repr__(self):
+        fields = ", ".join("%s=%r" % (name, getattr(self, name)) for name in self._fields())
+        return "%s(%s)" % (type(self).__name__, fields)
+
+    @classmethod
+    def _fields(cls):
+        names = []
+        for klass in reversed(cls.__mro__):
+            names.extend(klass.__dict__.get("__slots__", ()))
+        return names
+
+
+
+## EffectTest, EffectStart and EffectStop
+class EffectRequest(Request):
+    __slots__ = ("code", "viewer", "cost", "duration", "parameters")
+
+    def __init__(self, id, type, code=None, viewer=None, cost=None, duration=None, parameters=None):
+        Request.__init__(self, id, type)
+        self.code = code                            ## Effect code. EffectStop can go by id alone
+        self.viewer = viewer                        ## Who redeemed it, for the logs
+        self.cost = cost                            ## Coins
+        self.duration = duration                    ## Milliseconds for timed effects, None for our default
+        self.parameters = parameters                ## List of extra values, from the effect's menu options
+
+    @classmethod
+    def from_fields(cls, requestType, fields):
+        viewer = fields.get("viewer")
+        parameters = fields.get("parameters")
+        if parameters is not None and not isinstance(parameters, list):
+            raise MessageError("'parameters' must be a list, got %r" % (parameters,))
+        return cls(
+            _int(fields, "id", required=requestType != EFFECT_STOP),
+            requestType,
+            code=_string(fields, "code", required=requestType != EFFECT_STOP),
+            viewer=viewer if isinstance(viewer, str) else None,     ## Sometimes a list, only used for show
+            cost=_number(fields, "cost"),
+            duration=_number(fields, "duration"),
+            parameters=parameters
+        )
+
+
+
+REQUEST_CLASSES = {                         ## Request type value -> class. Anything else is a plain Request
+    EFFECT_TEST: EffectRequest,
+    EFFECT_START: EffectRequest,
+    EFFECT_STOP: EffectRequest,
+}
+
+
+
+## One message from the framer (bytes, no null terminator) -> Request. Raises MessageError
+def decode_request(frame):
+    try:
+        fields = _loads(frame)
+    except ValueError as error:                     ## orjson's and json's decode errors are both ValueErrors
+        raise MessageError("not JSON: %s" % error)
+    except RecursionError:                          ## json recurses per nesting level, b"[" * 50000 is enough
+        raise MessageError("nested too deeply")
+    if type(fields) is not dict:
+        raise MessageError("not a JSON object")
+    requestType = fields.get("type")
+    if type(requestType) is not int:
+        raise MessageError("missing or bad 'type': %r" % (requestType,))
+    return REQUEST_CLASSES.get(requestType, Request).from_fields(requestType, fields)
+
+
+
+###################################################################################################################
+    ## Responses ##
+###################################################################################################################
+GAME_UPDATE_READY = b'{"id":%d,"type":' + str(GAME_UPDATE_RESPONSE).encode() + b',"state":1}\x00'
+KEEP_ALIVE = b'{"id":%d,"type":' + str(KEEP_ALIVE_RESPONSE).encode() + b'}\x00'
+EFFECT_STATUS = b'{"id":%d,"type":' + str(EFFECT_REQUEST).encode() + b',"status":%d}\x00'
+EFFECT_STATUS_TIMED = b'{"id":%d,"type":' + str(EFFECT_REQUEST).encode() + b',"status":%d,"timeRemaining":%d}\x00'
+
+
+
+def game_update_reply(request):             ## We are ready. TODO: Add enum of GameUpdates
+    return GAME_UPDATE_READY % (request.id or 0)
+
+
+
+def keep_alive_reply(request):
+    return KEEP_ALIVE % (request.id or 0)
+
+
+
+## Answer to an EffectTest/Start/Stop. Effect handlers get one to change status on
+class EffectResponse:
+    __slots__ = ("id", "status", "timeRemaining", "message")
+
+    def __init__(self, id, status, timeRemaining=None, message=None):
+        if status not in STATUSES:
+            raise MessageError("unknown effect status %r" % (status,))
+        self.id = id
+        self.status = status                        ## EffectStatus value
+        self.timeRemaining = timeRemaining          ## Milliseconds, for timed effects
+        self.message = message                      ## Shown to the viewer, optional
+
+    def to_dict(self):
+        fields = {"id": self.id, "type": EFFECT_REQUEST, "status": self.status}
+        if self.timeRemaining is not None:
+            fields["timeRemaining"] = self.timeRemaining
+        if self.message is not None:
+            fields["message"] = self.message
+        return fields
+
+    def encode(self):                               ## -> null terminated UTF-8 JSON
+        if self.message is None:
+            if self.timeRemaining is None:
+                return EFFECT_STATUS % (self.id, self.status)
+            return EFFECT_STATUS_TIMED % (self.id, self.status, self.timeRemaining)
+        return _dumps(self.to_dict()) + b"\x00"
+
+    def __repr__(self):
+        return "EffectResponse(%r)" % (self.to_dict(),)
@@ -0,0 +1,221 @@
+###################################################################################################################
+    ## metrics.py ##
+
+
+    ## Counters, gauges and histograms for seeing where the time goes during a stream
+    ##
+    ##  Everything registers with one MetricsRegistry (`metrics` below). Code on the hot path asks for its
+    ##      instruments once, in __init__, and then only does counter.inc() or histogram.observe(seconds):
+    ##      an attribute add, or a bisect over a dozen bucket bounds. Nothing is formatted until someone reads.
+    ##  Gauges are functions, read when a snapshot is taken, so values that already exist somewhere
+    ##      (bytes sent, queue lengths, reconnects) cost nothing to publish.
+    ##  Readers: the status docker (status_docker.py), and Prometheus text / JSONL files written by the bridge.
+    ##
+    ##  Updates are plain adds without a lock. Reading from another thread is fine, the worst case is a snapshot
+    ##      one update behind. An instrument updated from two threads can lose a count in a rare race, which is
+    ##      fine for watching a stream, but keep exact bookkeeping elsewhere.
+###################################################################################################################
+import bisect                               ## histogram buckets
+import os                                   ## atomic file replace
+import time                                 ## time() for export timestamps
+
+LATENCY_BUCKETS = (                         ## Seconds. From sub-microsecond decodes to multi-second effects
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0
+)
+
+
+
+###################################################################################################################
+    ## Instruments ##
+###################################################################################################################
+class Counter:
+    __slots__ = ("name", "labels", "value")
+    kind = "counter"
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels                        ## Tuple of (label, value) pairs
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def read(self):
+        return self.value
+
+
+
+class Gauge:
+    __slots__ = ("name", "labels", "function")
+    kind = "gauge"
+
+    def __init__(self, name, labels, function):
+        self.name = name
+        self.labels = labels
+        self.function = function                    ## Called at snapshot time
+
+    def read(self):
+        try:
+            return self.function()
+        except Exception:                           ## Whatever it reads from is gone (connection stopped)
+            return None
+
+
+
+class Histogram:
+    __slots__ = ("name", "labels", "bounds", "counts", "sum", "count", "max")
+    kind = "histogram"
+
+    def __init__(self, name, labels, bounds=LATENCY_BUCKETS):
+        self.name = name
+        self.labels = labels
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  ## Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    ## Upper bound of the bucket the point-th percentile falls in. Good enough to see where latency comes from
+    def percentile(self, point):
+        if not self.count:
+            return 0.0
+        rank = point / 100.0 * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def read(self):
+        return {"count": self.count, "sum": self.sum, "max": self.max,
+                "p50": self.percentile(50), "p99": self.percentile(99)}
+
+
+
+###################################################################################################################
+    ## The registry ##
+###################################################################################################################
+class MetricsRegistry:
+    def __init__(self):
+        self.instruments = {}                       ## (name, labels) -> instrument
+        self.help = {}                              ## name -> description
+
+
+    def _get(self, factory, name, description, labels, *args):
+        key = (name, tuple(sorted(labels.items())))
+        instrument = self.instruments.get(key)
+        if instrument is None:
+            instrument = factory(name, key[1], *args)
+            self.instruments[key] = instrument
+            self.help.setdefault(name, description)
+        return instrument
+
+
+    ## Same name and labels give the same instrument back, so it can be asked for again after a restart
+    def counter(self, name, description="", **labels):
+        return self._get(Counter, name, description, labels)
+
+
+    def histogram(self, name, description="", bounds=LATENCY_BUCKETS, **labels):
+        return self._get(Histogram, name, description, labels, bounds)
+
+
+    ## A function-backed gauge. Registering the name and labels again replaces the function
+    def gauge(self, name, function, description="", **labels):
+        gauge = self._get(Gauge, name, description, labels, function)
+        gauge.function = function
+        return gauge
+
+
+    ## Zero every counter and histogram, keep the gauges
+    def reset(self):
+        for instrument in list(self.instruments.values()):
+            if instrument.kind == "counter":
+                instrument.value = 0
+            elif instrument.kind == "histogram":
+                instrument.counts = [0] * len(instrument.counts)
+                instrument.sum = instrument.max = 0.0
+                instrument.count = 0
+
+
+    ## {"name{label=value}": value}, histograms as {"count", "sum", "max", "p50", "p99"}
+    def snapshot(self):
+        return dict((_key_text(name, labels), instrument.read())
+                    for (name, labels), instrument in sorted(list(self.instruments.items())))
+
+
+
+###################################################################################################################
+    ## Export ##
+###################################################################################################################
+    ## Prometheus text exposition format, for node_exporter's textfile collector or anything that scrapes files
+    def to_prometheus(self, prefix="crowd_control_"):
+        lines = []
+        described = set()
+        for (name, labels), instrument in sorted(list(self.instruments.items())):
+            fullName = prefix + name
+            if name not in described:
+                described.add(name)
+                if self.help.get(name):
+                    lines.append("# HELP %s %s" % (fullName, self.help[name]))
+                lines.append("# TYPE %s %s" % (fullName, instrument.kind))
+            if instrument.kind == "histogram":
+                seen = 0
+                for bound, count in zip(instrument.bounds + (float("inf"),), instrument.counts):
+                    seen += count
+                    bucketLabels = labels + (("le", "+Inf" if bound == float("inf") else repr(bound)),)
+                    lines.append("%s %d" % (_key_text(fullName + "_bucket", bucketLabels), seen))
+                lines.append("%s %r" % (_key_text(fullName + "_sum", labels), instrument.sum))
+                lines.append("%s %d" % (_key_text(fullName + "_count", labels), instrument.count))
+            else:
+                value = instrument.read()
+                if value is not None:
+                    lines.append("%s %s" % (_key_text(fullName, labels), _number(value)))
+        return "\n".join(lines) + "\n"
+
+
+    ## Overwrite path with the Prometheus text, all at once so a scraper never reads half a file
+    def write_prometheus(self, path):
+        temporary = path + ".tmp"
+        with open(temporary, "w") as output:
+            output.write(self.to_prometheus())
+        os.replace(temporary, path)
+
+
+    ## Add one line to path: {"time": unix seconds, "metrics": snapshot()}
+    def append_jsonl(self, path):
+        import json                                 ## Here, so the status docker doesn't load it at Krita start up
+        with open(path, "a") as output:
+            output.write(json.dumps({"time": time.time(), "metrics": self.snapshot()}) + "\n")
+
+
+
+def _key_text(name, labels):
+    if not labels:
+        return name
+    return "%s{%s}" % (name, ",".join('%s="%s"' % (label, value) for label, value in labels))
+
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+
+###################################################################################################################
+    ## The plugin's metrics ##
+###################################################################################################################
+metrics = MetricsRegistry()
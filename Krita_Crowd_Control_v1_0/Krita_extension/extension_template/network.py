@@ -0,0 +1,399 @@
+###################################################################################################################
+    ## network.py ##
+
+
+    ## Event driven TCP client for talking to Crowd Control
+    ##
+    ##  One background thread waits in selectors.select() on the socket and a wakeup pipe, so an idle connection
+    ##      costs no CPU. Everything is non-blocking: connect, recv and send.
+    ##  Outgoing messages go into an OutboundWriter (outbound.py). Once per loop turn everything queued is sent
+    ##      with one send(). Whatever the kernel doesn't take stays queued until the socket is writable again,
+    ##      so short writes never lose data.
+    ##  Received data goes through a FrameDecoder, and each read hands all of its complete frames to onFrames
+    ##      in one call, so the Qt side needs one signal per read instead of one per message.
+    ##  capture_to() records every chunk read and sent, as it went over the socket (capture.py).
+    ##  A callback that raises is logged and the connection is dropped (ConnectionManager reconnects), the
+    ##      thread keeps going. One bad message can't leave the plugin running but deaf.
+    ##
+    ##  The callbacks run on the network thread, the caller is responsible for getting to the GUI thread.
+###################################################################################################################
+import collections                          ## deque for the calls
+import errno                                ## non-blocking connect() results
+import heapq                                ## timers
+import itertools                            ## timer tie breaker
+import selectors                            ## the event loop
+import socket                               ## the connection
+import threading                            ## the network thread, locks
+import time                                 ## monotonic()
+import traceback                            ## for the log when a callback fails
+
+from .log import log
+from .framer import FrameDecoder            ## splits the TCP stream into null terminated messages
+from .outbound import OutboundWriter        ## batches outgoing messages into one send()
+
+
+
+###################################################################################################################
+    ## Connection states ##
+###################################################################################################################
+DISCONNECTED = "disconnected"
+CONNECTING = "connecting"
+CONNECTED = "connected"
+
+RECV_SIZE = 64 * 1024                       ## Bytes read per recv_into()
+CAPTURE_CONNECTED = 1                       ## Record kinds for capture.py
+CAPTURE_DISCONNECTED = 2
+CAPTURE_INBOUND = 3
+CAPTURE_OUTBOUND = 4
+_CONNECT_IN_PROGRESS = (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY)
+
+
+
+###################################################################################################################
+    ## The engine ##
+
+
+    ## Callbacks, all optional and all called on the network thread:
+    ##      onFrames(frames)            - list of complete messages (bytes, no terminator) from one read
+    ##      onConnected()               - the connect finished
+    ##      onDisconnected(reason)      - the connect failed, the peer closed, or close_connection() was called
+    ##      onUnsent(datas)             - what was still in the write queue when the connection dropped,
+    ##                                      whole, as it was passed to send(). Called before onDisconnected
+    ##
+    ## connect(), send(), close_connection(), call_soon() and call_later() can be called from any thread
+###################################################################################################################
+class NetworkEngine:
+    def __init__(self, onFrames=None, onConnected=None, onDisconnected=None, onUnsent=None):
+        self.onFrames = onFrames
+        self.onConnected = onConnected
+        self.onDisconnected = onDisconnected
+        self.onUnsent = onUnsent
+
+        self.state = DISCONNECTED
+        self.sock = None                            ## The Crowd Control connection, when there is one
+        self.decoder = FrameDecoder()               ## Partial messages between reads
+        self.recvBuffer = bytearray(RECV_SIZE)      ## recv_into() target, reused for every read
+        self.recvView = memoryview(self.recvBuffer)
+
+        self.lock = threading.Lock()                ## Guards writer and calls
+        self.writer = OutboundWriter()              ## Messages waiting to be sent
+        self.waitingWritable = False                ## The kernel is full, we're waiting for EVENT_WRITE
+        self.calls = collections.deque()            ## Functions to run on the network thread
+        self.timers = []                            ## heap of (when, tieBreaker, function)
+        self.timerIds = itertools.count()
+        self.wakePending = False                    ## A wakeup byte is already on its way
+
+        self.selector = None
+        self.wakeReader = None                      ## socketpair used to interrupt select() from other threads
+        self.wakeWriter = None
+        self.thread = None
+        self.running = False
+
+        self.bytesIn = 0                            ## Simple totals, handy when debugging. Outgoing ones are
+                                                    ##      in writer
+        self.capture = None                         ## A CaptureWriter, while recording. Network thread only
+
+
+
+###################################################################################################################
+    ## Starting and stopping the network thread ##
+###################################################################################################################
+    ## Calls and timers left from the last run are dropped, they belong to a connection that's gone
+    def start(self):
+        if self.running:
+            return
+        with self.lock:
+            self.calls.clear()
+            self.wakePending = False                        ## The last run's wakeup went to its socketpair
+        self.timers = []
+        self.selector = selectors.DefaultSelector()
+        self.wakeReader, self.wakeWriter = socket.socketpair()
+        self.wakeReader.setblocking(False)
+        self.wakeWriter.setblocking(False)
+        self.selector.register(self.wakeReader, selectors.EVENT_READ, self._on_wake)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="CrowdControlNetwork", daemon=True)
+        self.thread.start()
+
+
+    ## Close the connection, stop the thread and wait for it. Safe to call more than once
+    def stop(self, timeout=5.0):
+        if not self.running:
+            return
+        self.running = False
+        self._wake()
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+        self.thread = None
+
+
+    def is_connected(self):
+        return self.state == CONNECTED
+
+
+    ## Record the traffic with capture (a CaptureWriter, see capture.py) from now on, or stop with None.
+    ##      The one it replaces is closed
+    def capture_to(self, capture):
+        if self.running:
+            self.call_soon(self._set_capture, capture)
+        else:
+            self._set_capture(capture)
+
+
+    def _set_capture(self, capture):
+        if self.capture is not None:
+            self.capture.close()
+        self.capture = capture
+
+
+
+###################################################################################################################
+    ## Thread safe requests ##
+###################################################################################################################
+    def call_soon(self, function, *args):                   ## Run function(*args) on the network thread
+        with self.lock:
+            self.calls.append((function, args))
+        self._wake()
+
+
+    def call_later(self, delay, function, *args):           ## Run function(*args) on the network thread after delay
+        entry = [time.monotonic() + delay, next(self.timerIds), function, args]
+        self.call_soon(heapq.heappush, self.timers, entry)
+        return entry                                        ## Pass to cancel_timer()
+
+
+    def cancel_timer(self, entry):                          ## The timer stays in the heap but does nothing
+        entry[2] = None
+
+
+    def connect(self, host, port):
+        self.call_soon(self._start_connect, host, port)
+
+
+    def close_connection(self, reason="closed"):
+        self.call_soon(self._drop_connection, reason)
+
+
+    ## Queue data (bytes) for sending. Frames with the same key that are still waiting are merged, only the
+    ##      newest is sent (see outbound.py).
+    ## The network thread only gets woken when the queue was empty, so a burst of sends costs a single
+    ##      wakeup, and sends from the network thread itself don't need one
+    def send(self, data, key=None):
+        with self.lock:
+            wasEmpty = self.writer.write(data, key)
+        if wasEmpty and threading.current_thread() is not self.thread:
+            self._wake()
+
+
+
+###################################################################################################################
+    ## The loop itself ##
+
+
+    ## Blocks in select() until there is socket activity, a wakeup, or the next timer is due
+    ## A thread stop() gave up waiting for may still be running when start() makes the next one. It stops at
+    ##      its next turn, and only closes the selector and socketpair it started with, not the new thread's
+###################################################################################################################
+    def _run(self):
+        me = threading.current_thread()
+        selector, wakeReader, wakeWriter = self.selector, self.wakeReader, self.wakeWriter
+        try:
+            while self.running and self.thread is me:
+                events = selector.select(self._next_timeout())
+                for key, mask in events:
+                    self._guarded(key.data, mask)
+                self._run_calls()
+                self._run_timers()
+                if self.state == CONNECTED and self.writer and not self.waitingWritable:
+                    self._guarded(self._flush)              ## Everything this turn queued, in one send()
+        finally:
+            if self.thread is me or self.thread is None:    ## Not replaced by a newer start()
+                self.running = False                        ## So start() works again, even after a crash
+                if self.state == CONNECTED and self.writer and not self.waitingWritable:
+                    self._guarded(self._flush)              ## Last answers, as far as the kernel takes them
+                self._drop_connection("stopped", notify=False)
+                self._set_capture(None)
+            selector.close()
+            wakeReader.close()
+            wakeWriter.close()
+
+
+    def _next_timeout(self):
+        if self.calls:
+            return 0
+        while self.timers and self.timers[0][2] is None:    ## Throw away cancelled timers
+            heapq.heappop(self.timers)
+        if not self.timers:
+            return None                                     ## Nothing to do until something happens
+        return max(0.0, self.timers[0][0] - time.monotonic())
+
+
+    ## Run function(*args). If it raises, log it and drop the connection, the stream may be half handled
+    def _guarded(self, function, *args):
+        try:
+            function(*args)
+        except Exception:
+            log.error_dump("Network thread: %s failed, dropping the connection:\n%s",
+                           getattr(function, "__name__", function), traceback.format_exc())
+            try:
+                self._drop_connection("internal error")
+            except Exception:                               ## A callback in there failed too, still keep going
+                log.error_dump("Network thread: dropping the connection failed:\n%s", traceback.format_exc())
+
+
+    def _run_calls(self):
+        while True:
+            with self.lock:
+                if not self.calls:
+                    return
+                function, args = self.calls.popleft()
+            self._guarded(function, *args)
+
+
+    def _run_timers(self):
+        now = time.monotonic()
+        while self.timers and self.timers[0][0] <= now:
+            entry = heapq.heappop(self.timers)
+            function, args = entry[2], entry[3]
+            if function is not None:
+                self._guarded(function, *args)
+
+
+    def _wake(self):
+        if self.wakeWriter is None:
+            return
+        with self.lock:
+            if self.wakePending:
+                return
+            self.wakePending = True
+        try:
+            self.wakeWriter.send(b"\x00")
+        except (BlockingIOError, OSError):                  ## Full means a wakeup is already waiting
+            pass
+
+
+    def _on_wake(self, mask):
+        with self.lock:
+            self.wakePending = False
+        try:
+            while self.wakeReader.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+
+
+###################################################################################################################
+    ## Connecting ##
+###################################################################################################################
+    def _start_connect(self, host, port):
+        if self.state != DISCONNECTED:
+            return
+        self.decoder.reset()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)      ## Enable keepalive
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)      ## Replies are small, don't hold them back
+        self.sock = sock
+        self.state = CONNECTING
+
+        result = sock.connect_ex((host, port))
+        if result not in _CONNECT_IN_PROGRESS:
+            self._drop_connection(errno.errorcode.get(result, str(result)))
+            return
+        self.selector.register(sock, selectors.EVENT_WRITE, self._on_connect_ready)
+
+
+    def _on_connect_ready(self, mask):
+        error = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error:
+            self._drop_connection(errno.errorcode.get(error, str(error)))
+            return
+        self.state = CONNECTED
+        if self.capture is not None:
+            self.capture.record(CAPTURE_CONNECTED, ("%s:%d" % self.sock.getpeername()[:2]).encode())
+        self._update_interest()
+        if self.onConnected:
+            self.onConnected()
+        self._flush()                                       ## Anything queued while we were connecting
+
+
+    def _drop_connection(self, reason, notify=True):
+        if self.sock is None:
+            return
+        wasActive = self.state != DISCONNECTED
+        try:
+            self.selector.unregister(self.sock)
+        except (KeyError, ValueError):
+            pass
+        self.sock.close()
+        self.sock = None
+        self.state = DISCONNECTED
+        if wasActive and self.capture is not None:
+            self.capture.record(CAPTURE_DISCONNECTED, reason.encode("utf-8", "replace"))
+        self.decoder.reset()
+        self.waitingWritable = False
+        with self.lock:                                     ## A half sent frame can't be finished on a new
+            unsent = self.writer.clear()                    ##      connection. Hand back the whole frames
+        if notify and unsent and self.onUnsent:
+            self.onUnsent(unsent)
+        if notify and wasActive and self.onDisconnected:
+            self.onDisconnected(reason)
+
+
+
+###################################################################################################################
+    ## Reading and writing ##
+###################################################################################################################
+    def _update_interest(self):                             ## Only ask for EVENT_WRITE while we have data waiting
+        events = selectors.EVENT_READ
+        self.waitingWritable = bool(self.writer)
+        if self.waitingWritable:
+            events |= selectors.EVENT_WRITE
+        self.selector.modify(self.sock, events, self._on_socket_ready)
+
+
+    def _on_socket_ready(self, mask):
+        if mask & selectors.EVENT_READ:
+            self._read()
+        if mask & selectors.EVENT_WRITE and self.sock is not None:
+            self._flush()
+
+
+    def _read(self):
+        try:
+            count = self.sock.recv_into(self.recvView)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as error:
+            self._drop_connection(str(error))
+            return
+        if count == 0:                                      ## An empty read means the peer closed the connection
+            self._drop_connection("closed by peer")
+            return
+        self.bytesIn += count
+        if self.capture is not None:
+            self.capture.record(CAPTURE_INBOUND, self.recvView[:count])
+        frames = self.decoder.feed(self.recvView[:count])
+        if frames and self.onFrames:
+            self.onFrames(frames)
+
+
+    ## Send everything queued with one send(). A short write keeps the rest in the writer, and we wait for
+    ##      the socket to be writable before trying again
+    def _flush(self):
+        with self.lock:
+            view = self.writer.pack()
+        if view:
+            try:
+                sent = self.sock.send(view)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError as error:
+                self._drop_connection(str(error))
+                return
+            if sent and self.capture is not None:
+                self.capture.record(CAPTURE_OUTBOUND, view[:sent])
+            with self.lock:
+                self.writer.sent(sent)
+        self._update_interest()
@@ -0,0 +1,126 @@
+###################################################################################################################
+    ## outbound.py ##
+
+
+    ## Batches everything we send to Crowd Control into as few send() calls as possible
+    ##
+    ##  write() only queues a frame. When the network thread gets to the socket, pack() copies every queued frame
+    ##      into one reusable buffer and the whole thing goes out with a single send(). Under a steady GameUpdate
+    ##      poll plus effect traffic that is one syscall per network loop turn instead of one per message.
+    ##  Frames can have a coalesce key. A new frame with the same key as one still queued replaces it, so a
+    ##      backlog of identical GameUpdate "state: 1" replies collapses into the newest one.
+    ##  The buffer only grows, it is never reallocated for normal traffic.
+    ##
+    ##  Not thread safe on its own, NetworkEngine guards it with its lock.
+###################################################################################################################
+import collections                          ## deque for the latency history
+import time                                 ## perf_counter()
+
+
+
+class OutboundWriter:
+    def __init__(self, initialSize=16 * 1024, clock=time.perf_counter, history=4096):
+        self.buffer = bytearray(initialSize)        ## Packed frames, reused for every flush
+        self.view = memoryview(self.buffer)
+        self.start = 0                              ## First byte in buffer not sent yet
+        self.end = 0                                ## End of the packed bytes
+        self.packed = collections.deque()           ## (end offset, frame, queuedAt) for frames in buffer
+
+        self.pending = []                           ## [frame, key, queuedAt] not packed yet, in order
+        self.pendingKeys = {}                       ## key -> its entry in pending
+
+        self.clock = clock
+        self.latencies = collections.deque(maxlen=history)  ## Seconds from write() to the kernel taking it
+        self.frames = 0                             ## Frames handed to the kernel
+        self.coalesced = 0                          ## Frames replaced by a newer one with the same key
+        self.bytesOut = 0
+        self.sendCalls = 0
+
+
+    def __bool__(self):                             ## Anything left to send?
+        return bool(self.pending) or self.start < self.end
+
+
+    ## Queue a frame. Returns True if nothing was queued before it
+    def write(self, frame, key=None):
+        wasEmpty = not self
+        if key is not None:
+            entry = self.pendingKeys.get(key)
+            if entry is not None:                   ## Same reply still waiting, send the newer one instead
+                entry[0] = frame
+                self.coalesced += 1
+                return wasEmpty
+        entry = [frame, key, self.clock()]
+        self.pending.append(entry)
+        if key is not None:
+            self.pendingKeys[key] = entry
+        return wasEmpty
+
+
+    ## Move queued frames into the buffer. Returns the bytes to send, as a memoryview
+    def pack(self):
+        if self.pending:
+            if self.start == self.end:              ## Everything sent, reuse the buffer from the start
+                self.start = self.end = 0
+            size = self.end + sum(len(entry[0]) for entry in self.pending)
+            if size > len(self.buffer):             ## Grow, keeping what isn't sent yet
+                self._grow(size)
+            buffer = self.buffer
+            end = self.end
+            for frame, key, queuedAt in self.pending:
+                buffer[end:end + len(frame)] = frame
+                end += len(frame)
+                self.packed.append((end, frame, queuedAt))
+            self.end = end
+            self.pending = []
+            self.pendingKeys.clear()
+        return self.view[self.start:self.end]
+
+
+    ## The kernel took count bytes of what pack() returned
+    def sent(self, count):
+        self.sendCalls += 1
+        self.bytesOut += count
+        self.start += count
+        now = self.clock()
+        packed = self.packed
+        while packed and packed[0][0] <= self.start:
+            end, frame, queuedAt = packed.popleft()
+            self.latencies.append(now - queuedAt)
+            self.frames += 1
+
+
+    ## Forget everything, and return the frames that didn't make it out whole, in order
+    def clear(self):
+        unsent = [frame for end, frame, queuedAt in self.packed] + [entry[0] for entry in self.pending]
+        self.packed.clear()
+        self.pending = []
+        self.pendingKeys.clear()
+        self.start = self.end = 0
+        return unsent
+
+
+    def _grow(self, size):
+        newSize = len(self.buffer)
+        while newSize < size - self.start:
+            newSize *= 2
+        buffer = bytearray(newSize)
+        buffer[:self.end - self.start] = self.view[self.start:self.end]
+        self.packed = collections.deque((end - self.start, frame, queuedAt) for end, frame, queuedAt in self.packed)
+        self.end -= self.start
+        self.start = 0
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+
+
+    ## {50: ms, 99: ms} over the recent frames
+    def latency_percentiles(self, points=(50, 99)):
+        values = sorted(self.latencies)
+        if not values:
+            return dict((point, 0.0) for point in points)
+        last = len(values) - 1
+        return dict((point, values[min(last, int(round(point / 100.0 * last)))] * 1000) for point in points)
+
+
+    def bytes_per_call(self):
+        return self.bytesOut / float(self.sendCalls) if self.sendCalls else 0.0
@@ -0,0 +1,308 @@
+###################################################################################################################
+    ## pixels.py ##
+
+
+    ## Layer effects: pixel math on the current layer with NumPy, off the GUI thread
+    ##
+    ##  A layer effect goes:
+    ##      read    - GUI thread. The host hands over the layer's pixels (8-bit BGRA, what Node.pixelData gives
+    ##                  for an RGBA/U8 layer) and as_image() wraps them in an array without copying
+    ##      process - one worker thread, so Krita's GUI thread never waits on the math. The image is done in
+    ##                  bands of rows, one after the other, which keeps the float temporaries to a band's size.
+    ##                  They don't run side by side: bench_layers.py had a pool of band jobs slower than one
+    ##                  thread, the copies and casts between the ufuncs hold the GIL
+    ##      commit  - GUI thread again, posted when the worker is done. One write of the whole layer, one repaint
+    ##
+    ##  Operations are callables op(source, target, top, bottom) that fill target's rows top to bottom from
+    ##      source. halo is how many rows around a band they read (blur), align is what band heights must be
+    ##      a multiple of (pixelate), so every band works on its own.
+    ##  Effects on the same layer run one after the other (each reads what the last one wrote), at most
+    ##      maxPending waiting. The last effect's original pixels are kept, so undo_last() can put them back:
+    ##      Krita doesn't put setPixelData from a script on its undo stack. Only up to undoBytes of them
+    ##      (a 4K layer), and only for undoSeconds, so an 8K canvas doesn't carry a spare copy around.
+    ##
+    ##  NumPy is optional. Without it AVAILABLE is False and the layer effects answer Unavailable.
+###################################################################################################################
+import collections                          ## deque of waiting effects
+import concurrent.futures                   ## the worker thread
+import math                                 ## hue rotation
+import time                                 ## perf_counter()
+import traceback                            ## for the log when a band fails
+
+try:                                        ## The array math. Optional, see AVAILABLE
+    import numpy
+except ImportError:
+    numpy = None
+
+from .host import NotReady                  ## no document open
+from .log import log
+from .metrics import metrics                ## read, process and commit timings
+
+AVAILABLE = numpy is not None
+BAND_ROWS = 256                             ## Rows per band. Big enough to keep NumPy busy, small temporaries
+UNDO_BYTES = 4096 * 4096 * 4                ## Largest layer kept for undo_last()
+UNDO_SECONDS = 60.0                         ## How long it's kept
+
+
+
+###################################################################################################################
+    ## Arrays ##
+###################################################################################################################
+def as_image(data, width, height):          ## Bytes-like BGRA pixels -> (height, width, 4) view, no copy
+    return numpy.frombuffer(data, numpy.uint8).reshape(height, width, 4)
+
+
+
+def new_image(width, height):               ## (buffer, writable array view of it)
+    buffer = bytearray(width * height * 4)
+    return buffer, as_image(buffer, width, height)
+
+
+
+def bands(height, rows=BAND_ROWS, align=1):  ## (top, bottom) row ranges covering the image
+    rows = max(align, rows // align * align)
+    return [(top, min(top + rows, height)) for top in range(0, height, rows)]
+
+
+
+###################################################################################################################
+    ## Operations ##
+
+
+    ## Colors are B, G, R, A in the last axis. Alpha is copied through, except by the blur which blurs it too
+###################################################################################################################
+class Invert:
+    halo = 0
+    align = 1
+
+    def __call__(self, source, target, top, bottom):
+        numpy.subtract(255, source[top:bottom, :, :3], out=target[top:bottom, :, :3])
+        target[top:bottom, :, 3] = source[top:bottom, :, 3]
+
+
+
+class HueShift:                             ## Rotates hue by degrees, keeping luminance, like CSS hue-rotate()
+    halo = 0
+    align = 1
+
+    def __init__(self, degrees):
+        c = math.cos(math.radians(degrees))
+        s = math.sin(math.radians(degrees))
+        rgb = numpy.array([
+            [0.213 + c * 0.787 - s * 0.213, 0.715 - c * 0.715 - s * 0.715, 0.072 - c * 0.072 + s * 0.928],
+            [0.213 - c * 0.213 + s * 0.143, 0.715 + c * 0.285 + s * 0.140, 0.072 - c * 0.072 - s * 0.283],
+            [0.213 - c * 0.213 - s * 0.787, 0.715 - c * 0.715 + s * 0.715, 0.072 + c * 0.928 + s * 0.072],
+        ], numpy.float32)
+        self.matrix = numpy.ascontiguousarray(rgb[::-1, ::-1].T)   ## For BGR rows on the left of a matmul
+
+    def __call__(self, source, target, top, bottom):
+        shifted = source[top:bottom, :, :3].astype(numpy.float32) @ self.matrix
+        shifted += 0.5                                      ## Rounded, not truncated
+        numpy.clip(shifted, 0, 255, out=shifted)
+        target[top:bottom, :, :3] = shifted
+        target[top:bottom, :, 3] = source[top:bottom, :, 3]
+
+
+
+class BoxBlur:                              ## Mean of the (2 radius + 1) square around each pixel, edges repeated
+    align = 1
+
+    def __init__(self, radius):
+        self.radius = radius
+        self.halo = radius
+
+    def __call__(self, source, target, top, bottom):
+        radius = self.radius
+        size = 2 * radius + 1
+        height = source.shape[0]
+        start = max(0, top - radius)
+        end = min(height, bottom + radius)
+        block = numpy.pad(source[start:end], ((radius - (top - start), radius - (end - bottom)),
+                                              (radius, radius), (0, 0)), mode="edge").astype(numpy.float32)
+        sums = numpy.cumsum(block, axis=0)                  ## Running sums, a window is two lookups
+        rows = sums[size - 1:].copy()
+        rows[1:] -= sums[:-size]
+        sums = numpy.cumsum(rows, axis=1)
+        blurred = sums[:, size - 1:].copy()
+        blurred[:, 1:] -= sums[:, :-size]
+        blurred *= 1.0 / (size * size)
+        target[top:bottom] = blurred + 0.5                  ## Rounded, not truncated
+
+
+
+class Pixelate:                             ## Each block x block square becomes its mean color
+    halo = 0
+
+    def __init__(self, block):
+        self.block = block
+        self.align = block
+
+    def __call__(self, source, target, top, bottom):
+        block = self.block
+        band = source[top:bottom]
+        height, width = band.shape[:2]
+        rowStarts = numpy.arange(0, height, block)
+        columnStarts = numpy.arange(0, width, block)
+        rowSizes = numpy.diff(numpy.append(rowStarts, height))      ## The last block can be smaller
+        columnSizes = numpy.diff(numpy.append(columnStarts, width))
+        sums = numpy.add.reduceat(numpy.add.reduceat(band, rowStarts, axis=0, dtype=numpy.uint32),
+                                  columnStarts, axis=1)
+        means = sums // (rowSizes[:, None, None] * columnSizes[None, :, None])
+        target[top:bottom] = numpy.repeat(numpy.repeat(means, rowSizes, axis=0), columnSizes, axis=1)
+
+
+
+## Run operation over every band on this thread, for the benchmarks and small images
+def process(operation, source, target=None, rows=BAND_ROWS):
+    if target is None:
+        target = numpy.empty_like(source)
+    for top, bottom in bands(source.shape[0], rows, operation.align):
+        operation(source, target, top, bottom)
+    return target
+
+
+
+###################################################################################################################
+    ## The pipeline ##
+
+
+    ## host - read_layer(), write_layer(), post() and make_timer(), see host.py
+    ## The worker thread is made on the first effect
+###################################################################################################################
+class LayerPipeline:
+    def __init__(self, host, maxPending=4, rows=BAND_ROWS, undoBytes=UNDO_BYTES, undoSeconds=UNDO_SECONDS):
+        self.host = host
+        self.maxPending = maxPending
+        self.rows = rows
+        self.undoBytes = undoBytes
+        self.undoSeconds = undoSeconds
+        self.pool = None
+        self.waiting = collections.deque()          ## (operation, name) not started yet
+        self.job = None                             ## The effect being processed
+        self.last = None                            ## (layer, original pixels, width, height) for undo_last()
+        self.undoTimer = None                       ## Drops last, made with the first one kept
+        self.applied = 0                            ## Effects committed
+
+        self.readTime = metrics.histogram("layer_effect_seconds", "Layer effects, by stage", stage="read")
+        self.processTime = metrics.histogram("layer_effect_seconds", stage="process")
+        self.commitTime = metrics.histogram("layer_effect_seconds", stage="commit")
+        metrics.gauge("layer_effects_waiting", self.pending, "Layer effects started or waiting")
+
+
+    ## GUI thread. False when too many are waiting already, answer Retry
+    def submit(self, operation, name):
+        if self.pending() >= self.maxPending:
+            return False
+        self.waiting.append((operation, name))
+        if self.job is None:
+            self._start_next()
+        return True
+
+
+    def pending(self):
+        return len(self.waiting) + (self.job is not None)
+
+
+    def idle(self):
+        return self.job is None and not self.waiting
+
+
+    ## Put back the pixels from before the last effect
+    def undo_last(self):
+        if self.last is None or not self.idle():
+            return False
+        layer, original, width, height = self.last
+        self.forget_undo()
+        self.host.write_layer(layer, original, width, height)
+        return True
+
+
+    def forget_undo(self):                          ## GUI thread, also the undo timer
+        self.last = None
+        if self.undoTimer is not None:
+            self.undoTimer.stop()
+
+
+    ## Drop what's waiting and the undo copy, and wait for the worker to finish
+    def close(self):
+        self.waiting.clear()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+        self.job = None
+        self.forget_undo()
+
+
+
+    def _start_next(self):
+        while self.waiting:
+            operation, name = self.waiting.popleft()
+            started = time.perf_counter()
+            try:
+                layer = self.host.read_layer()
+            except NotReady:                        ## Closed since it was accepted
+                log.info("Layer effect %s skipped, no document open", name)
+                continue
+            if layer is None:
+                log.warning("Layer effect %s skipped, the active layer isn't an 8-bit RGBA paint layer", name)
+                continue
+            node, data, width, height = layer
+            source = as_image(data, width, height)
+            buffer, target = new_image(width, height)
+            self.readTime.observe(time.perf_counter() - started)
+
+            if self.pool is None:
+                self.pool = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="CrowdControlPixels")
+            job = _Job(self, name, node, data, buffer, width, height)
+            self.job = job
+            self.pool.submit(process, operation, source, target, self.rows).add_done_callback(job.done)
+            return
+        self.job = None
+
+
+    def _commit(self, job):                         ## GUI thread, posted when the last band is done
+        if job is not self.job:                     ## Closed in between
+            return
+        self.processTime.observe(job.finishedAt - job.startedAt)
+        if job.error is not None:
+            log.error_dump("Layer effect %s failed:\n%s", job.name, job.error)
+        else:
+            started = time.perf_counter()
+            self.host.write_layer(job.node, job.buffer, job.width, job.height)
+            self.commitTime.observe(time.perf_counter() - started)
+            self._keep_undo(job)
+            self.applied += 1
+        self.job = None
+        self._start_next()
+
+
+    def _keep_undo(self, job):                      ## The original pixels, if they're small enough
+        self.forget_undo()
+        if len(job.original) > self.undoBytes:
+            return
+        self.last = (job.node, job.original, job.width, job.height)
+        if self.undoTimer is None:
+            self.undoTimer = self.host.make_timer(self.forget_undo)
+        self.undoTimer.start(int(self.undoSeconds * 1000))
+
+
+
+class _Job:
+    def __init__(self, pipeline, name, node, original, buffer, width, height):
+        self.pipeline = pipeline
+        self.name = name
+        self.node = node
+        self.original = original                    ## Kept for undo, the source array is a view of it
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+        self.error = None
+        self.startedAt = time.perf_counter()
+        self.finishedAt = None
+
+    def done(self, future):                         ## Worker thread
+        error = future.exception()
+        if error is not None:
+            self.error = "".join(traceback.format_exception(type(error), error, error.__traceback__))
+        self.finishedAt = time.perf_counter()
+        self.pipeline.host.post(lambda: self.pipeline._commit(self))
@@ -0,0 +1,73 @@
+###################################################################################################################
+    ## presets.py ##
+
+
+    ## Keyed lookup of brush presets
+    ##
+    ##  Krita.instance().resources("preset") builds a dict of every preset the user has installed, which can be
+    ##      thousands with big bundles. PresetIndex asks for it once and keeps it, so finding a preset is a dict
+    ##      lookup no matter how many are installed.
+    ##  The index is refreshed lazily: only when a lookup misses, and at most once every refreshInterval seconds,
+    ##      so a preset installed while Krita runs is still found, but a missing one can't make every redeem
+    ##      rebuild the dict.
+    ##  Aliases map short names to real preset names ("rainbow" -> "rainbow01"), and get() takes fallbacks for
+    ##      presets that are named differently between Krita versions.
+###################################################################################################################
+import time                                 ## monotonic()
+
+
+
+class PresetIndex:
+    ## loader() returns a {name: preset} dict, e.g. lambda: Krita.instance().resources("preset")
+    def __init__(self, loader, aliases=None, refreshInterval=30.0, clock=time.monotonic):
+        self.loader = loader
+        self.aliases = dict(aliases or {})
+        self.refreshInterval = refreshInterval
+        self.clock = clock
+        self.presets = None                         ## name -> preset, None until the first lookup
+        self.loadedAt = None                        ## clock() of the last load
+        self.loads = 0                              ## How many times we walked Krita's preset list
+
+
+    def add_alias(self, alias, name):
+        self.aliases[alias] = name
+
+
+    ## Drop the index, the next lookup loads it again
+    def invalidate(self):
+        self.presets = None
+
+
+    def _load(self):
+        self.presets = dict(self.loader())
+        self.loadedAt = self.clock()
+        self.loads += 1
+
+
+    def _find(self, names):
+        for name in names:
+            preset = self.presets.get(self.aliases.get(name, name))
+            if preset is not None:
+                return preset
+        return None
+
+
+    ## The first of names (preset names or aliases) that exists, or None
+    def get(self, *names):
+        if self.presets is None:
+            self._load()
+        preset = self._find(names)
+        if preset is None and self.clock() - self.loadedAt >= self.refreshInterval:
+            self._load()                            ## Maybe it was installed since, look once more
+            preset = self._find(names)
+        return preset
+
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+
+    def __len__(self):
+        if self.presets is None:
+            self._load()
+        return len(self.presets)
@@ -0,0 +1,97 @@
+###################################################################################################################
+    ## protocol.py ##
+
+
+    ## The ConnectorLib.JSON enums, shared by everything that talks to Crowd Control
+###################################################################################################################
+from enum import Enum                       ## for all the response types
+
+
+
+###################################################################################################################
+    ## Request types ##
+
+
+    ## See https://github.com/WarpWorld/ConnectorLib.JSON/blob/main/RequestType.cs
+###################################################################################################################
+class RequestTypes(Enum):
+    EffectTest      = 0x00
+    EffectStart     = 0x01
+    EffectStop      = 0x02
+    GenericEvent    = 0x10
+    DataRequest     = 0x20
+    RpcResponse     = 0xD0
+    PlayerInfo      = 0xE0
+    Login           = 0xF0
+    GameUpdate      = 0xFD
+    KeepAlive       = 0xFF
+    
+
+
+###################################################################################################################
+    ## Response types ##
+
+
+    ## See https://github.com/WarpWorld/ConnectorLib.JSON/blob/main/ResponseType.cs
+###################################################################################################################
+class ResponseTypes(Enum):
+    EffectRequest   = 0x00
+    EffectStatus    = 0x01
+    GenericEvent    = 0x10
+    LoadEvent       = 0x18
+    SaveEvent       = 0x19
+    DataResponse    = 0x20
+    RpcRequest      = 0xD0
+    Login           = 0xF0
+    LoginSuccess    = 0xF1
+    GameUpdate      = 0xFD
+    Disconnect      = 0xFE
+    KeepAlive       = 0xFF
+    
+
+
+###################################################################################################################
+    ## Effect status ##
+
+
+    ## See https://github.com/WarpWorld/ConnectorLib.JSON/blob/main/EffectStatus.cs
+###################################################################################################################
+class EffectStatus(Enum):
+    ## Effect Instance Messages ##
+    Success         = 0x00  ## The effect executed successfully
+
+    Failure         = 0x01  ## The effect failed to trigger, but is still available for use
+                            ## Viewer(s) will be refunded
+                            ## You probably don't want this
+
+    Unavailable     = 0x02  ## Same as Failure but the effect is no longer available for the remainder of the game
+                            ## You probably don't want this
+
+    Retry           = 0x03  ## The effect cannot be triggered right now, try again in a few seconds
+                            ## This is the "normal" failure response
+
+    Queue           = 0x04  ## INTERNAL USE ONLY
+                            ## The effect has been queued for execution after the current one ends
+
+    Running         = 0x05  ## INTERNAL USE ONLY
+                            ## The effect triggered successfully and is now active until it ends
+    
+    Paused          = 0x06  ## The timed effect has been paused and is now waiting
+    
+    Resumed         = 0x07  ## The timed effect has been resumed and is counting down again
+    
+    Finished        = 0x08  ## The timed effect has finished
+
+
+    ## Effect Class Messages ##
+    Visible         = 0x80  ## The effect should be shown in the menu
+    
+    NotVisible      = 0x81  ## The effect should be hidden in the menu
+    
+    Selectable      = 0x82  ## The effect should be selectable in the menu
+    
+    NotSelectable   = 0x83  ## The effect should be unselectable in the menu
+
+
+    ## System Status Messages ##
+    NotReady        = 0xFF  ## The processor isn't ready to start or has shut down
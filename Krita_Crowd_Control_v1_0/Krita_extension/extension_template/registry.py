@@ -0,0 +1,137 @@
+###################################################################################################################
+    ## registry.py ##
+
+
+    ## Table of every effect and request handler, so dispatch is one dict lookup
+    ##
+    ##  Effects register themselves with a decorator, together with what Crowd Control needs to know about them:
+    ##
+    ##      @effect("spin_canvas", "Spin Canvas", duration=10, category="Canvas",
+    ##              description="Give the canvas a speeen")
+    ##      def spin_canvas(context, request, response):
+    ##          ...
+    ##
+    ##  context is the object running the effects (the Bridge, bridge.py), request is the EffectStart message
+    ##      as an EffectRequest (messages.py), with code, viewer, duration and parameters as attributes,
+    ##      response is the reply, already filled out with the id, type and a Success status. The handler can
+    ##      change it, e.g. to set a Failure status.
+    ##  Timed effects (the ones with a duration) return the Animation they started, see lifecycle.py
+    ##
+    ##  The same metadata generates the effect list in the Crowd Control game pack (Krita_TCP_01.cs),
+    ##      see tools/gen_effect_list.py
+###################################################################################################################
+import importlib                            ## load effect modules by name
+
+
+
+###################################################################################################################
+    ## One effect ##
+###################################################################################################################
+class EffectInfo:
+    __slots__ = ("code", "name", "handler", "price", "duration", "category", "description", "group")
+
+    def __init__(self, code, name, handler, price=100, duration=None, category="Canvas", description=None,
+                 group=None):
+        self.code = code                            ## What Crowd Control sends in 'code'
+        self.name = name                            ## What viewers see in the menu
+        self.handler = handler                      ## handler(context, request, response)
+        self.price = price                          ## Default price in coins
+        self.duration = duration                    ## Seconds for timed effects, None for instant ones
+        self.category = category                    ## Menu folder
+        self.description = description or name      ## Menu tooltip
+        self.group = group                          ## Timed effects in the same group can't run at the same
+                                                    ##      time. None means only the same code conflicts
+
+    def is_timed(self):
+        return self.duration is not None
+
+    ## Seconds this request should run for. Crowd Control sends milliseconds, fall back to our default
+    def requested_duration(self, request):
+        if request.duration:
+            return request.duration / 1000.0
+        return self.duration
+
+
+
+###################################################################################################################
+    ## The registry ##
+###################################################################################################################
+class EffectRegistry:
+    def __init__(self):
+        self.effects = {}                           ## code -> EffectInfo
+        self.requestHandlers = {}                   ## request type value (int) -> handler(context, request)
+
+
+    ## Decorator for effect handlers. Registering a code twice is a mistake, so it raises
+    def effect(self, code, name, price=100, duration=None, category="Canvas", description=None, group=None):
+        def register(handler):
+            if code in self.effects:
+                raise ValueError("Effect code already registered: " + code)
+            self.effects[code] = EffectInfo(code, name, handler, price, duration, category, description, group)
+            return handler
+        return register
+
+
+    ## Decorator for request type handlers. requestType can be a RequestTypes member or its value
+    def request(self, requestType):
+        value = getattr(requestType, "value", requestType)
+        def register(handler):
+            self.requestHandlers[value] = handler
+            return handler
+        return register
+
+
+    def get(self, code):                            ## EffectInfo, or None for unknown codes
+        return self.effects.get(code)
+
+
+    def request_handler(self, requestType):         ## Handler for a request type value, or None
+        return self.requestHandlers.get(requestType)
+
+
+    def __len__(self):
+        return len(self.effects)
+
+
+    def __iter__(self):                             ## Effects in the order they were registered
+        return iter(self.effects.values())
+
+
+    ## Import effect modules, e.g. load("extension_template.effects.canvas"). Their decorators do the rest
+    def load(self, *moduleNames):
+        for moduleName in moduleNames:
+            importlib.import_module(moduleName)
+
+
+
+###################################################################################################################
+    ## Crowd Control game pack effect list ##
+
+
+    ## Renders the body of `public override EffectList Effects => new Effect[] { ... };` in Krita_TCP_01.cs
+###################################################################################################################
+    def render_cs_effects(self, indent="\t\t"):
+        entries = []
+        for info in self:
+            fields = ["Price = %d" % info.price]
+            if info.duration is not None:
+                fields.append("Duration = %d" % info.duration)
+            fields.append("Description = %s" % _cs_string(info.description))
+            fields.append("Category = %s" % _cs_string(info.category))
+            entries.append("%s// %s\n%snew(%s, %s) { %s }" % (
+                indent, info.name, indent, _cs_string(info.name), _cs_string(info.code), ", ".join(fields)))
+        return ",\n\n".join(entries)
+
+
+
+def _cs_string(text):                               ## C# string literal
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+
+###################################################################################################################
+    ## The registry the plugin uses ##
+###################################################################################################################
+registry = EffectRegistry()
+effect = registry.effect
+request = registry.request
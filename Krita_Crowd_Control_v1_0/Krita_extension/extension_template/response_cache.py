@@ -0,0 +1,116 @@
+###################################################################################################################
+    ## response_cache.py ##
+
+
+    ## Remembers which effect ids we've seen and what we answered, so a re-sent EffectStart never runs twice
+    ##
+    ##  Crowd Control sends an EffectStart again when our answer is slow, or after a reconnect. Each id is:
+    ##      running  - claimed, no final response yet, but maybe one that isn't final (a timed effect's Success)
+    ##                  and which connection it went out on. Kept until it is answered or forgotten, there are
+    ##                  never more of these than the dispatch queue and the effect queues hold
+    ##      answered - the final response bytes, and which connection they went out on. Kept in LRU order,
+    ##                  at most capacity of them, each for ttl seconds after it was last asked about
+    ##
+    ##  Every call is O(1) (expiry only looks at the oldest entries), so it can sit on the network thread.
+    ##  Not thread safe on its own, ConnectionManager calls it with its lock held.
+###################################################################################################################
+import collections                          ## OrderedDict, the LRU order
+import time                                 ## monotonic()
+
+from .metrics import metrics                ## hits, evictions and size for the status docker
+
+
+
+class ResponseCache:
+    def __init__(self, capacity=256, ttl=600.0, clock=time.monotonic):
+        self.capacity = capacity                    ## Answered ids kept, at most
+        self.ttl = ttl                              ## Seconds an answered id is kept after it was last asked about
+        self.clock = clock
+        self.running = {}                           ## id -> [last response or None, generation it went out on]
+        self.answered = collections.OrderedDict()   ## id -> [response, generation it went out on, last used]
+
+        self.runningHits = metrics.counter("response_cache_hits_total", "Repeated EffectStart ids",
+                                           state="running")
+        self.answeredHits = metrics.counter("response_cache_hits_total", state="answered")
+        self.capacityEvictions = metrics.counter("response_cache_evictions_total",
+                                                 "Answered ids forgotten", reason="capacity")
+        self.ttlEvictions = metrics.counter("response_cache_evictions_total", reason="ttl")
+        metrics.gauge("response_cache_size", lambda: len(self.answered), "Answered ids remembered")
+        metrics.gauge("response_cache_running", lambda: len(self.running), "Ids claimed, not answered yet")
+
+
+    ## None if effectId is new, and now running. Otherwise its entry, [response or None, generation]
+    def claim(self, effectId):
+        now = self.clock()
+        self._expire(now)
+        entry = self.running.get(effectId)
+        if entry is not None:
+            self.runningHits.inc()
+            return entry
+        entry = self.answered.get(effectId)
+        if entry is not None:
+            self.answeredHits.inc()
+            entry[2] = now                          ## Still being asked about, keep it longer
+            self.answered.move_to_end(effectId)
+            return entry
+        self.running[effectId] = [None, None]
+        return None
+
+
+    ## A response for effectId that isn't the last one. Returns its entry, None if effectId isn't running
+    def progress(self, effectId, response):
+        entry = self.running.get(effectId)
+        if entry is not None:
+            entry[0] = response
+            entry[1] = None
+        return entry
+
+
+    ## The final response for effectId. Returns its entry
+    def store(self, effectId, response):
+        now = self.clock()
+        self.running.pop(effectId, None)
+        entry = [response, None, now]
+        self.answered[effectId] = entry
+        self.answered.move_to_end(effectId)
+        while len(self.answered) > self.capacity:
+            self.answered.popitem(last=False)
+            self.capacityEvictions.inc()
+        self._expire(now)
+        return entry
+
+
+    def get(self, effectId):                        ## The entry, without counting a hit
+        entry = self.running.get(effectId)
+        return entry if entry is not None else self.answered.get(effectId)
+
+
+    def discard(self, effectId):
+        self.running.pop(effectId, None)
+        self.answered.pop(effectId, None)
+
+
+    def running_ids(self):
+        return list(self.running)
+
+
+    def running_items(self):                        ## (id, entry) for every running id
+        return self.running.items()
+
+
+    def answered_items(self):                       ## (id, entry) for every answered id, oldest first
+        return self.answered.items()
+
+
+    def __len__(self):
+        return len(self.running) + len(self.answered)
+
+
+    def _expire(self, now):                         ## Oldest first, so stop at the first one still fresh
+        answered = self.answered
+        while answered:
+            effectId, entry = next(iter(answered.items()))
+            if now - entry[2] < self.ttl:
+                return
+            del answered[effectId]
+            self.ttlEvictions.inc()
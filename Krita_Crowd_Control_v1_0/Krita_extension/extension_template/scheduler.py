@@ -0,0 +1,227 @@
+###################################################################################################################
+    ## scheduler.py ##
+
+
+    ## One frame clock for every timed effect
+    ##
+    ##  A single timer on the GUI thread ticks while any animation is running, and stops when none are.
+    ##  Each tick reads a monotonic clock, so animations are placed by real elapsed time, not by how many ticks
+    ##      happened. A late tick just means a bigger step, the effect still ends exactly at its duration.
+    ##  Every animation adds its change for this frame to one FrameBatch, and the batch is applied to the
+    ##      canvas once, so three spins running at once still mean one setRotation() per frame.
+    ##
+    ##  The timer is passed in (a QTimer in Krita), so this file doesn't import krita or PyQt5 and can be
+    ##      driven by hand in the benchmarks
+###################################################################################################################
+import collections                          ## deque for the frame time history
+import time                                 ## monotonic()
+
+from .metrics import metrics                ## frame jitter for the status docker
+
+FRAME_INTERVAL = 1 / 60                     ## Target frame time, in seconds
+
+
+
+###################################################################################################################
+    ## What all animations changed this frame ##
+###################################################################################################################
+class FrameBatch:
+    __slots__ = ("rotation",)
+
+    def __init__(self):
+        self.rotation = 0.0                         ## Degrees to add to the canvas rotation
+
+    def is_empty(self):
+        return self.rotation == 0.0
+
+
+
+###################################################################################################################
+    ## One running animation ##
+
+
+    ## curve(progress) gives the effect's rotation offset in degrees for progress 0.0 to 1.0.
+    ##      Each frame the animation adds curve(now) - curve(last frame) to the batch, so the sum over the whole
+    ##      animation is exactly curve(1.0) - curve(0.0), however the frames fell.
+    ## A paused animation holds still. Resuming moves startTime forward by the pause, so no time is lost.
+###################################################################################################################
+class Animation:
+    __slots__ = ("curve", "duration", "startTime", "pausedAt", "lastValue", "onFinished", "finished")
+
+    def __init__(self, curve, duration, startTime, onFinished=None):
+        self.curve = curve
+        self.duration = duration                    ## Seconds
+        self.startTime = startTime                  ## monotonic() when it started, moved on by pauses
+        self.pausedAt = None                        ## monotonic() when it was paused, None while running
+        self.lastValue = curve(0.0)
+        self.onFinished = onFinished                ## onFinished(animation), called once at the end
+        self.finished = False
+
+    def _now(self, now):                            ## Time stands still while paused
+        return self.pausedAt if self.pausedAt is not None else now
+
+    def progress(self, now):
+        if self.duration <= 0:
+            return 1.0
+        return min(1.0, (self._now(now) - self.startTime) / self.duration)
+
+    def remaining(self, now):                       ## Seconds left
+        return max(0.0, self.duration - (self._now(now) - self.startTime))
+
+    def is_paused(self):
+        return self.pausedAt is not None
+
+    def pause(self, now):
+        if self.pausedAt is None:
+            self.pausedAt = now
+
+    def resume(self, now):
+        if self.pausedAt is not None:
+            self.startTime += now - self.pausedAt
+            self.pausedAt = None
+
+    def advance(self, now, batch):                  ## Returns True once the animation is done
+        if self.pausedAt is not None:
+            return False
+        progress = self.progress(now)
+        value = self.curve(progress)
+        batch.rotation += value - self.lastValue
+        self.lastValue = value
+        return progress >= 1.0
+
+
+
+###################################################################################################################
+    ## Frame time statistics ##
+
+
+    ## Keeps the last `size` frame intervals (time between ticks) and tick costs (time spent in a tick)
+    ## A frame counts as dropped when its interval is more than 1.5 target frames
+###################################################################################################################
+class FrameStats:
+    def __init__(self, size=600, target=FRAME_INTERVAL):
+        self.intervals = collections.deque(maxlen=size)
+        self.costs = collections.deque(maxlen=size)
+        self.target = target
+        self.frames = 0
+        self.dropped = 0
+
+    def record(self, interval, cost):
+        self.frames += 1
+        if interval is not None:
+            self.intervals.append(interval)
+            if interval > self.target * 1.5:
+                self.dropped += 1
+        self.costs.append(cost)
+
+    def reset(self):
+        self.intervals.clear()
+        self.costs.clear()
+        self.frames = 0
+        self.dropped = 0
+
+    ## {50: ms, 95: ms, 99: ms} over the kept intervals, or the tick costs with costs=True
+    def percentiles(self, points=(50, 95, 99), costs=False):
+        values = sorted(self.costs if costs else self.intervals)
+        if not values:
+            return dict((point, 0.0) for point in points)
+        last = len(values) - 1
+        return dict((point, values[min(last, int(round(point / 100.0 * last)))] * 1000) for point in points)
+
+    def summary(self):
+        interval = self.percentiles()
+        cost = self.percentiles(costs=True)
+        return ("%d frames, %d dropped, frame ms p50 %.1f p95 %.1f p99 %.1f, tick ms p50 %.2f p99 %.2f" % (
+            self.frames, self.dropped, interval[50], interval[95], interval[99], cost[50], cost[99]))
+
+
+
+###################################################################################################################
+    ## The scheduler ##
+
+
+    ## timer needs start(milliseconds), stop() and a timeout signal. The owner connects timer.timeout to tick()
+    ## apply(batch) is called once per frame when something changed, on the timer's thread
+    ## onIdle(stats) is called when the last animation finishes
+###################################################################################################################
+class AnimationScheduler:
+    def __init__(self, timer, apply, onIdle=None, clock=time.monotonic, interval=FRAME_INTERVAL):
+        self.timer = timer
+        self.apply = apply
+        self.onIdle = onIdle
+        self.clock = clock
+        self.interval = interval
+        self.animations = []
+        self.lastTick = None                        ## clock() of the last tick, None while idle
+        self.stats = FrameStats(target=interval)
+        self.jitter = metrics.histogram("frame_jitter_seconds", "How far frames land from the target interval")
+        self.tickTime = metrics.histogram("frame_tick_seconds", "Time spent in one animation frame")
+
+
+    def add(self, curve, duration, onFinished=None):
+        animation = Animation(curve, duration, self.clock(), onFinished)
+        self.animations.append(animation)
+        if self.lastTick is None:                   ## First one, wake the timer up
+            self.stats.reset()
+            self.lastTick = animation.startTime
+            self.timer.start(max(1, int(self.interval * 1000)))
+        return animation
+
+
+    ## Stop an animation where it is, without finishing its movement. It still gets onFinished
+    def remove(self, animation):
+        if animation in self.animations:
+            self.animations.remove(animation)
+            self._finish(animation)
+            self._stop_if_idle()
+
+
+    ## Stop every animation where it is, and the timer. The next add() starts from idle
+    def clear(self):
+        animations, self.animations = self.animations, []
+        for animation in animations:
+            self._finish(animation)
+        self._stop_if_idle()
+        self.timer.stop()
+        self.lastTick = None
+
+
+    def is_running(self):
+        return bool(self.animations)
+
+
+    def tick(self):
+        now = self.clock()
+        interval = now - self.lastTick if self.lastTick is not None else None
+        self.lastTick = now
+        if interval is not None:
+            self.jitter.observe(abs(interval - self.interval))
+
+        batch = FrameBatch()
+        done = [animation for animation in self.animations if animation.advance(now, batch)]
+        if not batch.is_empty():
+            self.apply(batch)                       ## One canvas update for every animation together
+
+        for animation in done:
+            self.animations.remove(animation)
+            self._finish(animation)
+
+        cost = self.clock() - now
+        self.stats.record(interval, cost)
+        self.tickTime.observe(cost)
+        self._stop_if_idle()
+
+
+    def _finish(self, animation):
+        if not animation.finished:
+            animation.finished = True
+            if animation.onFinished:
+                animation.onFinished(animation)
+
+
+    def _stop_if_idle(self):
+        if not self.animations and self.lastTick is not None:
+            self.timer.stop()
+            self.lastTick = None
+            if self.onIdle:
+                self.onIdle(self.stats)
@@ -0,0 +1,230 @@
+###################################################################################################################
+    ## settings.py ##
+
+
+    ## The plugin's options, kept in Krita's settings store (kritarc, group [CrowdControl])
+    ##
+    ##  SETTINGS lists every option once: its name, default, how to read it, and a label for the docker.
+    ##      A Settings object reads them all through a store (a Host, or anything with read_setting() and
+    ##      write_setting()) and keeps the parsed values as attributes, so an effect reading
+    ##      context.settings.nudgeAngle costs an attribute lookup, not a trip to Krita.
+    ##  Hot reload: set() writes one option, set_many() several and reload() reads them all again (after kritarc
+    ##      was edited by hand). Each calls the listeners once, with every name that changed, so the bridge can
+    ##      reconnect or retarget without a Krita restart, and a new host and port are one reconnect, not two.
+    ##  A value that doesn't parse is logged and the default is used instead.
+    ##
+    ##  `settings` below is the one the extension and the settings docker (settings_docker.py) share.
+###################################################################################################################
+from .host import TARGETS                   ## target modes
+from .log import log, LEVEL_NAMES           ## log level names
+
+SETTINGS_GROUP = "CrowdControl"             ## Krita settings group for our options
+
+
+
+###################################################################################################################
+    ## Parsers ##
+
+
+    ## Text from the store -> value. Raise ValueError for anything out of range
+###################################################################################################################
+def int_between(low, high):
+    def parse(text):
+        value = int(text)
+        if not low <= value <= high:
+            raise ValueError("%d isn't between %d and %d" % (value, low, high))
+        return value
+    return parse
+
+
+
+def float_between(low, high):
+    def parse(text):
+        value = float(text)
+        if not low <= value <= high:
+            raise ValueError("%g isn't between %g and %g" % (value, low, high))
+        return value
+    return parse
+
+
+
+def half_turns(text):                       ## Spins end on a whole number of half turns, see effects/canvas.py
+    value = round(float(text) * 2) / 2.0
+    if value <= 0:
+        raise ValueError("a spin needs at least half a turn")
+    return value
+
+
+
+def one_of(*choices):
+    def parse(text):
+        value = text.strip().lower()
+        if value not in choices:
+            raise ValueError("%s isn't one of %s" % (text, ", ".join(choices)))
+        return value
+    parse.choices = choices                 ## For the docker's drop downs
+    return parse
+
+
+
+def stripped(value):
+    return value.strip()
+
+
+
+###################################################################################################################
+    ## The options ##
+
+
+    ## (name, default, parser, label). Defaults are text, like the store gives them back
+###################################################################################################################
+class Setting:
+    __slots__ = ("name", "default", "parse", "label")
+
+    def __init__(self, name, default, parse, label):
+        self.name = name
+        self.default = default
+        self.parse = parse
+        self.label = label
+
+
+
+LOG_LEVELS = one_of(*LEVEL_NAMES)
+
+SETTINGS = tuple(Setting(*fields) for fields in (
+    ## Connection. Crowd Control's server is on 127.0.0.1, any port between 1024 - 49151
+    ("host", "127.0.0.1", stripped, "Crowd Control host"),
+    ("port", "2323", int_between(1024, 49151), "Crowd Control port"),
+
+    ## Effects
+    ("targetMode", TARGETS[0], one_of(*TARGETS), "Effects change"),
+    ("nudgeAngle", "5", float_between(0.0, 360.0), "Nudge angle (degrees)"),
+    ("spinTurns", "5", half_turns, "Spin turns"),
+    ("slowSpinTurns", "0.5", half_turns, "Slow chaotic spin turns"),
+    ("rainbowPreset", "rainbow01", stripped, "Rainbow paint preset"),
+    ("hueShift", "180", float_between(-360.0, 360.0), "Layer hue shift (degrees)"),
+    ("blurRadius", "4", int_between(1, 64), "Layer blur radius (pixels)"),
+    ("pixelateSize", "16", int_between(2, 512), "Layer pixelate block (pixels)"),
+
+    ## Logging, see bridge.py
+    ("logLevel", "warning", LOG_LEVELS, "Log level"),
+    ("logRing", "0", int_between(0, 100000), "Log records kept for dumps"),
+    ("logRingLevel", "debug", LOG_LEVELS, "Lowest level kept for dumps"),
+
+    ## Metrics export, see bridge.py
+    ("metricsPrometheusFile", "", stripped, "Prometheus metrics file"),
+    ("metricsJsonlFile", "", stripped, "JSONL metrics file"),
+    ("metricsInterval", "10", float_between(0.1, 86400.0), "Metrics export interval (seconds)"),
+
+    ## Recording the traffic, see capture.py. Appended to, empty for off
+    ("captureFile", "", stripped, "Capture file"),
+))
+
+
+
+###################################################################################################################
+    ## Settings ##
+###################################################################################################################
+class Settings:
+    def __init__(self, store=None, group=SETTINGS_GROUP, schema=SETTINGS):
+        self.group = group
+        self.schema = dict((setting.name, setting) for setting in schema)
+        self.listeners = []                             ## Called with a set of the names that changed
+        self.texts = {}                                 ## name -> text it was read from
+        for setting in schema:                          ## Defaults until a store is bound
+            setattr(self, setting.name, setting.parse(setting.default))
+            self.texts[setting.name] = setting.default
+        self.store = None
+        if store is not None:
+            self.bind(store)
+
+
+    ## Read everything from store, and write there from now on
+    def bind(self, store):
+        self.store = store
+        return self.reload()
+
+
+    def listen(self, listener):
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+
+    def unlisten(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+
+    ## Read every option from the store again. Returns the names that changed
+    def reload(self):
+        changed = set()
+        if self.store is not None:
+            for name, setting in self.schema.items():
+                if self._apply(setting, self.store.read_setting(self.group, name, setting.default)):
+                    changed.add(name)
+        self._notify(changed)
+        return changed
+
+
+    ## Change one option and save it. Raises ValueError (and changes nothing) if value doesn't parse
+    def set(self, name, value):
+        errors = self.set_many({name: value})
+        if errors:
+            raise errors[name]
+
+
+    ## Change and save several options, then tell the listeners once. Returns {name: ValueError} for the
+    ##      values that don't parse, those are left as they were
+    def set_many(self, values):
+        errors = {}
+        changed = set()
+        for name, value in values.items():
+            setting = self.schema[name]
+            value = str(value)
+            try:
+                setting.parse(value)                    ## Check before anything is written
+            except ValueError as error:
+                errors[name] = error
+                continue
+            if self.store is not None:
+                self.store.write_setting(self.group, name, value)
+            if self._apply(setting, value):
+                changed.add(name)
+        self._notify(changed)
+        return errors
+
+
+    def text(self, name):                               ## As the store has it, for the docker
+        return self.texts[name]
+
+
+    def _apply(self, setting, value):                   ## True if the value changed
+        value = "" if value is None else str(value)
+        try:
+            parsed = setting.parse(value)
+        except ValueError as error:
+            log.warning("Setting %s: %s, using %s", setting.name, error, setting.default)
+            value = setting.default
+            parsed = setting.parse(value)
+        self.texts[setting.name] = value
+        if getattr(self, setting.name) == parsed:
+            return False
+        setattr(self, setting.name, parsed)
+        return True
+
+
+    def _notify(self, changed):
+        if not changed:
+            return
+        for listener in list(self.listeners):
+            listener(changed)
+
+
+
+###################################################################################################################
+    ## The extension's settings ##
+
+
+    ## Bound to Krita's store by __init__.py
+###################################################################################################################
+settings = Settings()
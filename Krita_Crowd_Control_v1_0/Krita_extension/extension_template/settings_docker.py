@@ -0,0 +1,108 @@
+###################################################################################################################
+    ## settings_docker.py ##
+
+
+    ## Krita docker for the plugin's options (settings.py)
+    ##
+    ##  One row per option: a drop down for choices, a text box for the rest. Apply saves what changed to
+    ##      kritarc and the running bridge picks it up right away (a new host or port reconnects). Reload reads
+    ##      kritarc again, for edits made outside Krita. Settings > Dockers > Crowd Control Settings
+###################################################################################################################
+from krita import *                         ## Krita
+
+from .settings import settings              ## the extension's options
+
+from PyQt5.QtWidgets import (
+    QWidget,                                ## the docker's contents
+    QFormLayout,                            ## label + field rows
+    QHBoxLayout,                            ## the buttons
+    QVBoxLayout,
+    QLineEdit,                              ## free text options
+    QComboBox,                              ## options with a few choices
+    QPushButton,
+    QLabel                                  ## what Apply did
+)
+
+DOCKER_ID = "crowdControlSettings"
+
+
+
+###################################################################################################################
+    ## The docker ##
+###################################################################################################################
+class SettingsDocker(DockWidget):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Crowd Control Settings")
+        widget = QWidget(self)
+        layout = QVBoxLayout(widget)
+
+        form = QFormLayout()
+        self.fields = {}                                    ## name -> QLineEdit or QComboBox
+        for name, setting in settings.schema.items():
+            choices = getattr(setting.parse, "choices", None)
+            if choices is not None:
+                field = QComboBox(widget)
+                field.addItems(choices)
+            else:
+                field = QLineEdit(widget)
+            self.fields[name] = field
+            form.addRow(setting.label, field)
+        layout.addLayout(form)
+
+        buttons = QHBoxLayout()
+        apply = QPushButton("Apply", widget)
+        apply.clicked.connect(self.apply)
+        reload = QPushButton("Reload", widget)
+        reload.clicked.connect(self.reload)
+        buttons.addWidget(apply)
+        buttons.addWidget(reload)
+        layout.addLayout(buttons)
+
+        self.message = QLabel(widget)
+        self.message.setWordWrap(True)
+        layout.addWidget(self.message)
+        layout.addStretch()
+        self.setWidget(widget)
+
+        self.applying = False                               ## Inside apply()
+        settings.listen(self.settings_changed)              ## Changed somewhere else, show it
+        self.show_settings()
+
+
+    def show_settings(self):
+        for name, field in self.fields.items():
+            if isinstance(field, QComboBox):
+                field.setCurrentText(settings.text(name))
+            else:
+                field.setText(settings.text(name))
+
+
+    def settings_changed(self, names):
+        if not self.applying:                               ## Our own set() calls, the boxes are right already
+            self.show_settings()
+
+
+    ## Every changed box in one set_many(), so the listeners hear about them together: a new host and port
+    ##      is one reconnect. A box that doesn't parse is left as typed so it can be fixed, not refreshed
+    def apply(self):
+        values = dict((name, field.currentText() if isinstance(field, QComboBox) else field.text())
+                      for name, field in self.fields.items())
+        changed = dict((name, value) for name, value in values.items() if value != settings.text(name))
+        self.applying = True
+        try:
+            errors = settings.set_many(changed)
+        finally:
+            self.applying = False
+        problems = ["%s: %s" % (settings.schema[name].label, errors[name]) for name in changed if name in errors]
+        self.message.setText("\n".join(problems) if problems else "Saved")
+
+
+    def reload(self):
+        changed = settings.reload()
+        self.show_settings()
+        self.message.setText("Reloaded, %d changed" % len(changed))
+
+
+    def canvasChanged(self, canvas):                        ## Required by DockWidget, nothing per canvas here
+        pass
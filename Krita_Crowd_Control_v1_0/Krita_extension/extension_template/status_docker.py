@@ -0,0 +1,98 @@
+###################################################################################################################
+    ## status_docker.py ##
+
+
+    ## Krita docker with the connection status and where the time goes
+    ##
+    ##  Reads the metrics registry (metrics.py) once a second, and only while the docker is visible, so it costs
+    ##      nothing on the message path. Settings > Dockers > Crowd Control Status
+###################################################################################################################
+from krita import *                         ## Krita
+
+from .metrics import metrics                ## what we show
+
+from PyQt5.QtWidgets import QLabel          ## the read out
+from PyQt5.QtCore import QTimer             ## refresh
+
+REFRESH_MS = 1000                           ## Low on purpose, this is for a human to glance at
+DOCKER_ID = "crowdControlStatus"
+
+TIMINGS = (                                 ## (label, histogram name) shown as p50 / p99 / max in ms
+    ("Decode", "decode_seconds"),
+    ("Wait for GUI", "dispatch_wait_seconds"),
+    ("Handle", "dispatch_handle_seconds"),
+    ("Frame jitter", "frame_jitter_seconds"),
+    ("Frame tick", "frame_tick_seconds"),
+)
+
+
+
+###################################################################################################################
+    ## Text for the docker ##
+
+
+    ## snapshot is metrics.snapshot(). Kept apart from the widget so it reads plainly
+###################################################################################################################
+def status_text(snapshot):
+    def value(name, default=0):
+        found = snapshot.get(name)
+        return default if found is None else found
+
+    def total(prefix):                                      ## Sum over every label
+        return sum(found for name, found in snapshot.items()
+                   if name.startswith(prefix) and isinstance(found, (int, float)))
+
+    lines = [
+        "Crowd Control: %s" % ("connected" if value("connected") else "not connected"),
+        "Reconnects: %d" % value("reconnects_total"),
+        "Messages in: %d   out: %d" % (total("messages_in_total"), total("messages_out_total")),
+        "Bytes in: %d   out: %d   sends: %d" % (value("bytes_in_total"), value("bytes_out_total"),
+                                                value("send_calls_total")),
+        "Queue: %d   running: %d   waiting: %d" % (value("dispatch_queue_depth"), value("effects_running"),
+                                                  value("effects_queued")),
+        "Shed: %d   malformed: %d" % (value("messages_shed_total"), value("messages_malformed_total")),
+        "Repeats: %d   remembered: %d   evicted: %d" % (value("messages_repeated_total"),
+                                                      value("response_cache_size"),
+                                                      total("response_cache_evictions_total")),
+        "",
+        "%-14s %8s %8s %8s" % ("ms", "p50", "p99", "max"),
+    ]
+    for label, name in TIMINGS:
+        histogram = snapshot.get(name)
+        if histogram and histogram["count"]:
+            lines.append("%-14s %8.2f %8.2f %8.2f" % (label, histogram["p50"] * 1000, histogram["p99"] * 1000,
+                                                     histogram["max"] * 1000))
+    return "\n".join(lines)
+
+
+
+###################################################################################################################
+    ## The docker ##
+###################################################################################################################
+class StatusDocker(DockWidget):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Crowd Control Status")
+        self.label = QLabel(self)
+        self.label.setStyleSheet("font-family: monospace;")
+        self.setWidget(self.label)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.visibilityChanged.connect(self.visibility_changed)
+
+
+    def visibility_changed(self, visible):                 ## Only read the metrics while someone can see them
+        if visible:
+            self.refresh()
+            self.timer.start(REFRESH_MS)
+        else:
+            self.timer.stop()
+
+
+    def refresh(self):
+        self.label.setText(status_text(metrics.snapshot()))
+
+
+    def canvasChanged(self, canvas):                        ## Required by DockWidget, nothing per canvas here
+        pass
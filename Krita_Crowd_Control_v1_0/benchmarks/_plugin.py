@@ -0,0 +1,47 @@
+###################################################################################################################
+    ## _plugin.py ##
+
+
+    ## Puts tools/ on sys.path so the benchmarks can use the plugin loader and the fake Crowd Control server
+    ##
+    ##  Usage:
+    ##      import _plugin
+    ##      framer = _plugin.load("framer")
+    ##
+    ##  connected() is the setup the whole-plugin benchmarks share: a fake connector, and a Bridge on the given
+    ##      host that has connected to it. Both are stopped when the block ends
+    ##      with _plugin.connected(FakeHost(), resendAfter=0.01) as (server, plugin):
+    ##          ...
+###################################################################################################################
+import contextlib                           ## contextmanager for connected()
+import os                                   ## paths
+import sys                                  ## sys.path
+
+TOOLS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools"))
+
+if TOOLS_DIR not in sys.path:
+    sys.path.insert(0, TOOLS_DIR)
+
+from plugin_loader import load              ## noqa: E402
+from fake_crowd_control import FakeCrowdControl             ## noqa: E402
+
+CONNECT_TIMEOUT = 5.0                       ## Seconds the Bridge gets to connect to the fake connector
+
+
+
+## serverOptions go to FakeCrowdControl, polls every 0.25 s and KeepAlives every 1 s unless they say otherwise.
+##      Raises RuntimeError when the Bridge doesn't connect
+@contextlib.contextmanager
+def connected(host, **serverOptions):
+    options = {"pollInterval": 0.25, "keepAliveInterval": 1.0}
+    options.update(serverOptions)
+    server = FakeCrowdControl(**options).start()
+    plugin = load("bridge").Bridge(host, ("127.0.0.1", server.port))
+    plugin.start()
+    try:
+        if not host.run(until=plugin.is_connected, timeout=CONNECT_TIMEOUT):
+            raise RuntimeError("the bridge didn't connect to the fake server")
+        yield server, plugin
+    finally:
+        plugin.stop()
+        server.stop()
@@ -0,0 +1,79 @@
+###################################################################################################################
+    ## bench_dispatch.py ##
+
+
+    ## Effect dispatch through EffectRegistry vs. the old if/elif chain over effect codes
+    ##
+    ##  Builds catalogs of 7, 100 and 500 effects and times looking up and calling the handler for a mix of
+    ##      codes from the whole catalog. The chain has to compare against every code before the one it
+    ##      finds, the registry is one dict lookup.
+    ##
+    ##  python benchmarks/bench_dispatch.py
+###################################################################################################################
+import random                               ## request mix
+import time                                 ## perf_counter()
+
+import _plugin
+
+registry = _plugin.load("registry")
+
+CALLS = 200000                              ## Dispatches per case
+
+
+
+def handler(context, request, response):
+    pass
+
+
+
+## An if/elif chain like the old handle_effect(), for the same codes
+def build_chain(codes):
+    lines = ["def dispatch(context, request, response):", "    code = request['code']"]
+    for i, code in enumerate(codes):
+        keyword = "if" if i == 0 else "elif"
+        lines.append("    %s code == %r:" % (keyword, code))
+        lines.append("        handler(context, request, response)")
+    namespace = {"handler": handler}
+    exec("\n".join(lines), namespace)
+    return namespace["dispatch"]
+
+
+
+def build_registry(codes):
+    effects = registry.EffectRegistry()
+    for code in codes:
+        effects.effect(code, code)(handler)
+    return effects
+
+
+
+def time_calls(function, requests):
+    response = {}
+    start = time.perf_counter()
+    for request in requests:
+        function(None, request, response)
+    return (time.perf_counter() - start) / len(requests) * 1e9
+
+
+
+def main():
+    rng = random.Random(1)
+    print("%-10s %15s %15s %10s" % ("effects", "elif ns/call", "dict ns/call", "speedup"))
+    for size in (7, 100, 500):
+        codes = ["effect_%04d" % i for i in range(size)]
+        requests = [{"code": rng.choice(codes)} for _ in range(CALLS)]
+
+        chain = build_chain(codes)
+        effects = build_registry(codes)
+
+        def dispatch(context, request, response):
+            effects.get(request['code']).handler(context, request, response)
+
+        chainTime = time_calls(chain, requests)
+        dictTime = time_calls(dispatch, requests)
+        print("%-10d %15.1f %15.1f %9.1fx" % (size, chainTime, dictTime, chainTime / dictTime))
+
+
+
+if __name__ == "__main__":
+    main()
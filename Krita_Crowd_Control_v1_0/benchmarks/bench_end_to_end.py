@@ -0,0 +1,90 @@
+###################################################################################################################
+    ## bench_end_to_end.py ##
+
+
+    ## Redeem to response latency through the whole plugin, without Krita
+    ##
+    ##  The fake Crowd Control server (tools/fake_crowd_control.py) replays redeems over real TCP at a fixed rate.
+    ##      The plugin's Bridge runs on the headless Krita stand-in (tools/fake_krita.py): network thread,
+    ##      framer, dispatcher, GUI thread event loop, effect engine, handlers, and back out.
+    ##  For each rate it reports latency from the request going out to its first reply, p50/p99/max, and CPU:
+    ##      gui us/msg     - time on the "GUI thread" (the event loop), which is what makes Krita stutter
+    ##      process us/msg - every thread, the fake server's included, so an upper bound
+    ##  A rate is sustained when every redeem is answered and p99 stays under --p99 ms. The highest one is the
+    ##      "max sustained redeems/s".
+    ##
+    ##  python benchmarks/bench_end_to_end.py [--rates 50 200 1000 2000 5000] [--seconds 3] [--p99 50]
+###################################################################################################################
+import argparse                             ## command line
+import time                                 ## monotonic(), thread_time(), process_time()
+
+import _plugin
+from fake_krita import FakeHost
+
+CODES = (                                   ## Mostly instant effects, some timed ones to keep the scheduler busy
+    "nudge_canvas_cw", "nudge_canvas_ccw", "vertical_flip", "horizontal_flip",
+    "rainbow_paint", "color_red", "brush_pencil", "spin_canvas",
+)
+
+
+
+def percentile(values, point):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(point / 100.0 * (len(values) - 1))))]
+
+
+
+def run(rate, seconds):
+    host = FakeHost()
+    with _plugin.connected(host) as (server, plugin):
+        count = max(50, int(rate * seconds))
+        guiStart = time.thread_time()
+        processStart = time.process_time()
+        start = time.monotonic()
+        server.replay(CODES, rate, count, duration=250)            ## Spins of 250ms
+        answered = host.run(until=lambda: len(server.replyTimes) >= count, timeout=seconds * 3 + 5.0)
+        elapsed = time.monotonic() - start
+        guiCpu = time.thread_time() - guiStart
+        processCpu = time.process_time() - processStart
+        latencies = [latency * 1000 for latency in server.latencies()]
+        return {
+            "count": count,
+            "answered": len(latencies),
+            "complete": answered,
+            "achieved": len(latencies) / elapsed,
+            "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else 0.0,
+            "gui": guiCpu / count * 1e6,
+            "process": processCpu / count * 1e6,
+            "turns": host.turns,
+        }
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rates", type=float, nargs="+", default=[50, 200, 1000, 2000, 5000])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--p99", type=float, default=50.0, help="ms, the most p99 can be for a sustained rate")
+    args = parser.parse_args()
+
+    print("%8s %8s %9s %8s %8s %8s %12s %15s" % ("rate/s", "answered", "got/s", "p50 ms", "p99 ms", "max ms",
+                                                 "gui us/msg", "process us/msg"))
+    sustained = 0
+    for rate in args.rates:
+        result = run(rate, args.seconds)
+        print("%8.0f %4d/%-4d %8.0f %8.2f %8.2f %8.2f %12.1f %15.1f" % (
+            rate, result["answered"], result["count"], result["achieved"], result["p50"], result["p99"],
+            result["max"], result["gui"], result["process"]))
+        if result["complete"] and result["p99"] <= args.p99:
+            sustained = max(sustained, rate)
+    print("max sustained redeems/s (p99 <= %.0f ms): %s" % (args.p99, "%.0f" % sustained if sustained else
+                                                           "none of the rates tried"))
+
+
+
+if __name__ == "__main__":
+    main()
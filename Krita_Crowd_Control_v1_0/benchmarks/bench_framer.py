@@ -0,0 +1,79 @@
+###################################################################################################################
+    ## bench_framer.py ##
+
+
+    ## Frames/sec of FrameDecoder when each TCP segment holds 1, 10 or 100 messages,
+    ##      plus the worst case of a large message arriving in small pieces
+    ##
+    ##  python benchmarks/bench_framer.py
+###################################################################################################################
+import json                                 ## build realistic messages
+import time                                 ## perf_counter()
+
+import _plugin
+
+framer = _plugin.load("framer")
+
+SECONDS = 1.0                               ## How long to run each case for
+
+
+
+## A typical EffectStart request, as Crowd Control sends it
+def make_message(i):
+    return json.dumps({
+        "id": i,
+        "code": "spin_canvas",
+        "viewer": "viewer%d" % i,
+        "type": 1,
+        "duration": 10000,
+        "parameters": [],
+    }).encode("utf-8") + b"\x00"
+
+
+
+## Feed segment into a decoder for SECONDS, return frames/sec
+def run_case(segment, perSegment):
+    decoder = framer.FrameDecoder()
+    frames = 0
+    start = time.perf_counter()
+    deadline = start + SECONDS
+    while time.perf_counter() < deadline:
+        for _ in range(100):                                ## Check the clock less often than we feed
+            frames += len(decoder.feed(segment))
+    elapsed = time.perf_counter() - start
+    assert frames % perSegment == 0
+    return frames / elapsed
+
+
+
+## One big message split into chunk sized reads
+def run_split_case(size, chunk):
+    payload = b"{\"id\":1,\"data\":\"" + b"x" * size + b"\"}\x00"
+    chunks = [memoryview(payload)[i:i + chunk] for i in range(0, len(payload), chunk)]
+    decoder = framer.FrameDecoder()
+    frames = 0
+    start = time.perf_counter()
+    deadline = start + SECONDS
+    while time.perf_counter() < deadline:
+        for piece in chunks:
+            frames += len(decoder.feed(piece))
+    elapsed = time.perf_counter() - start
+    return frames / elapsed
+
+
+
+def main():
+    print("%-28s %15s %15s" % ("case", "frames/sec", "MB/sec"))
+    for perSegment in (1, 10, 100):
+        segment = b"".join(make_message(i) for i in range(perSegment))
+        rate = run_case(segment, perSegment)
+        mbps = rate * len(segment) / perSegment / 1e6
+        print("%-28s %15.0f %15.1f" % ("%d msg/segment" % perSegment, rate, mbps))
+
+    rate = run_split_case(64 * 1024, 1024)
+    print("%-28s %15.0f %15.1f" % ("64 KiB msg in 1 KiB reads", rate, rate * 64 * 1024 / 1e6))
+
+
+
+if __name__ == "__main__":
+    main()
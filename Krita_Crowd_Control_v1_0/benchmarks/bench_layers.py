@@ -0,0 +1,116 @@
+###################################################################################################################
+    ## bench_layers.py ##
+
+
+    ## Layer effects (pixels.py) on synthetic layers from 1K to 8K square, on the headless stand-in
+    ##
+    ##  For each size and operation:
+    ##      serial ms   - the operation over every band on one thread (pixels.process)
+    ##      effect ms   - through the LayerPipeline like a redeem: read the layer, the bands on the worker
+    ##                      thread, one write back. From submit to the write
+    ##      gui ms      - how much of that the GUI thread (the event loop) spent, read and write included.
+    ##                      That's what Krita would stutter for
+    ##  The first size also checks the banded result is the same as doing the whole image as one band, and
+    ##      times a plain Python loop inverting a corner of it, scaled up, for comparison.
+    ##  The worker is no faster than serial, it isn't meant to be: the GUI thread only does the read and the write.
+    ##
+    ##  python benchmarks/bench_layers.py [--sizes 1024 2048 4096 8192]
+###################################################################################################################
+import argparse                             ## command line
+import time                                 ## perf_counter(), thread_time()
+
+import _plugin
+from fake_krita import FakeHost, FakeKrita
+
+pixels = _plugin.load("pixels")
+
+OPERATIONS = (
+    ("invert", lambda: pixels.Invert()),
+    ("hue shift", lambda: pixels.HueShift(120)),
+    ("blur r4", lambda: pixels.BoxBlur(4)),
+    ("pixelate 16", lambda: pixels.Pixelate(16)),
+)
+
+
+
+def synthetic(size):                        ## Gradients and noise, so no operation gets an easy image
+    numpy = pixels.numpy
+    rows = numpy.arange(size, dtype=numpy.uint32)[:, None]
+    columns = numpy.arange(size, dtype=numpy.uint32)[None, :]
+    image = numpy.empty((size, size, 4), numpy.uint8)
+    image[:, :, 0] = (columns * 255 // size).astype(numpy.uint8)
+    image[:, :, 1] = (rows * 255 // size).astype(numpy.uint8)
+    image[:, :, 2] = ((rows * 7 + columns * 13) % 256).astype(numpy.uint8)
+    image[:, :, 3] = 255
+    return bytearray(image.tobytes())
+
+
+
+def naive_invert_ms(data, size, corner=128):    ## A plain Python loop over a corner, scaled to the whole layer
+    pixelsOut = bytearray(corner * corner * 4)
+    start = time.perf_counter()
+    for y in range(corner):
+        for x in range(corner):
+            index = (y * size + x) * 4
+            out = (y * corner + x) * 4
+            pixelsOut[out] = 255 - data[index]
+            pixelsOut[out + 1] = 255 - data[index + 1]
+            pixelsOut[out + 2] = 255 - data[index + 2]
+            pixelsOut[out + 3] = data[index + 3]
+    return (time.perf_counter() - start) * (size * size) / (corner * corner) * 1000
+
+
+
+def run_pipeline(host, document, data, operation):
+    document.pixels = data
+    pipeline = pixels.LayerPipeline(host)
+    writes = document.writes
+    gui = time.thread_time()
+    start = time.perf_counter()
+    pipeline.submit(operation, "bench")
+    host.run(until=pipeline.idle, timeout=120.0)
+    elapsed = time.perf_counter() - start
+    gui = time.thread_time() - gui
+    pipeline.close()
+    if document.writes != writes + 1:
+        raise RuntimeError("the layer wasn't written once")
+    return elapsed * 1000, gui * 1000
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 2048, 4096, 8192])
+    args = parser.parse_args()
+    if not pixels.AVAILABLE:
+        print("NumPy isn't installed, layer effects are unavailable")
+        return
+
+    print("%6s %-12s %10s %10s %10s" % ("size", "operation", "serial ms", "effect ms", "gui ms"))
+    for index, size in enumerate(args.sizes):
+        krita = FakeKrita(windows=0)
+        document = krita.open_window().activeView().document()
+        document.width = document.height = size
+        host = FakeHost(krita)
+        data = synthetic(size)
+        source = pixels.as_image(data, size, size)
+
+        for name, make in OPERATIONS:
+            operation = make()
+            start = time.perf_counter()
+            serial = pixels.process(operation, source)
+            serialMs = (time.perf_counter() - start) * 1000
+            effectMs, guiMs = run_pipeline(host, document, data, operation)
+            if index == 0:
+                whole = pixels.process(operation, source, rows=size)
+                if bytes(document.pixels) != whole.tobytes() or not (serial == whole).all():
+                    raise RuntimeError("%s: banded result differs from one band" % name)
+            print("%6d %-12s %10.1f %10.1f %10.1f" % (size, name, serialMs, effectMs, guiMs))
+            del serial
+        if index == 0:
+            print("%6d %-12s %10.0f   (plain Python loop, estimated)" % (size, "invert", naive_invert_ms(data, size)))
+
+
+
+if __name__ == "__main__":
+    main()
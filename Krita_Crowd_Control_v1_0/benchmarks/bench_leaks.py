@@ -0,0 +1,137 @@
+###################################################################################################################
+    ## bench_leaks.py ##
+
+
+    ## Starts and stops the same Bridge over and over, against the fake connector, and checks nothing piles up
+    ##
+    ##  Each cycle is start() then stop(), the way the extension's menu items and Krita closing do it:
+    ##      odd cycles   - stop() while the connect is still in flight
+    ##      even cycles  - wait for the connection, run a nudge and wait for its answer, then stop()
+    ##      every 50th   - also a layer effect, so the worker thread is made and has to be joined (needs NumPy)
+    ##      every 20th   - also a 10 s spin, stopped halfway. It must be answered Finished, and the next cycle's
+    ##                      spin Success, not Queue: stop() can't leave an effect holding its slot
+    ##  After a few warm up cycles, threads and open file descriptors are counted every --every cycles. Both
+    ##      must end where they started: every network thread joined, every socket and wakeup pipe closed.
+    ##      Exits with status 1 when they don't. File descriptors are only counted where /proc/self/fd exists
+    ##
+    ##  python benchmarks/bench_leaks.py [--cycles 1000] [--every 100]
+###################################################################################################################
+import argparse                             ## command line
+import os                                   ## /proc/self/fd
+import sys                                  ## exit status
+import threading                            ## active_count()
+import time                                 ## perf_counter()
+
+import _plugin
+from fake_crowd_control import FakeCrowdControl
+from fake_krita import FakeHost
+
+bridge = _plugin.load("bridge")
+pixels = _plugin.load("pixels")
+protocol = _plugin.load("protocol")
+
+SUCCESS = protocol.EffectStatus.Success.value
+FINISHED = protocol.EffectStatus.Finished.value
+
+WARM_UP = 10                                ## Cycles before counting, so lazy imports and pools are settled
+
+
+
+def open_files():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+
+def counts():
+    return threading.active_count(), open_files()
+
+
+
+def statuses(server, effectId):
+    with server.lock:
+        return [reply.get("status") for reply in server.replies.get(effectId, ())]
+
+
+
+def cycle(number, plugin, host, server):
+    plugin.start()
+    if number % 2:                                  ## Stop mid connect
+        plugin.stop()
+        return
+    if not host.run(until=plugin.is_connected, timeout=5.0):
+        raise RuntimeError("cycle %d didn't connect" % number)
+    effectId = server.request_effect("nudge_canvas_cw")
+    if not host.run(until=lambda: effectId in server.replyTimes, timeout=5.0):
+        raise RuntimeError("cycle %d didn't answer the nudge" % number)
+    if number % 50 == 0 and pixels.AVAILABLE:
+        plugin.layers.submit(pixels.Invert(), "invert")
+        host.run(until=plugin.layers.idle, timeout=5.0)
+    spinId = None
+    if number % 20 == 0:
+        spinId = server.request_effect("spin_canvas", 10000)
+        if not host.run(until=lambda: spinId in server.replyTimes, timeout=5.0):
+            raise RuntimeError("cycle %d didn't answer the spin" % number)
+        if statuses(server, spinId)[0] != SUCCESS:
+            raise RuntimeError("cycle %d: the spin was answered %s, an earlier one kept its slot" % (
+                number, statuses(server, spinId)))
+        host.run(timeout=0.05)                      ## A few frames in
+    plugin.stop()
+    if spinId is not None and not host.run(until=lambda: FINISHED in statuses(server, spinId), timeout=2.0):
+        raise RuntimeError("cycle %d: the stopped spin wasn't answered Finished" % number)
+
+
+
+def settle(host, server):                           ## Let the fake connector notice the last disconnect
+    host.run(until=lambda: server.client is None, timeout=2.0)
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cycles", type=int, default=1000)
+    parser.add_argument("--every", type=int, default=100, help="cycles between counts")
+    args = parser.parse_args()
+
+    server = FakeCrowdControl(pollInterval=0.25, keepAliveInterval=1.0).start()
+    host = FakeHost()
+    plugin = bridge.Bridge(host, ("127.0.0.1", server.port))
+    try:
+        for number in range(WARM_UP):
+            cycle(number, plugin, host, server)
+        settle(host, server)
+        threads, files = start = counts()
+        print("cycles   threads   open files   ms/cycle")
+        print("%6d %9d %12s" % (0, threads, files))
+
+        started = time.perf_counter()
+        counted = 0
+        for number in range(1, args.cycles + 1):
+            cycle(WARM_UP + number, plugin, host, server)
+            if number % args.every == 0 or number == args.cycles:
+                elapsed = time.perf_counter() - started
+                settle(host, server)
+                threads, files = counts()
+                print("%6d %9d %12s %10.2f" % (number, threads, files, elapsed / (number - counted) * 1000))
+                started = time.perf_counter()
+                counted = number
+        end = counts()
+    finally:
+        plugin.stop()
+        server.stop()
+
+    print("connections accepted by the fake connector: %d" % server.connections)
+    leaked = [name for name, before, after in zip(("threads", "open files"), start, end)
+              if before is not None and after > before]
+    if leaked:
+        print("LEAKED: %s. Threads still running: %s" % (", ".join(leaked),
+                                                          ", ".join(t.name for t in threading.enumerate())))
+        sys.exit(1)
+    print("flat: every thread joined, every socket closed")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+###################################################################################################################
+    ## bench_lifecycle.py ##
+
+
+    ## Bursts of timed and instant redeems through EffectEngine, with the real scheduler on a fake clock
+    ##
+    ##  Every request must end with exactly one final answer (Finished, Success for instant effects, Retry or
+    ##      Failure), queued ones must start in order, and pause/resume must not lose time. Reports the cost
+    ##      per request and how the answers split.
+    ##
+    ##  python benchmarks/bench_lifecycle.py
+###################################################################################################################
+import collections                          ## Counter
+import random                               ## request mix
+import time                                 ## perf_counter()
+
+import _plugin
+
+registry = _plugin.load("registry")
+scheduler = _plugin.load("scheduler")
+lifecycle = _plugin.load("lifecycle")
+protocol = _plugin.load("protocol")
+messages = _plugin.load("messages")
+
+STATUS_NAMES = dict((status.value, status.name) for status in protocol.EffectStatus)
+
+
+
+class FakeTimer:
+    def start(self, milliseconds):
+        pass
+
+    def stop(self):
+        pass
+
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+
+class Context:                              ## What the handlers get, like TestEffects
+    def __init__(self, animations):
+        self.animations = animations
+
+    def start_spin(self, curve, duration):
+        return self.animations.add(curve, duration)
+
+
+
+def build_registry():
+    effects = registry.EffectRegistry()
+
+    def spin(context, request, response):
+        return context.start_spin(lambda progress: 360 * progress,
+                                  effects.get(request.code).requested_duration(request))
+
+    def nudge(context, request, response):
+        pass
+
+    for i in range(4):
+        effects.effect("spin_%d" % i, "Spin", duration=10)(spin)
+    for i in range(8):
+        effects.effect("nudge_%d" % i, "Nudge")(nudge)
+    return effects
+
+
+
+def run(rate, seconds, rng):
+    clock = FakeClock()
+    animations = scheduler.AnimationScheduler(FakeTimer(), lambda batch: None, clock=clock)
+    finals = collections.Counter()
+    finalIds = collections.Counter()
+    others = collections.Counter()
+
+    def send(response, final):
+        if final:
+            finals[STATUS_NAMES[response.status]] += 1
+            finalIds[response.id] += 1
+        else:
+            others[STATUS_NAMES[response.status]] += 1
+
+    effects = build_registry()
+    codes = [info.code for info in effects]
+    engine = lifecycle.EffectEngine(Context(animations), animations, send, clock=clock)
+
+    requests = int(rate * seconds)
+    spent = 0.0
+    for i in range(requests):
+        clock.now += 1.0 / rate
+        request = messages.EffectRequest(i + 1, 1, code=rng.choice(codes), duration=2000)
+        start = time.perf_counter()
+        engine.start(effects.get(request.code), request)
+        if i == requests // 2:
+            engine.pause_all()
+        if i == requests // 2 + int(rate):
+            engine.resume_all()
+        animations.tick()
+        spent += time.perf_counter() - start
+
+    while animations.is_running() or engine.queued():       ## Let everything finish
+        clock.now += scheduler.FRAME_INTERVAL
+        animations.tick()
+
+    assert len(finalIds) == requests and max(finalIds.values()) == 1, "every request needs one final answer"
+    return requests, spent / requests * 1e6, finals, others
+
+
+
+def main():
+    rng = random.Random(1)
+    for rate in (10, 50, 200):
+        requests, microseconds, finals, others = run(rate, 20, rng)
+        print("%4d redeems/s: %5d requests, %6.1f us/request" % (rate, requests, microseconds))
+        print("    final   " + ", ".join("%s %d" % item for item in sorted(finals.items())))
+        print("    interim " + ", ".join("%s %d" % item for item in sorted(others.items())))
+
+
+
+if __name__ == "__main__":
+    main()
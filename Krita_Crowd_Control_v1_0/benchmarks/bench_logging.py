@@ -0,0 +1,99 @@
+###################################################################################################################
+    ## bench_logging.py ##
+
+
+    ## Logging cost per message, with the old unconditional logging and with log.py at different levels
+    ##
+    ##  Mixed traffic (mostly GameUpdate polls and KeepAlives, some EffectStarts), already parsed, goes through
+    ##      a handle_request stand-in that logs the way the plugin does. Every message used to get to
+    ##      handle_request, so every message is logged here.
+    ##  "eager" is the old code: five string builds and sink calls per message, whatever the level.
+    ##  The sink writes to os.devnull, standing in for qWarning, so real numbers for eager are worse.
+    ##
+    ##  python benchmarks/bench_logging.py
+###################################################################################################################
+import os                                   ## devnull
+import time                                 ## perf_counter()
+
+import _plugin
+
+logModule = _plugin.load("log")
+
+MESSAGES = 200000
+REQUEST_NAMES = {0: "EffectTest", 1: "EffectStart", 2: "EffectStop", 253: "GameUpdate", 255: "KeepAlive"}
+
+
+
+def make_traffic(count):
+    messages = []
+    for i in range(count):
+        if i % 10 == 0:
+            message = {"id": i, "type": 1, "code": "spin_normal", "viewer": "someone", "cost": 100}
+        elif i % 3 == 0:
+            message = {"id": i, "type": 255}
+        else:
+            message = {"id": i, "type": 253}
+        messages.append(message)
+    return messages
+
+
+
+def run(messages, makeHandler):
+    devnull = open(os.devnull, "w")
+    handler = makeHandler(lambda text: devnull.write(text + "\n"))
+    start = time.perf_counter()
+    for message in messages:
+        handler(message)
+    elapsed = time.perf_counter() - start
+    devnull.close()
+    return len(messages) / elapsed, elapsed / len(messages) * 1e6
+
+
+
+def eager(sink):                                    ## What handle_request did before log.py
+    def handler(dataJSON):
+        sink("\nReceived:")
+        sink(str(dataJSON))
+        sink("id\t-\t" + str(dataJSON.get('id')))
+        sink("type\t-\t" + str(dataJSON['type']))
+        sink("type\t-\t" + REQUEST_NAMES.get(dataJSON['type'], "Unknown"))
+    return handler
+
+
+
+def leveled(config):
+    def make(sink):
+        log = logModule.Logger(sink=sink)
+        log.configure(config)
+
+        def handler(dataJSON):                      ## Same shape as TestEffects.handle_request
+            requestType = dataJSON['type']
+            if log.enabled(logModule.DEBUG):
+                typeName = REQUEST_NAMES.get(requestType, "Unknown")
+                log.debug("Received %s (%s) id %s: %s", typeName,
+                          requestType, dataJSON.get('id'), dataJSON, key=typeName)
+        return handler
+    return make
+
+
+
+def main():
+    messages = make_traffic(MESSAGES)
+    limits = dict((name, 1.0) for name in REQUEST_NAMES.values())
+    cases = [
+        ("eager (old)", eager),
+        ("off", leveled({"level": "off"})),
+        ("warning", leveled({"level": "warning"})),
+        ("warning + ring", leveled({"level": "warning", "ring": 500})),
+        ("debug, limited", leveled({"level": "debug", "limits": limits})),
+        ("debug", leveled({"level": "debug"})),
+    ]
+    print("%-16s %14s %12s" % ("logging", "msgs/s", "us/msg"))
+    for name, makeHandler in cases:
+        rate, cost = run(messages, makeHandler)
+        print("%-16s %14.0f %12.3f" % (name, rate, cost))
+
+
+
+if __name__ == "__main__":
+    main()
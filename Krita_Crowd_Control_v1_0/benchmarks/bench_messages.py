@@ -0,0 +1,156 @@
+###################################################################################################################
+    ## bench_messages.py ##
+
+
+    ## Message decode and reply encode throughput, old dict path vs messages.py with each JSON backend
+    ##
+    ##  "dict" is the old code: decode to str, json.loads, read ['type'] and ['id'], json.dumps a reply dict.
+    ##  "json" and "orjson" are decode_request() straight from bytes and the reply templates/EffectResponse.
+    ##      orjson is only measured when it is installed.
+    ##
+    ##  Corpora are the raw null terminated stream Crowd Control sends. Built in ones:
+    ##      idle      - GameUpdate polls and KeepAlives only
+    ##      redeems   - a busy stream, half EffectStarts with viewers and parameters
+    ##      malformed - redeems with one in ten messages broken
+    ##  Pass files to use recorded streams instead:
+    ##
+    ##  python benchmarks/bench_messages.py [recorded.bin ...]
+###################################################################################################################
+import json                                 ## the old path, and building the corpora
+import os                                   ## file names
+import random                               ## corpus contents
+import sys                                  ## argv
+import time                                 ## perf_counter()
+
+import _plugin
+
+messages = _plugin.load("messages")
+protocol = _plugin.load("protocol")
+
+MESSAGES = 50000                            ## Per built in corpus
+EFFECT_START = protocol.RequestTypes.EffectStart.value
+GAME_UPDATE = protocol.RequestTypes.GameUpdate.value
+KEEP_ALIVE = protocol.RequestTypes.KeepAlive.value
+SUCCESS = protocol.EffectStatus.Success.value
+
+
+
+###################################################################################################################
+    ## Corpora ##
+###################################################################################################################
+def poll(rng, i):
+    return {"id": i, "type": rng.choice((GAME_UPDATE, KEEP_ALIVE))}
+
+
+
+def redeem(rng, i):
+    return {
+        "id": i, "type": EFFECT_START, "code": rng.choice(("spin_canvas", "nudge_canvas_cw", "rainbow_paint")),
+        "viewer": "viewer_%d" % rng.randint(0, 999), "cost": rng.choice((50, 100, 250)),
+        "duration": rng.choice((0, 10000, 15000)), "parameters": [], "sourceDetails": {"type": "TwitchChannelPoints"}
+    }
+
+
+
+def build(kind, count, rng):
+    frames = []
+    for i in range(1, count + 1):
+        if kind == "idle" or rng.random() < 0.5:
+            frame = json.dumps(poll(rng, i)).encode("utf-8")
+        else:
+            frame = json.dumps(redeem(rng, i)).encode("utf-8")
+        if kind == "malformed" and i % 10 == 0:
+            frame = rng.choice((frame[:len(frame) // 2], b'{"id": 1}', b'[1, 2]', frame.replace(b'"code"', b'"cod"')))
+        frames.append(frame + b"\x00")
+    return b"".join(frames)
+
+
+
+def split(stream):                          ## Raw stream -> frames, like the FrameDecoder hands them over
+    return [frame for frame in stream.split(b"\x00") if frame]
+
+
+
+###################################################################################################################
+    ## The two paths ##
+###################################################################################################################
+def old_path(frames):
+    replies = 0
+    for frame in frames:
+        try:
+            request = json.loads(frame.decode("utf-8"))
+            requestType = request['type']
+            if requestType == GAME_UPDATE:
+                reply = {"id": request.get('id', 0), "type": 0xFD, "state": 1}
+            elif requestType == KEEP_ALIVE:
+                reply = {"id": request.get('id', 0), "type": 0xFF}
+            else:
+                reply = {"id": request['id'], "type": 0, "status": SUCCESS,
+                         "timeRemaining": request['duration'], "code": request['code']}
+            json.dumps(reply).encode("utf-8") + b"\x00"
+            replies += 1
+        except (ValueError, KeyError, TypeError):
+            pass
+    return replies
+
+
+
+def new_path(frames):
+    decode = messages.decode_request
+    MessageError = messages.MessageError
+    gameUpdate = messages.game_update_reply
+    keepAlive = messages.keep_alive_reply
+    EffectResponse = messages.EffectResponse
+    replies = 0
+    for frame in frames:
+        try:
+            request = decode(frame)
+        except MessageError:
+            continue
+        requestType = request.type
+        if requestType == GAME_UPDATE:
+            gameUpdate(request)
+        elif requestType == KEEP_ALIVE:
+            keepAlive(request)
+        else:
+            EffectResponse(request.id, SUCCESS, request.duration).encode()
+        replies += 1
+    return replies
+
+
+
+def measure(path, frames, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        replies = path(frames)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(frames) / best, replies
+
+
+
+def main():
+    rng = random.Random(1)
+    if len(sys.argv) > 1:
+        corpora = [(os.path.basename(name), open(name, "rb").read()) for name in sys.argv[1:]]
+    else:
+        corpora = [(kind, build(kind, MESSAGES, rng)) for kind in ("idle", "redeems", "malformed")]
+
+    backends = sorted(messages.BACKENDS)
+    print("%-12s %8s %12s" % ("corpus", "msgs", "dict msgs/s") + "".join(" %12s" % (name + " msgs/s") for name in backends))
+    for name, stream in corpora:
+        frames = split(stream)
+        oldRate, oldReplies = measure(old_path, frames)
+        line = "%-12s %8d %12.0f" % (name, len(frames), oldRate)
+        for backend in backends:
+            messages.set_backend(backend)
+            rate, replies = measure(new_path, frames)
+            line += " %12.0f" % rate
+        print(line + "   (%d answered, %d rejected)" % (replies, len(frames) - replies))
+    messages.set_backend("orjson" if "orjson" in messages.BACKENDS else "json")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+###################################################################################################################
+    ## bench_outbound.py ##
+
+
+    ## Outgoing traffic to a loopback sink: one send() per message (the old socket_send) vs. NetworkEngine with
+    ##      its OutboundWriter, which batches a loop turn's messages into one send() and merges waiting
+    ##      GameUpdate replies
+    ##
+    ##  Traffic is bursts of GameUpdate replies and effect responses, like a Crowd Control poll during a
+    ##      redeem burst. Reports bytes per send() syscall, p50/p99 latency from queueing a message to the
+    ##      kernel taking it, and how many messages the sink received.
+    ##
+    ##  python benchmarks/bench_outbound.py
+###################################################################################################################
+import json                                 ## messages
+import socket                               ## the sink
+import threading                            ## sink thread
+import time                                 ## perf_counter()
+
+import _plugin
+
+network = _plugin.load("network")
+framer = _plugin.load("framer")
+
+BURSTS = 2000                               ## Bursts per case
+PER_BURST = 20                              ## Messages per burst, every 4th one a GameUpdate reply
+
+
+
+class Sink:                                 ## Reads and counts frames until the connection closes
+    def __init__(self):
+        self.listener = socket.socket()
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(1)
+        self.port = self.listener.getsockname()[1]
+        self.frames = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        client, address = self.listener.accept()
+        decoder = framer.FrameDecoder()
+        while True:
+            data = client.recv(65536)
+            if not data:
+                break
+            self.frames += len(decoder.feed(data))
+        client.close()
+        self.listener.close()
+
+
+
+def messages(burst):
+    for i in range(PER_BURST):
+        if i % 4 == 0:
+            yield (json.dumps({"id": burst * PER_BURST + i, "type": 253, "state": 1}).encode() + b"\x00",
+                   "game_update")
+        else:
+            yield (json.dumps({"id": burst * PER_BURST + i, "type": 0, "status": 0}).encode() + b"\x00", None)
+
+
+
+def percentiles(values):
+    values = sorted(values)
+    last = len(values) - 1
+    return values[int(0.5 * last)] * 1000, values[int(0.99 * last)] * 1000
+
+
+
+def run_unbatched():
+    sink = Sink()
+    sock = socket.create_connection(("127.0.0.1", sink.port))
+    latencies = []
+    calls = 0
+    sent = 0
+    for burst in range(BURSTS):
+        for frame, key in messages(burst):
+            start = time.perf_counter()
+            sent += sock.send(frame)
+            calls += 1
+            latencies.append(time.perf_counter() - start)
+    sock.close()
+    sink.thread.join()
+    return sent / float(calls), percentiles(latencies), sink.frames, calls
+
+
+
+def run_batched():
+    sink = Sink()
+    connected = threading.Event()
+    engine = network.NetworkEngine(onConnected=connected.set)
+    engine.start()
+    engine.connect("127.0.0.1", sink.port)
+    connected.wait(5)
+    for burst in range(BURSTS):
+        for frame, key in messages(burst):
+            engine.send(frame, key)
+        time.sleep(0)                                       ## Let the network thread have a turn
+    while engine.writer:
+        time.sleep(0.01)
+    writer = engine.writer
+    latencies = percentiles(list(writer.latencies))
+    engine.stop()
+    sink.thread.join()
+    return writer.bytes_per_call(), latencies, sink.frames, writer.sendCalls
+
+
+
+def main():
+    print("%-10s %14s %10s %10s %12s %10s" % ("path", "bytes/syscall", "p50 ms", "p99 ms", "msgs recvd", "syscalls"))
+    for name, run in (("unbatched", run_unbatched), ("batched", run_batched)):
+        perCall, (p50, p99), frames, calls = run()
+        print("%-10s %14.0f %10.3f %10.3f %12d %10d" % (name, perCall, p50, p99, frames, calls))
+    print("(%d messages queued per case, batched merges waiting GameUpdate replies)" % (BURSTS * PER_BURST))
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+###################################################################################################################
+    ## bench_presets.py ##
+
+
+    ## Brush preset lookup cost as the number of installed presets grows
+    ##
+    ##  "walk" is the old rainbow_paint code: ask Krita for every preset, then loop over them to find ours.
+    ##  "index" is PresetIndex, loaded once and then a dict lookup.
+    ##  The fake loader builds its dict every call, like Krita does when it wraps every resource for Python.
+    ##
+    ##  python benchmarks/bench_presets.py
+###################################################################################################################
+import time                                 ## perf_counter()
+
+import _plugin
+
+presets = _plugin.load("presets")
+
+LOOKUPS = 2000
+
+
+
+def make_loader(count):
+    names = ["bundle) Preset %05d" % i for i in range(count)] + ["rainbow01"]
+
+    def loader():
+        return dict((name, object()) for name in names)
+    return loader
+
+
+
+def walk(loader):
+    allPresets = loader()
+    for preset in allPresets:
+        if preset == "rainbow01":
+            return allPresets[preset]
+    return None
+
+
+
+def time_per_call(function, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+
+def main():
+    print("%-10s %15s %15s" % ("presets", "walk us/redeem", "index us/redeem"))
+    for count in (100, 1000, 10000):
+        loader = make_loader(count)
+        index = presets.PresetIndex(loader, aliases={"rainbow": "rainbow01"})
+        walkTime = time_per_call(lambda: walk(loader), max(20, LOOKUPS // (count // 100)))
+        indexTime = time_per_call(lambda: index.get("rainbow"), LOOKUPS)
+        print("%-10d %15.1f %15.2f" % (count, walkTime, indexTime))
+
+
+
+if __name__ == "__main__":
+    main()
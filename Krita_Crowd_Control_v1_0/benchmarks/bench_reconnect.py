@@ -0,0 +1,109 @@
+###################################################################################################################
+    ## bench_reconnect.py ##
+
+
+    ## Runs ConnectionManager against the fake Crowd Control server while the server keeps dropping the link
+    ##
+    ##  Checks that every effect request gets exactly one answer across the drops, and reports how long it
+    ##      takes to get the link back once the server is listening again
+    ##
+    ##  python benchmarks/bench_reconnect.py [--cycles 5] [--up 1.0] [--down 0.5]
+###################################################################################################################
+import argparse                             ## command line
+import json                                 ## messages
+import random                               ## effect run times
+import threading                            ## Timer, to answer effects later like timed effects do
+import time                                 ## monotonic()
+
+import _plugin
+from fake_crowd_control import FakeCrowdControl
+
+connection = _plugin.load("connection")
+
+
+
+## Stand-in for the plugin: answers every EffectStart after a short random "effect" time
+class Client:
+    def __init__(self, port):
+        self.started = 0                            ## Effects actually run
+        self.ignored = 0                            ## Repeats that begin() turned away
+        self.manager = connection.ConnectionManager(
+            "127.0.0.1", port,
+            onFrames=self.on_frames,
+            connectTimeout=1.0,
+            livenessTimeout=2.0,
+            backoff=connection.Backoff(base=0.05, maximum=0.5)
+        )
+
+    def on_frames(self, frames):
+        for frame in frames:
+            message = json.loads(frame.decode("utf-8"))
+            if message["type"] == 0x01:
+                if not self.manager.begin(message["id"]):
+                    self.ignored += 1
+                    continue
+                self.started += 1
+                threading.Timer(random.uniform(0.0, 0.3), self.finish, (message["id"],)).start()
+            elif message["type"] == 0xFD:
+                self.manager.send(json.dumps({"id": message["id"], "type": 0xFD, "state": 1}).encode() + b"\x00")
+
+    def finish(self, effectId):
+        reply = json.dumps({"id": effectId, "type": 0x00, "status": 0x00}).encode("utf-8") + b"\x00"
+        self.manager.respond(effectId, reply)
+
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--up", type=float, default=1.0)
+    parser.add_argument("--down", type=float, default=0.5)
+    parser.add_argument("--rate", type=float, default=50.0, help="effect requests per second")
+    args = parser.parse_args()
+
+    server = FakeCrowdControl(pollInterval=0.1, keepAliveInterval=0.5,
+                              schedule=[(args.up, args.down)] * args.cycles).start()
+    client = Client(server.port)
+    client.manager.start()
+
+    end = time.monotonic() + args.cycles * (args.up + args.down) + args.up
+    requested = 0
+    while time.monotonic() < end:
+        server.request_effect("nudge_canvas_cw")
+        requested += 1
+        time.sleep(1.0 / args.rate)
+
+    deadline = time.monotonic() + 5.0                       ## Let the last answers arrive
+    while server.unanswered() and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    reconnectTimes = []
+    for restored in server.restoredAt:
+        after = [connected for connected in server.connectedAt if connected >= restored]
+        if after:
+            reconnectTimes.append((after[0] - restored) * 1000)
+
+    client.manager.stop()
+    server.stop()
+
+    print("requested          %d" % requested)
+    print("effects run        %d" % client.started)
+    print("repeats ignored    %d" % client.ignored)
+    print("unanswered         %d" % len(server.unanswered()))
+    print("duplicate answers  %d" % len(server.duplicated()))
+    print("connections        %d (%d manager reconnects)" % (server.connections, client.manager.reconnects))
+    print("reconnect ms       p50 %.1f  max %.1f" % (percentile(reconnectTimes, 0.5),
+                                                     max(reconnectTimes or [float("nan")])))
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+###################################################################################################################
+    ## bench_replay.py ##
+
+
+    ## Records a session, then plays it back through the plugin (capture.py)
+    ##
+    ##  record   - the plugin on the headless stand-in, with captureFile set, against the fake connector sending
+    ##              polls, KeepAlives and a mix of effects at --rate for --seconds. Skipped with --capture
+    ##  file     - what the capture holds, and what writing and reading (mmap) a record costs
+    ##  replay   - the capture fed back through the framer, ConnectionManager, dispatcher and effects, on a new
+    ##              plugin. At the recorded pace (--speed, 1.0 is real time), then as fast as it goes.
+    ##              Every effect id must get the same answers, in the same order, as in the capture, that's
+    ##              the regression check. Poll replies are only counted, they're merged when they pile up
+    ##
+    ##  python benchmarks/bench_replay.py [--rate 200] [--seconds 3] [--speed 1.0] [--capture FILE] [--keep]
+###################################################################################################################
+import argparse                             ## command line
+import functools                            ## partial() for the engine type
+import json                                 ## reading the replies
+import os                                   ## temporary file
+import sys                                  ## exit status
+import tempfile                             ## where the capture goes
+import time                                 ## perf_counter()
+
+import _plugin
+from fake_krita import FakeHost
+
+bridge = _plugin.load("bridge")
+capture = _plugin.load("capture")
+framer = _plugin.load("framer")
+settings = _plugin.load("settings")
+metrics = _plugin.load("metrics").metrics
+
+CODES = ("nudge_canvas_cw", "horizontal_flip", "color_red", "brush_pencil", "nudge_canvas_ccw",
+         "rainbow_paint", "vertical_flip", "color_blue", "not_in_this_plugin")
+EFFECT_RESPONSE = 0                         ## ResponseTypes.EffectRequest
+
+
+
+def plugin_idle(plugin):
+    return not len(plugin.dispatcher.queue) and not plugin.engine.active and not plugin.engine.queued()
+
+
+
+def record(path, rate, seconds):
+    host = FakeHost(settings={(settings.SETTINGS_GROUP, "captureFile"): path})
+    with _plugin.connected(host) as (server, plugin):
+        count = max(len(CODES), int(rate * seconds))
+        server.replay(CODES, rate, count)
+        host.run(until=lambda: len(server.replyTimes) >= count and not server.unanswered(),
+                 timeout=seconds * 3 + 5.0)
+        host.run(timeout=0.5)                       ## A couple more polls at the end
+    print("record  %d effects at %.0f/s, %d answered" % (count, rate, len(server.replyTimes)))
+
+
+
+def bench_file(path):
+    with capture.CaptureReader(path) as reader:
+        kinds = {}
+        payload = 0
+        start = time.perf_counter()
+        for seconds, kind, data in reader.records():
+            kinds[kind] = kinds.get(kind, 0) + 1
+            payload += len(data)
+        readTime = time.perf_counter() - start
+        truncated = reader.truncated
+        del data
+    records = sum(kinds.values())
+    size = os.path.getsize(path)
+    print("file    %d records, %d bytes (%.1f%% headers)%s" % (records, size, 100.0 * (size - payload) / size,
+                                                                 ", last one truncated" if truncated else ""))
+    print("        %s" % ", ".join("%s %d" % (capture.KIND_NAMES.get(kind, kind), count)
+                                    for kind, count in sorted(kinds.items())))
+    print("        read (mmap)       %.2f us/record" % (readTime / records * 1e6))
+
+    chunk = b'{"id":1,"type":1,"code":"nudge_canvas_cw","viewer":"viewer","parameters":[]}\x00'
+    scratch = path + ".write"
+    writer = capture.CaptureWriter(scratch)
+    count = 200000
+    start = time.perf_counter()
+    for _ in range(count):
+        writer.record(capture.INBOUND, chunk)
+    writer.close()
+    writeTime = time.perf_counter() - start
+    os.remove(scratch)
+    print("        write             %.2f us/record" % (writeTime / count * 1e6))
+
+
+
+## id -> list of effect response statuses, and how many other replies, from a list of sent chunks
+def replies(chunks):
+    decoder = framer.FrameDecoder()
+    answers = {}
+    others = 0
+    for chunk in chunks:
+        for frame in decoder.feed(chunk):
+            reply = json.loads(bytes(frame))
+            if reply.get("type") == EFFECT_RESPONSE and reply.get("id"):
+                answers.setdefault(reply["id"], []).append(reply.get("status"))
+            else:
+                others += 1
+    return answers, others
+
+
+
+def replay(records, speed, expected):
+    metrics.reset()
+    host = FakeHost()
+    engineType = functools.partial(capture.ReplayEngine, records, speed,
+                                   ready=lambda: not len(plugin.dispatcher.queue))
+    plugin = bridge.Bridge(host, ("127.0.0.1", 1), engineType=engineType)
+    plugin.start()
+    engine = plugin.connection.engine
+    try:
+        recorded = max([seconds for seconds, kind, data in records] or [0.0])
+        timeout = (recorded / speed if speed else 0.0) + 10.0
+        host.run(until=lambda: engine.finished() and plugin_idle(plugin) and not engine.writer, timeout=timeout)
+        playTime = time.monotonic() - engine.startedAt      ## Until the last effect ran
+        host.run(timeout=0.05)                      ## The last replies, through the network thread
+    finally:
+        plugin.stop()
+
+    answers, others = replies(engine.output)
+    frames = plugin.dispatcher.received
+    different = [effectId for effectId in expected if answers.get(effectId) != expected[effectId]]
+    extra = [effectId for effectId in answers if effectId not in expected]
+    print("replay  %s" % ("as fast as possible" if speed is None else "at %.1fx the recorded pace" % speed))
+    print("        %d chunks, %d messages in %.3f s, %.0f messages/s" % (engine.fed, frames, playTime,
+                                                                           frames / playTime if playTime else 0))
+    print("        effect ids        %d answered, %d expected" % (len(answers), len(expected)))
+    print("        other replies     %d" % others)
+    print("        different answers %d%s" % (len(different) + len(extra),
+                                              "" if not different else ", e.g. id %d: %s, recorded %s" % (
+                                                  different[0], answers.get(different[0]),
+                                                  expected[different[0]])))
+    return not different and not extra
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=200.0, help="effects per second while recording")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--speed", type=float, default=1.0, help="pace of the first replay, 1.0 is real time")
+    parser.add_argument("--capture", help="replay this capture instead of recording one")
+    parser.add_argument("--keep", action="store_true", help="don't delete the recorded capture")
+    args = parser.parse_args()
+
+    path = args.capture
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="crowd_control_"), "session.cccapture")
+        record(path, args.rate, args.seconds)
+    print("        %s" % path)
+    print("")
+    bench_file(path)
+
+    records = capture.load(path)
+    expected, others = replies(data for seconds, kind, data in records if kind == capture.OUTBOUND)
+    same = True
+    for speed in (args.speed, None):
+        print("")
+        same = replay(records, speed, expected) and same
+
+    if args.capture is None and not args.keep:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+    sys.exit(0 if same else 1)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+###################################################################################################################
+    ## bench_response_cache.py ##
+
+
+    ## Re-sent EffectStarts against the response cache (response_cache.py)
+    ##
+    ##  cache   - claim() and store() cost per id, and memory, for a stream of new ids much longer than the
+    ##              cache. Size and memory stay flat once it's full
+    ##  retries - the whole plugin on the headless stand-in, against a fake connector that re-sends every
+    ##              request not answered within --resend ms. Each canvas repaint costs --repaint ms on the
+    ##              GUI thread, longer than --resend, so answers are late and requests are re-sent while
+    ##              they're queued or running. Every effect should run once and be answered once, and the
+    ##              cache must have been hit. Exits with status 1 when it wasn't
+    ##
+    ##  python benchmarks/bench_response_cache.py [--ids 1000000] [--capacity 256] [--rate 500] [--seconds 2]
+###################################################################################################################
+import argparse                             ## command line
+import sys                                  ## exit status
+import time                                 ## perf_counter()
+import tracemalloc                          ## memory use of the cache
+
+import _plugin
+from fake_krita import FakeHost, FakeKrita
+
+metrics = _plugin.load("metrics").metrics
+response_cache = _plugin.load("response_cache")
+
+
+
+def bench_cache(ids, capacity):
+    response = b'{"id":1,"status":0,"type":0}\x00'
+    tracemalloc.start()                             ## Memory first, tracemalloc slows everything down
+    cache = response_cache.ResponseCache(capacity)
+    full = None
+    for effectId in range(ids // 10):
+        cache.claim(effectId)
+        cache.store(effectId, response)
+        if effectId == capacity * 4:
+            full = tracemalloc.get_traced_memory()[0]
+    end = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    cache = response_cache.ResponseCache(capacity)
+    start = time.perf_counter()
+    for effectId in range(ids):
+        cache.claim(effectId)
+        cache.store(effectId, response)
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    repeats = min(ids, capacity)
+    for effectId in range(ids - repeats, ids):      ## All still remembered
+        cache.claim(effectId)
+    repeatTime = time.perf_counter() - start
+
+    print("cache   %d ids, capacity %d" % (ids, capacity))
+    print("        claim + store     %.2f us/id" % (elapsed / ids * 1e6))
+    print("        repeat claim      %.2f us/id" % (repeatTime / repeats * 1e6))
+    print("        remembered        %d" % len(cache))
+    if full is None:                                ## Fewer than capacity * 40 ids never fill it
+        print("        memory            %.1f KiB at the end, never full" % (end / 1024.0))
+    else:
+        print("        memory            %.1f KiB when full, %.1f KiB at the end" % (full / 1024.0, end / 1024.0))
+
+
+
+def bench_retries(rate, seconds, resend, repaint):
+    metrics.reset()
+    krita = FakeKrita(windows=0)
+    window = krita.open_window(repaintCost=repaint / 1000.0)
+    host = FakeHost(krita)
+    with _plugin.connected(host, resendAfter=resend / 1000.0) as (server, plugin):
+        count = max(50, int(rate * seconds))
+        server.replay(("nudge_canvas_cw",), rate, count)
+        host.run(until=lambda: len(server.replyTimes) >= count and not server.unanswered(),
+                 timeout=seconds * 3 + 5.0)
+        host.run(timeout=0.2)                       ## Let late repeats arrive
+        latencies = sorted(latency * 1000 for latency in server.latencies())
+        snapshot = metrics.snapshot()
+
+    print("retries %d requests at %.0f/s, re-sent after %.1f ms, %.1f ms per repaint" % (count, rate, resend,
+                                                                                        repaint))
+    print("        re-sent by the connector  %d" % server.resent)
+    print("        dropped as repeats        %d" % plugin.dispatcher.repeats)
+    effectsRun = window.activeView().canvas().calls // 2
+    print("        effects run               %d" % effectsRun)
+    print("        answered                  %d, %d unanswered" % (len(latencies), len(server.unanswered())))
+    print("        answered twice            %d" % len(server.duplicated()))
+    print("        cache hits                running %s, answered %s" % (
+        snapshot.get('response_cache_hits_total{state="running"}'),
+        snapshot.get('response_cache_hits_total{state="answered"}')))
+    if latencies:
+        print("        latency ms                p50 %.2f  max %.2f" % (latencies[len(latencies) // 2], latencies[-1]))
+    hits = (snapshot.get('response_cache_hits_total{state="running"}') or 0) + \
+        (snapshot.get('response_cache_hits_total{state="answered"}') or 0)
+    if not hits:
+        print("NOT TESTED: nothing was re-sent, --resend has to be shorter than the answers take")
+    elif effectsRun != count:
+        print("FAILED: %d effects run for %d requests" % (effectsRun, count))
+    return bool(hits) and effectsRun == count
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ids", type=int, default=1000000)
+    parser.add_argument("--capacity", type=int, default=256)
+    parser.add_argument("--rate", type=float, default=500.0)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--resend", type=float, default=0.5, help="ms the connector waits before re-sending")
+    parser.add_argument("--repaint", type=float, default=2.0, help="ms of GUI work per canvas repaint")
+    args = parser.parse_args()
+
+    bench_cache(args.ids, args.capacity)
+    print("")
+    sys.exit(0 if bench_retries(args.rate, args.seconds, args.resend, args.repaint) else 1)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+###################################################################################################################
+    ## bench_scheduler.py ##
+
+
+    ## Drives AnimationScheduler with a jittery fake frame clock, the way a busy GUI thread would
+    ##
+    ##  Shows that spins end exactly on their curve's final angle at their duration however late the ticks
+    ##      are, that any number of running spins cost one canvas update per frame, and what the
+    ##      frame time percentiles look like
+    ##
+    ##  python benchmarks/bench_scheduler.py
+###################################################################################################################
+import random                               ## jitter
+
+import _plugin
+
+scheduler = _plugin.load("scheduler")
+canvas = _plugin.load("effects.canvas")
+
+
+
+class FakeTimer:                            ## Stands in for the QTimer, the benchmark ticks by hand
+    def start(self, milliseconds):
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+
+def run(spins, jitter, rng):
+    clock = FakeClock()
+    timer = FakeTimer()
+    state = {"rotation": 0.0, "applies": 0}
+
+    def apply(batch):
+        state["rotation"] += batch.rotation
+        state["applies"] += 1
+
+    animations = scheduler.AnimationScheduler(timer, apply, clock=clock)
+    for i in range(spins):
+        curve = canvas.spin_normal_curve if i % 2 == 0 else canvas.spin_slow_chaotic_curve
+        animations.add(curve, 10.0)
+    expected = sum(canvas.spin_normal_curve(1.0) if i % 2 == 0 else canvas.spin_slow_chaotic_curve(1.0)
+                   for i in range(spins))
+
+    while timer.active:
+        step = scheduler.FRAME_INTERVAL
+        if rng.random() < jitter:                           ## Sometimes the GUI thread is late by a few frames
+            step *= rng.choice((2, 3, 5))
+        clock.now += step * rng.uniform(0.9, 1.1)
+        animations.tick()
+
+    return state, expected, clock.now, animations.stats
+
+
+
+def main():
+    rng = random.Random(1)
+    print("%-6s %-7s %9s %9s %12s %10s %8s %8s %8s" % (
+        "spins", "jitter", "ended s", "frames", "applies/frm", "angle err", "p50 ms", "p99 ms", "dropped"))
+    for spins in (1, 3, 10):
+        for jitter in (0.0, 0.1, 0.3):
+            state, expected, ended, stats = run(spins, jitter, rng)
+            percentiles = stats.percentiles()
+            print("%-6d %-7.1f %9.3f %9d %12.2f %10.2e %8.1f %8.1f %8d" % (
+                spins, jitter, ended, stats.frames, state["applies"] / float(stats.frames),
+                abs(state["rotation"] - expected), percentiles[50], percentiles[99], stats.dropped))
+
+
+
+if __name__ == "__main__":
+    main()
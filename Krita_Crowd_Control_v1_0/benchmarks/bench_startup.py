@@ -0,0 +1,82 @@
+###################################################################################################################
+    ## bench_startup.py ##
+
+
+    ## What the plugin adds to Krita's start up
+    ##
+    ##  Krita runs the plugin's __init__.py while it starts. That imports the extension, the dockers and the
+    ##      settings. The network code, the JSON backend and the effects wait for the first connect.
+    ##  Each phase is imported in a fresh Python, --runs times, and we report the median import time and which
+    ##      standard library modules it pulled in that weren't loaded yet. KRITA_LOADED are imported first, Krita's
+    ##      own Python plugins have them loaded before ours runs (--bare to skip that):
+    ##      start up     - the Krita-free modules __init__.py imports (settings.py and metrics.py, through the
+    ##                      dockers). The Krita side of them only imports PyQt5 modules Krita has loaded already
+    ##      eager        - bridge.py, which __init__.py used to import at start up through effect_functions.py
+    ##      first connect - bridge.py after start up, the cost moved to the first click on "Effects test"
+    ##
+    ##  python benchmarks/bench_startup.py [--runs 15]
+###################################################################################################################
+import argparse                             ## command line
+import os                                   ## paths
+import subprocess                           ## a fresh interpreter per run
+import sys                                  ## this interpreter
+
+import _plugin
+
+KRITA_LOADED = ("os", "re", "collections", "functools", "contextlib", "threading", "enum", "weakref")
+STARTUP = ("settings", "metrics")
+CONNECT = ("bridge",)
+WATCHED = ("socket", "selectors", "json", "orjson", "random", "heapq", "enum", "threading")
+
+CHILD = """
+import sys, time
+sys.path.insert(0, %(tools)r)
+for name in %(preloaded)r:
+    __import__(name)
+import plugin_loader
+for name in %(before)r:
+    plugin_loader.load(name)
+loaded = set(sys.modules)
+start = time.perf_counter()
+for name in %(names)r:
+    plugin_loader.load(name)
+elapsed = time.perf_counter() - start
+new = set(sys.modules) - loaded
+print(repr((elapsed, sorted(new))))
+"""
+
+
+
+def measure(names, before, preloaded, runs):
+    times = []
+    for _ in range(runs):
+        code = CHILD % {"tools": _plugin.TOOLS_DIR, "preloaded": tuple(preloaded), "before": tuple(before),
+                        "names": tuple(names)}
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=os.path.dirname(_plugin.TOOLS_DIR))
+        elapsed, modules = eval(output.decode())
+        times.append(elapsed)
+    times.sort()
+    plugin = [name for name in modules if name.startswith("extension_template.")]
+    watched = [name for name in WATCHED if name in modules]
+    return times[len(times) // 2], len(plugin), len(modules), watched
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--bare", action="store_true", help="don't preload what Krita has loaded already")
+    args = parser.parse_args()
+    preloaded = () if args.bare else KRITA_LOADED
+
+    print("%-14s %10s %15s %12s   %s" % ("phase", "median ms", "plugin modules", "all modules", "of note"))
+    for phase, names, before in (("start up", STARTUP, ()),
+                                 ("eager", STARTUP + CONNECT, ()),
+                                 ("first connect", CONNECT, STARTUP)):
+        median, plugin, modules, watched = measure(names, before, preloaded, args.runs)
+        print("%-14s %10.2f %15d %12d   %s" % (phase, median * 1000, plugin, modules, " ".join(watched) or "-"))
+
+
+
+if __name__ == "__main__":
+    main()
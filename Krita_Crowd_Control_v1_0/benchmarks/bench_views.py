@@ -0,0 +1,107 @@
+###################################################################################################################
+    ## bench_views.py ##
+
+
+    ## Cost of one animation frame as the number of targeted views grows
+    ##
+    ##  Views are spread over windows of 4 views, all on one document, on the headless stand-in
+    ##      (tools/fake_krita.py), with --repaint ms of busy work per canvas repaint, and --chrome ms more for
+    ##      the dockers and toolbars when a whole window repaints. Every frame ends with the paint Qt does at
+    ##      the end of an event loop turn, each changed canvas once. For each count:
+    ##      per view - walk Krita.instance().views() and set each canvas' rotation, the way a handler written
+    ##                 against one view would be looped
+    ##      held     - the targets held with updates_suppressed() around the pass, so every window with more
+    ##                 than one of them repaints whole, chrome included
+    ##      batched  - Bridge.apply_frame, what the plugin runs: cached targets, one pass, nothing held
+    ##
+    ##  python benchmarks/bench_views.py [--views 1 2 4 8 16] [--frames 500] [--repaint 0.2] [--chrome 1.0]
+###################################################################################################################
+import argparse                             ## command line
+import time                                 ## perf_counter()
+
+import _plugin
+from fake_krita import FakeHost, FakeKrita
+
+bridge = _plugin.load("bridge")
+host = _plugin.load("host")
+scheduler = _plugin.load("scheduler")
+
+VIEWS_PER_WINDOW = 4
+
+
+
+def make_host(views, repaintCost, chromeCost):
+    krita = FakeKrita(windows=0)
+    document = None
+    while views > 0:
+        window = krita.open_window(min(views, VIEWS_PER_WINDOW), document, repaintCost, chromeCost)
+        document = window.activeView().document()
+        views -= VIEWS_PER_WINDOW
+    return FakeHost(krita, {("CrowdControl", "targetMode"): host.TARGET_DOCUMENT})
+
+
+
+def full_repaints(krita):
+    return sum(window.fullRepaints for window in krita.windows())
+
+
+
+def per_view(fake, frames):
+    krita = fake.krita
+    start = time.perf_counter()
+    for _ in range(frames):
+        document = krita.activeWindow().activeView().document()
+        for view in krita.views():
+            if view.document() == document:
+                canvas = view.canvas()
+                canvas.setRotation(canvas.rotation() + 1.0)
+        krita.paint()
+    return time.perf_counter() - start
+
+
+
+def held(fake, frames):
+    plugin = bridge.Bridge(fake)
+    start = time.perf_counter()
+    for _ in range(frames):
+        plugin.each_canvas(lambda canvas: canvas.setRotation(canvas.rotation() + 1.0), held=True)
+        fake.krita.paint()
+    return time.perf_counter() - start
+
+
+
+def batched(fake, frames):
+    plugin = bridge.Bridge(fake)
+    batch = scheduler.FrameBatch()
+    batch.rotation = 1.0
+    start = time.perf_counter()
+    for _ in range(frames):
+        plugin.apply_frame(batch)
+        fake.krita.paint()
+    return time.perf_counter() - start
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--views", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--repaint", type=float, default=0.2, help="ms of work per canvas repaint")
+    parser.add_argument("--chrome", type=float, default=1.0, help="ms more when a whole window repaints")
+    args = parser.parse_args()
+
+    print("%6s %8s %26s %26s %26s" % ("views", "windows", "per view us/fr  full/fr", "held us/fr  full/fr",
+                                      "batched us/fr  full/fr"))
+    for views in args.views:
+        results = []
+        for run in (per_view, held, batched):
+            fake = make_host(views, args.repaint / 1000.0, args.chrome / 1000.0)
+            elapsed = run(fake, args.frames)
+            results.append("%17.1f %8.1f" % (elapsed / args.frames * 1e6,
+                                            full_repaints(fake.krita) / float(args.frames)))
+        print("%6d %8d %s" % (views, len(fake.krita.windows()), " ".join(results)))
+
+
+
+if __name__ == "__main__":
+    main()
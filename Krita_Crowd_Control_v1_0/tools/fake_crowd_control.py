@@ -0,0 +1,348 @@
+###################################################################################################################
+    ## fake_crowd_control.py ##
+
+
+    ## A local stand-in for the Crowd Control SimpleTCP connector
+    ##
+    ##  Crowd Control is the server and Krita connects to it, so this listens on a port and talks to whoever
+    ##      connects the way the real connector does: GameUpdate polls, KeepAlives and EffectStart requests,
+    ##      all as null terminated JSON.
+    ##  It can drop the link and bring it back on a schedule, to check how the plugin copes with a connector
+    ##      restart. While the link is down the port is closed too, so connects are refused like the real thing.
+    ##  Unanswered effect requests are sent again after a reconnect, like the connector's retries. With
+    ##      resendAfter they're also sent again on the same connection when no answer came in that many seconds.
+    ##  replay() sends a stream of redeems at a fixed rate, and every request and first reply is timestamped,
+    ##      so the benchmarks can measure redeem to response latency.
+    ##
+    ##  Run it on its own to try the plugin in Krita without Crowd Control:
+    ##      python tools/fake_crowd_control.py --port 2323 --effect spin_canvas --every 5
+###################################################################################################################
+import argparse                             ## command line
+import itertools                            ## effect ids
+import json                                 ## messages
+import selectors                            ## wait on the listener and the client
+import socket                               ## the server
+import threading                            ## runs in the background
+import time                                 ## monotonic()
+
+GAME_UPDATE = 0xFD                          ## RequestTypes.GameUpdate
+KEEP_ALIVE = 0xFF                           ## RequestTypes.KeepAlive
+EFFECT_START = 0x01                         ## RequestTypes.EffectStart
+
+
+
+class FakeCrowdControl:
+    ## schedule is a list of (upSeconds, downSeconds). After the last entry the link stays up
+    def __init__(self, host="127.0.0.1", port=0, pollInterval=1.0, keepAliveInterval=5.0, schedule=None,
+                 resendAfter=None):
+        self.host = host
+        self.port = port                            ## 0 picks a free port, read it back after start()
+        self.pollInterval = pollInterval
+        self.keepAliveInterval = keepAliveInterval
+        self.schedule = list(schedule or [])
+        self.resendAfter = resendAfter              ## Seconds, or None to only re-send after a reconnect
+
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.outgoing = []                          ## Frames to send once a client is connected
+        self.requests = {}                          ## effect id -> request frame, until answered
+        self.requestTimes = {}                      ## effect id -> monotonic() of the first send
+        self.sentTimes = {}                         ## effect id -> monotonic() of the last send, until answered
+        self.resent = 0                             ## Requests sent again because the answer was late
+        self.replies = {}                           ## effect id -> list of replies (dicts)
+        self.replyTimes = {}                        ## effect id -> monotonic() of the first reply
+        self.otherReplies = 0                       ## GameUpdate replies and such
+
+        self.connections = 0                        ## How many times a client connected
+        self.restoredAt = []                        ## monotonic() of every time the link came back up
+        self.connectedAt = []                       ## monotonic() of every accepted connection
+
+        self.listener = None
+        self.client = None
+        self.buffer = bytearray()
+        self.running = False
+        self.thread = None
+        self.wakeReader, self.wakeWriter = socket.socketpair()     ## So a request goes out right away
+        self.wakeReader.setblocking(False)
+        self.wakeWriter.setblocking(False)
+
+
+
+###################################################################################################################
+    ## Control, from any thread ##
+###################################################################################################################
+    def start(self):
+        self._listen()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="FakeCrowdControl", daemon=True)
+        self.thread.start()
+        return self
+
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(5.0)
+        self._drop_client()
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+        self.wakeReader.close()
+        self.wakeWriter.close()
+
+
+    ## Queue an EffectStart request and return its id
+    def request_effect(self, code, duration=None, viewer="viewer"):
+        with self.lock:
+            effectId = next(self.ids)
+            message = {"id": effectId, "code": code, "viewer": viewer, "type": EFFECT_START, "parameters": []}
+            if duration is not None:
+                message["duration"] = duration
+            frame = json.dumps(message).encode("utf-8") + b"\x00"
+            self.requests[effectId] = frame
+            self.requestTimes[effectId] = self.sentTimes[effectId] = time.monotonic()
+            self.outgoing.append(frame)
+        self._wake()
+        return effectId
+
+
+    ## Request effects at rate per second, cycling through codes, until count are sent. Runs on its own thread,
+    ##      returns it. Requests are spaced by the clock, not by sleeps adding up, so the rate holds
+    def replay(self, codes, rate, count, duration=None):
+        def run():
+            start = time.monotonic()
+            cycle = itertools.cycle(codes)
+            for i in range(count):
+                delay = start + i / float(rate) - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self.request_effect(next(cycle), duration)
+        thread = threading.Thread(target=run, name="FakeCrowdControlReplay", daemon=True)
+        thread.start()
+        return thread
+
+
+    ## Seconds from each request to its first reply, for the ids that were answered
+    def latencies(self):
+        with self.lock:
+            return [self.replyTimes[effectId] - self.requestTimes[effectId] for effectId in self.replyTimes]
+
+
+    ## First reply status of every answered id
+    def first_statuses(self):
+        with self.lock:
+            return [replies[0].get("status") for replies in self.replies.values()]
+
+
+    ## Ids that were requested but never answered
+    def unanswered(self):
+        with self.lock:
+            return sorted(self.requests)
+
+
+    ## Ids that got more than one reply with the same status
+    def duplicated(self):
+        with self.lock:
+            duplicates = []
+            for effectId, replies in self.replies.items():
+                statuses = [reply.get("status") for reply in replies]
+                if len(statuses) != len(set(statuses)):
+                    duplicates.append(effectId)
+            return sorted(duplicates)
+
+
+
+###################################################################################################################
+    ## The loop ##
+###################################################################################################################
+    def _listen(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self.host, self.port))
+        listener.listen(1)
+        listener.setblocking(False)
+        self.port = listener.getsockname()[1]       ## Keep the same port when the link comes back
+        self.listener = listener
+
+
+    def _run(self):
+        selector = selectors.DefaultSelector()
+        nextPoll = time.monotonic()
+        nextKeepAlive = time.monotonic() + self.keepAliveInterval
+        phaseEnd = None
+        linkUp = True
+        if self.schedule:
+            phaseEnd = time.monotonic() + self.schedule[0][0]
+
+        while self.running:
+            now = time.monotonic()
+
+            if phaseEnd is not None and now >= phaseEnd:    ## Time to drop or restore the link
+                if linkUp:
+                    linkUp = False
+                    self._drop_client()
+                    self.listener.close()
+                    self.listener = None
+                    phaseEnd = now + self.schedule[0][1]
+                else:
+                    linkUp = True
+                    self._listen()
+                    self.restoredAt.append(now)
+                    self.schedule.pop(0)
+                    phaseEnd = now + self.schedule[0][0] if self.schedule else None
+
+            if self.client is not None:
+                if now >= nextPoll:
+                    self._queue({"id": 0, "type": GAME_UPDATE})
+                    nextPoll = now + self.pollInterval
+                if now >= nextKeepAlive:
+                    self._queue({"id": 0, "type": KEEP_ALIVE})
+                    nextKeepAlive = now + self.keepAliveInterval
+                if self.resendAfter is not None:
+                    self._resend_late(now)
+                self._send_outgoing()
+
+            watched = [sock for sock in (self.listener, self.client, self.wakeReader) if sock is not None]
+            for sock in watched:
+                selector.register(sock, selectors.EVENT_READ)
+            events = selector.select(0.005)
+            for sock in watched:
+                selector.unregister(sock)
+
+            for key, mask in events:
+                if key.fileobj is self.wakeReader:
+                    self._drain_wake()
+                elif key.fileobj is self.listener and self.listener is not None:
+                    self._accept()
+                elif key.fileobj is self.client and self.client is not None:
+                    self._read()
+        selector.close()
+
+
+    def _wake(self):
+        try:
+            self.wakeWriter.send(b"\x00")
+        except (BlockingIOError, OSError):          ## Already woken, or stopped
+            pass
+
+
+    def _drain_wake(self):
+        try:
+            while self.wakeReader.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+
+    def _resend_late(self, now):
+        with self.lock:
+            for effectId, frame in self.requests.items():
+                if now - self.sentTimes[effectId] >= self.resendAfter:
+                    self.sentTimes[effectId] = now
+                    self.outgoing.append(frame)
+                    self.resent += 1
+
+
+    def _queue(self, message):
+        with self.lock:
+            self.outgoing.append(json.dumps(message).encode("utf-8") + b"\x00")
+
+
+    def _accept(self):
+        try:
+            client, address = self.listener.accept()
+        except (BlockingIOError, OSError):
+            return
+        if self.client is not None:                 ## One client at a time, like the real connector
+            self._drop_client()
+        client.setblocking(True)
+        self.client = client
+        self.buffer = bytearray()
+        self.connections += 1
+        self.connectedAt.append(time.monotonic())
+        with self.lock:                             ## Re-send what wasn't answered, like a connector retry
+            self.outgoing = list(self.requests.values()) + [
+                frame for frame in self.outgoing if frame not in self.requests.values()]
+
+
+    def _drop_client(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+
+    def _send_outgoing(self):
+        with self.lock:
+            outgoing, self.outgoing = self.outgoing, []
+        if not outgoing:
+            return
+        try:
+            self.client.sendall(b"".join(outgoing))
+        except OSError:
+            self._drop_client()
+
+
+    def _read(self):
+        try:
+            data = self.client.recv(65536)
+        except OSError:
+            data = b""
+        if not data:
+            self._drop_client()
+            return
+        self.buffer += data
+        while True:
+            end = self.buffer.find(b"\x00")
+            if end < 0:
+                break
+            frame = bytes(self.buffer[:end])
+            del self.buffer[:end + 1]
+            self._on_reply(json.loads(frame.decode("utf-8")))
+
+
+    def _on_reply(self, reply):
+        effectId = reply.get("id")
+        with self.lock:
+            if reply.get("type") != 0x00 or effectId not in self.requestTimes:     ## Not an EffectRequest reply
+                self.otherReplies += 1
+                return
+            self.requests.pop(effectId, None)
+            self.sentTimes.pop(effectId, None)
+            self.replies.setdefault(effectId, []).append(reply)
+            self.replyTimes.setdefault(effectId, time.monotonic())
+
+
+
+###################################################################################################################
+    ## Command line ##
+###################################################################################################################
+def main():
+    parser = argparse.ArgumentParser(description="Fake Crowd Control connector for testing the Krita plugin")
+    parser.add_argument("--port", type=int, default=2323)
+    parser.add_argument("--effect", action="append", default=[], help="effect code to request, can repeat")
+    parser.add_argument("--every", type=float, default=5.0, help="seconds between effect requests")
+    parser.add_argument("--duration", type=int, default=None, help="duration for timed effects, in ms")
+    parser.add_argument("--drop", type=float, nargs=2, metavar=("UP", "DOWN"), default=None,
+                        help="keep dropping the link: UP seconds up, DOWN seconds down")
+    args = parser.parse_args()
+
+    schedule = [tuple(args.drop)] * 1000 if args.drop else None
+    server = FakeCrowdControl(port=args.port, schedule=schedule).start()
+    print("Listening on 127.0.0.1:%d" % server.port)
+    codes = itertools.cycle(args.effect) if args.effect else None
+    try:
+        while True:
+            time.sleep(args.every)
+            if codes is not None:
+                effectId = server.request_effect(next(codes), args.duration)
+                print("Requested effect %d" % effectId)
+            print("connections %d, unanswered %s" % (server.connections, server.unanswered()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+
+if __name__ == "__main__":
+    main()
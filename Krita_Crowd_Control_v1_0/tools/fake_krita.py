@@ -0,0 +1,385 @@
+###################################################################################################################
+    ## fake_krita.py ##
+
+
+    ## A headless stand-in for Krita, to run the plugin's Bridge on a plain Python install
+    ##
+    ##  FakeKrita has windows, views and canvases that only remember what was done to them (rotation, mirror,
+    ##      brush preset, foreground color), and counts the calls, so benchmarks can see what an effect cost.
+    ##  FakeHost is the Host (host.py) on top of it, with a small event loop standing in for Qt's:
+    ##      post() is thread safe and runs functions on the thread that calls run(), timers fire there too.
+    ##  Opening and closing windows or switching views goes through FakeKrita, which tells its listeners like
+    ##      Krita's notifier does, so the host's ViewCache is invalidated the same way.
+    ##  A canvas change only marks the canvas for repainting, like QWidget.update(). Qt paints what's marked once
+    ##      per event loop turn, FakeKrita.paint() does (FakeHost.run() calls it after every turn): one repaint
+    ##      per changed canvas however often it changed (FakeWindow.repaints, optionally costing repaintCost
+    ##      seconds of busy work). While a window's updates are disabled nothing is marked, and enabling them
+    ##      again marks the whole window: every canvas and chromeCost more for the dockers and toolbars
+    ##      (fullRepaints).
+    ##  Each document has one 8-bit BGRA paint layer (FakeDocument.pixels) for the layer effects. Reads hand out
+    ##      the pixels, writes copy them in, like Node.pixelData() and setPixelData().
+    ##
+    ##  Usage:
+    ##      host = FakeHost()
+    ##      bridge = plugin_loader.load("bridge").Bridge(host, ("127.0.0.1", port))
+    ##      bridge.start()
+    ##      host.run(until=lambda: ..., timeout=5.0)
+###################################################################################################################
+import collections                          ## deque for posted functions
+import contextlib                           ## updates_suppressed()
+import heapq                                ## timers
+import itertools                            ## timer tie breaker
+import threading                            ## post() from the network thread
+import time                                 ## monotonic()
+
+import plugin_loader
+
+host = plugin_loader.load("host")
+
+
+
+###################################################################################################################
+    ## Krita ##
+###################################################################################################################
+class FakeCanvas:
+    def __init__(self, window=None):
+        self._window = window
+        self._rotation = 0.0
+        self._mirror = False
+        self._zoom = 1.0
+        self.calls = 0                              ## Every getter and setter, like a Python -> C++ call
+
+    def _changed(self):
+        if self._window is not None:
+            self._window.update(self)
+
+    def rotation(self):
+        self.calls += 1
+        return self._rotation
+
+    def setRotation(self, angle):
+        self.calls += 1
+        self._rotation = angle % 360.0
+        self._changed()
+
+    def mirror(self):
+        self.calls += 1
+        return self._mirror
+
+    def setMirror(self, mirror):
+        self.calls += 1
+        self._mirror = bool(mirror)
+        self._changed()
+
+    def zoomLevel(self):
+        self.calls += 1
+        return self._zoom
+
+    def setZoomLevel(self, zoom):
+        self.calls += 1
+        self._zoom = zoom
+        self._changed()
+
+
+
+class FakeDocument:
+    def __init__(self, width=64, height=64):
+        self.width = width
+        self.height = height
+        self.pixels = None                          ## bytearray, width * height * 4, made on the first read
+        self.paintLayer = True                      ## False to act like a group or vector layer
+        self.writes = 0
+
+
+
+class FakeView:
+    def __init__(self, document=None, window=None):
+        self._canvas = FakeCanvas(window)
+        self._document = document
+        self._window = window
+        self.preset = None
+        self.foreground = None
+
+    def canvas(self):
+        return self._canvas
+
+    def document(self):
+        return self._document
+
+    def window(self):
+        return self._window
+
+    def setCurrentBrushPreset(self, preset):
+        self.preset = preset
+
+    def setForeGroundColor(self, color):
+        self.foreground = color
+
+
+
+class FakeWindow:                                   ## Also stands in for its own qwindow()
+    def __init__(self, views=1, document=None, repaintCost=0.0, chromeCost=0.0):
+        document = document if document is not None else FakeDocument()
+        self._views = [FakeView(document, self) for _ in range(views)]
+        self._active = self._views[0] if self._views else None
+        self.repaintCost = repaintCost              ## Seconds of busy work per canvas repaint
+        self.chromeCost = chromeCost                ## and more when the whole window repaints
+        self.updatesEnabled = True
+        self.dirty = []                             ## Canvases marked since the last paint()
+        self.dirtyWindow = False                    ## All of it, after updates were enabled again
+        self.repaints = 0
+        self.fullRepaints = 0
+
+    def views(self):
+        return list(self._views)
+
+    def activeView(self):
+        return self._active
+
+    def qwindow(self):
+        return self
+
+    def setUpdatesEnabled(self, enabled):           ## Enabling marks everything, changed or not, like Qt
+        wasEnabled = self.updatesEnabled
+        self.updatesEnabled = enabled
+        if enabled and not wasEnabled:
+            self.dirtyWindow = True
+
+    def update(self, canvas):                       ## A canvas changed
+        if self.updatesEnabled and canvas not in self.dirty:
+            self.dirty.append(canvas)
+
+    def paint(self):                                ## What's marked, once
+        if self.dirtyWindow:
+            self.fullRepaints += 1
+            self.repaint(self.repaintCost * len(self._views) + self.chromeCost)
+        else:
+            for canvas in self.dirty:
+                self.repaint(self.repaintCost)
+        self.dirtyWindow = False
+        self.dirty = []
+
+    def repaint(self, cost):
+        self.repaints += 1
+        if cost:
+            end = time.perf_counter() + cost
+            while time.perf_counter() < end:
+                pass
+
+
+
+class FakeKrita:
+    def __init__(self, windows=1, presets=("rainbow01", "b) Basic-5 Size", "c) Pencil-2")):
+        self._windows = [FakeWindow() for _ in range(windows)]
+        self._presets = list(presets)
+        self.listeners = []                         ## Called with no arguments when windows or views change
+
+    def windows(self):
+        return list(self._windows)
+
+    def views(self):
+        return [view for window in self._windows for view in window.views()]
+
+    def activeWindow(self):
+        return self._windows[0] if self._windows else None
+
+    ## Becomes the active window. Pass another window's document to show the same image in both
+    def open_window(self, views=1, document=None, repaintCost=0.0, chromeCost=0.0):
+        window = FakeWindow(views, document, repaintCost, chromeCost)
+        self._windows.insert(0, window)
+        self._changed()
+        return window
+
+    def close_window(self, window):
+        self._windows.remove(window)
+        self._changed()
+
+    def set_active_view(self, window, index):
+        window._active = window._views[index]
+        self._changed()
+
+    def _changed(self):
+        for listener in self.listeners:
+            listener()
+
+    def paint(self):                                ## End of an event loop turn
+        for window in self._windows:
+            window.paint()
+
+    def resources(self, kind):                      ## A new dict every call, like Krita's
+        if kind != "preset":
+            return {}
+        return dict((name, "preset:" + name) for name in self._presets)
+
+
+
+###################################################################################################################
+    ## Timer ##
+###################################################################################################################
+class FakeTimer:
+    def __init__(self, loop, callback):
+        self.loop = loop
+        self.callback = callback
+        self.interval = 0.0
+        self.active = False
+        self.generation = 0                         ## Bumped on stop() and start(), stale heap entries are skipped
+
+    def start(self, milliseconds=None):
+        if milliseconds is not None:
+            self.interval = milliseconds / 1000.0
+        self.generation += 1
+        self.active = True
+        self.loop._schedule(self, time.monotonic() + self.interval)
+
+    def stop(self):
+        self.generation += 1
+        self.active = False
+
+    def isActive(self):
+        return self.active
+
+
+
+###################################################################################################################
+    ## The host ##
+###################################################################################################################
+class FakeHost(host.Host):
+    def __init__(self, krita=None, settings=None):
+        self.krita = krita or FakeKrita()
+        self.views = host.ViewCache(self._active_view, self._targets)
+        self.krita.listeners.append(self.views.invalidate)
+        self.settings = dict(settings or {})        ## (group, name) -> value
+        self.lines = []                             ## Log output, when logging to the host
+        self.condition = threading.Condition()
+        self.posted = collections.deque()
+        self.timers = []                            ## (when, sequence, timer, generation)
+        self.sequence = itertools.count()
+        self.turns = 0                              ## Event loop turns, like Qt's
+
+
+    ## Krita
+    def _active_view(self):
+        window = self.krita.activeWindow()
+        return window.activeView() if window is not None else None
+
+    def _targets(self, mode):                       ## Like KritaHost._targets
+        active = self._active_view()
+        if active is None:
+            return [], []
+        if mode == host.TARGET_ACTIVE:
+            views = [active]
+        elif mode == host.TARGET_DOCUMENT:
+            views = [view for view in self.krita.views() if view.document() == active.document()]
+        else:
+            views = self.krita.views()
+        counts = {}
+        windows = []                                ## Only the ones showing more than one of them
+        for view in views:
+            window = view.window().qwindow()
+            counts[id(window)] = counts.get(id(window), 0) + 1
+            if counts[id(window)] == 2:
+                windows.append(window)
+        return [view.canvas() for view in views], windows
+
+    def active_view(self):
+        return self.views.view()
+
+    def canvas(self):
+        return self.views.canvas()
+
+    def target_canvases(self, mode):
+        return self.views.targets(mode)[0]
+
+    @contextlib.contextmanager
+    def updates_suppressed(self, mode):
+        windows = self.views.targets(mode)[1]
+        for window in windows:
+            window.setUpdatesEnabled(False)
+        try:
+            yield
+        finally:
+            for window in windows:
+                window.setUpdatesEnabled(True)
+
+    def resources(self, kind):
+        return self.krita.resources(kind)
+
+    def set_foreground_color(self, red, green, blue):
+        self.active_view().setForeGroundColor((red, green, blue))
+
+    def layer_editable(self):
+        return self.active_view().document().paintLayer
+
+    def read_layer(self):
+        document = self.active_view().document()
+        if not document.paintLayer:
+            return None
+        if document.pixels is None:
+            document.pixels = bytearray(document.width * document.height * 4)
+        return document, document.pixels, document.width, document.height
+
+    def write_layer(self, layer, pixels, width, height):
+        layer.pixels = bytearray(pixels)
+        layer.writes += 1
+
+    def read_setting(self, group, name, default):
+        return self.settings.get((group, name), default)
+
+    def write_setting(self, group, name, value):
+        self.settings[(group, name)] = value
+
+    def log_sink(self):
+        return self.lines.append
+
+
+    ## Event loop
+    def make_timer(self, callback):
+        return FakeTimer(self, callback)
+
+    def post(self, function):
+        with self.condition:
+            self.posted.append(function)
+            self.condition.notify()
+
+    def _schedule(self, timer, when):
+        with self.condition:
+            heapq.heappush(self.timers, (when, next(self.sequence), timer, timer.generation))
+            self.condition.notify()
+
+
+    ## Run the event loop on this thread until until() is true or timeout seconds pass. Returns until()'s result
+    def run(self, until=None, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if until is not None and until():
+                return True
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                return False if until is not None else None
+
+            with self.condition:
+                while self.timers and (not self.timers[0][2].active or
+                                       self.timers[0][2].generation != self.timers[0][3]):
+                    heapq.heappop(self.timers)      ## Stopped or restarted since
+                wait = 0.05 if deadline is None else deadline - now
+                if self.timers:
+                    wait = min(wait, self.timers[0][0] - now)
+                if not self.posted and wait > 0:
+                    self.condition.wait(min(wait, 0.05))
+                posted = list(self.posted)          ## Only what's here now, like one Qt event loop turn
+                self.posted.clear()
+                due = []
+                now = time.monotonic()
+                while self.timers and self.timers[0][0] <= now:
+                    when, sequence, timer, generation = heapq.heappop(self.timers)
+                    if timer.active and timer.generation == generation:
+                        due.append(timer)
+
+            self.turns += 1
+            for function in posted:
+                function()
+            for timer in due:
+                if timer.active:                    ## Repeat, from now, like a QTimer that fell behind
+                    self._schedule(timer, max(now, time.monotonic()) + timer.interval)
+                    timer.callback()
+            self.krita.paint()
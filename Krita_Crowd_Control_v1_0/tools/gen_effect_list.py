@@ -0,0 +1,51 @@
+###################################################################################################################
+    ## gen_effect_list.py ##
+
+
+    ## Writes the effect list in the Crowd Control game pack from the plugin's effect registry
+    ##
+    ##  The effect metadata (name, price, duration, category, description) lives next to each effect's code,
+    ##      in the @effect decorator. This replaces the body of `Effects => new Effect[] { ... };`
+    ##      in Krita_TCP_01.cs with it, so the two can't drift apart.
+    ##
+    ##  python tools/gen_effect_list.py             rewrite Crowd_Control/Krita_TCP_01.cs
+    ##  python tools/gen_effect_list.py --print     only print the list
+###################################################################################################################
+import argparse                             ## command line
+import os                                   ## paths
+import re                                   ## find the effect list
+
+import plugin_loader
+
+CS_FILE = os.path.join(plugin_loader.ROOT_DIR, "Crowd_Control", "Krita_TCP_01.cs")
+EFFECT_LIST = re.compile(r"(public override EffectList Effects => new Effect\[\]\s*\{\r?\n)(.*?)(\r?\n\s*\};)", re.S)
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the Crowd Control effect list from the plugin")
+    parser.add_argument("--print", action="store_true", help="print the list instead of writing the .cs file")
+    parser.add_argument("--cs", default=CS_FILE, help="game pack file to rewrite")
+    args = parser.parse_args()
+
+    registry = plugin_loader.load("effects").load_all()
+    body = registry.render_cs_effects()
+    if args.print:
+        print(body)
+        return
+
+    with open(args.cs, "r", encoding="utf-8", newline="") as file:
+        source = file.read()
+    newline = "\r\n" if "\r\n" in source else "\n"
+    match = EFFECT_LIST.search(source)
+    if match is None:
+        raise SystemExit("Couldn't find the effect list in " + args.cs)
+    source = source[:match.start(2)] + body.replace("\n", newline) + source[match.end(2):]
+    with open(args.cs, "w", encoding="utf-8", newline="") as file:
+        file.write(source)
+    print("Wrote %d effects to %s" % (len(registry), args.cs))
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+###################################################################################################################
+    ## plugin_loader.py ##
+
+
+    ## Lets the tools and benchmarks import the plugin's Krita-free modules outside of Krita
+    ##
+    ##  The plugin's __init__.py registers the extension with Krita.instance(), so importing the package the
+    ##      normal way only works inside Krita. Here we register an empty package object that points at the
+    ##      plugin folder instead, so relative imports between the plugin modules still work.
+    ##
+    ##  Usage:
+    ##      import plugin_loader
+    ##      framer = plugin_loader.load("framer")
+###################################################################################################################
+import importlib                            ## import_module()
+import os                                   ## paths
+import sys                                  ## sys.modules
+import types                                ## ModuleType for the package stand-in
+
+PACKAGE = "extension_template"
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PLUGIN_DIR = os.path.join(ROOT_DIR, "Krita_extension", PACKAGE)
+
+
+
+## Register the package without running its __init__.py
+def _register_package():
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [os.path.normpath(PLUGIN_DIR)]
+        sys.modules[PACKAGE] = package
+
+
+
+## Import a plugin module by name, e.g. load("framer")
+def load(name):
+    _register_package()
+    return importlib.import_module(PACKAGE + "." + name)